@@ -1,15 +1,15 @@
 import streamlit as st
 import pandas as pd
-import folium
-from streamlit_folium import st_folium
-from databricks import sql
-from databricks.sdk import WorkspaceClient
-from databricks.sdk.core import Config
 import os
-import json
-from math import radians, sin, cos, sqrt, atan2
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import data
+import drive_time_matrix
+import h3
+import maps
+import sales_model
+import scoring
+from optimizer import cannibalization_select, coverage_select, greedy_select
 
 st.set_page_config(
     page_title="RMC Retail Site Selection",
@@ -184,106 +184,51 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Get SQL connection using SDK's built-in SQL connector
-@st.cache_resource
-def get_connection():
-    """Get SQL connection using WorkspaceClient's SQL connector"""
-    hostname = os.getenv("DATABRICKS_SERVER_HOSTNAME")
-    http_path = os.getenv("DATABRICKS_HTTP_PATH", "")
-    warehouse_id = http_path.split("/")[-1] if http_path else "148ccb90800933a1"
-
-    # Get the access token from Databricks Apps forwarded headers
-    try:
-        headers = st.context.headers
-        user_token = headers.get("X-Forwarded-Access-Token") if headers else None
-    except Exception as e:
-        st.error(f"❌ Failed to read headers: {e}")
-        return None
-
-    if not user_token:
-        st.error("❌ No access token found.")
-        return None
-
-    try:
-        # Use WorkspaceClient to get SQL warehouse connection
-        cfg = Config(
-            host=f"https://{hostname}",
-            token=user_token,
-            auth_type="pat"
+BOUNDARY_STYLE = dict(line_color=(99, 102, 241, 255), line_width=2)
+TRADE_AREA_STYLE = dict(line_color=(59, 130, 246, 255), fill_color=(59, 130, 246, 25))
+
+
+def state_boundary_layer(state_abbr, zoom):
+    """State outline from the precomputed overlays, else simplified from the full-resolution boundary"""
+    layer = maps.overlay_layer(data.map_overlays(), 'state_boundary', zoom, 'state_boundary',
+                               feature_ids=[state_abbr], **BOUNDARY_STYLE)
+    if layer is None:
+        boundary = data.state_boundary(state_abbr)
+        if not boundary.empty:
+            layer = maps.polygon_layer(boundary, 'geometry_geojson', zoom, 'state_boundary', **BOUNDARY_STYLE)
+    return layer
+
+
+def trade_areas_layer(store_numbers, zoom):
+    """Store trade areas from the precomputed overlays, else simplified from the full-resolution isochrones"""
+    layer = maps.overlay_layer(data.map_overlays(), 'store_trade_areas', zoom, 'trade_areas',
+                               feature_ids=store_numbers, **TRADE_AREA_STYLE)
+    if layer is None:
+        isochrones = data.store_isochrones()
+        if not isochrones.empty:
+            isochrones = isochrones[isochrones['store_number'].isin(store_numbers)]
+            layer = maps.polygon_layer(isochrones, 'isochrone_geojson', zoom, 'trade_areas', **TRADE_AREA_STYLE)
+    return layer
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def site_scorer(_features, artifact, fingerprint, _huff_cells=None, huff_run=None):
+    """
+    What-if scorer over an in-memory copy of the H3 features, rebuilt when the
+    features, model or drive-time OD matrix run change
+    """
+    model = sales_model.SalesModel.from_json(artifact)
+    huff = None
+    if huff_run and set(drive_time_matrix.HUFF_FEATURES) & set(model.features):
+        run = dict(huff_run)
+        huff = drive_time_matrix.HuffDemand(
+            _huff_cells, drive_time_matrix.matrix_from_env(), k_ring=int(run['k_ring']),
+            max_minutes=run['max_minutes'], attractiveness=run['candidate_attractiveness'],
+            decay=run['huff_decay'], min_minutes=run['huff_min_minutes'], resolution=int(run['h3_resolution'])
         )
-        client = WorkspaceClient(config=cfg)
-
-        # Get SQL warehouse connector from the client
-        return client.warehouses.get(id=warehouse_id)
-
-    except Exception as e:
-        st.error(f"❌ Connection error: {e}")
-        import traceback
-        with st.expander("Full Error"):
-            st.code(traceback.format_exc())
-        return None
-
-def get_user_token():
-    """Get authentication token - uses PAT from environment variable"""
-    token = os.getenv("DATABRICKS_TOKEN")
-    if token:
-        return token
-    else:
-        st.error("No DATABRICKS_TOKEN configured.")
-        return None
-
-@st.cache_data(ttl=600)
-def query(_token, sql_query):
-    """Execute SQL query using Databricks SQL Connector"""
-    from databricks import sql as dbsql
-
-    hostname = os.getenv("DATABRICKS_SERVER_HOSTNAME", "e2-demo-west.cloud.databricks.com")
-    http_path = os.getenv("DATABRICKS_HTTP_PATH", "/sql/1.0/warehouses/75fd8278393d07eb")
-
-    if not _token:
-        st.error("No authentication token available")
-        return pd.DataFrame()
-
-    try:
-        st.sidebar.write(f"🔍 Using SQL Connector")
-        st.sidebar.write(f"🔍 Host: {hostname}")
-        st.sidebar.write(f"🔍 HTTP Path: {http_path}")
-
-        with dbsql.connect(
-            server_hostname=hostname,
-            http_path=http_path,
-            access_token=_token
-        ) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql_query)
-                columns = [desc[0] for desc in cursor.description]
-                data = cursor.fetchall()
-                df = pd.DataFrame(data, columns=columns)
-
-                # Convert numeric columns
-                for col in df.columns:
-                    try:
-                        df[col] = pd.to_numeric(df[col], errors='ignore')
-                    except:
-                        pass
-
-                st.sidebar.success("✅ Query successful!")
-                return df
-
-    except Exception as e:
-        st.error(f"Query failed: {e}")
-        st.sidebar.error(f"❌ Error: {str(e)}")
-        import traceback
-        with st.expander("Full Error"):
-            st.code(traceback.format_exc())
-        return pd.DataFrame()
-
-def distance_miles(lat1, lon1, lat2, lon2):
-    R = 3959
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    return R * 2 * atan2(sqrt(a), sqrt(1-a))
+    return scoring.SiteScorer(scoring.feature_store(_features, model.features), scoring.isochrones_from_env(), model,
+                              huff=huff)
+
 
 # Header with branding
 st.markdown("""
@@ -298,54 +243,25 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+if not data.LOCAL_DB and not os.getenv("DATABRICKS_TOKEN"):
+    st.error("No DATABRICKS_TOKEN configured.")
+    st.stop()
+
+# The sidebar is hidden, so the cache refresh sits under the header
+_, refresh_col = st.columns([6, 1])
+if refresh_col.button("Refresh data", help=f"Reload all tables now instead of after the {data.DATA_TTL_SECONDS}s cache TTL"):
+    data.invalidate()
+
 # Tabs
 tab1, tab2, tab3 = st.tabs(["Current Network", "Expansion Candidates", "Network Optimizer"])
 
 with tab1:
     st.header("Current Store Network")
 
-    # Get user token for OAuth
-    user_token = get_user_token()
-    if not user_token:
-        st.error("Unable to authenticate. Please ensure you're logged in to Databricks.")
-        st.stop()
-
     with st.spinner("Loading store data..."):
-        stores = query(user_token, """
-            SELECT s.store_number, s.city, s.state, s.annual_sales,
-                   e.latitude, e.longitude,
-                   e.total_population, e.total_poi_count,
-                   e.male_18_to_24, e.female_18_to_24, e.male_45_to_54, e.female_45_to_54,
-                   e.income_100k_125k, e.income_125k_150k, e.income_150k_200k, e.income_200k_plus,
-                   e.bachelors_degree, e.masters_degree,
-                   e.distance_to_valuemart_miles, e.distance_to_quickshop_market_miles,
-                   e.poi_count_amenity, e.poi_count_leisure, e.poi_count_shop, e.poi_count_tourism,
-                   e.poi_count_office, e.poi_count_public_transport,
-                   r.address, r.zip_code
-            FROM retail_consumer_goods.geospatial_site_selection.gold_rmc_retail_location_sales s
-            JOIN retail_consumer_goods.geospatial_site_selection.gold_rmc_retail_locations_grocery_isochrones_features e
-                ON s.store_number = e.store_number
-            JOIN retail_consumer_goods.geospatial_site_selection.rmc_retail_locations_grocery r
-                ON s.store_number = r.store_number
-        """)
-
-        # Load isochrones separately if needed
-        try:
-            isochrones = query(user_token, """
-                SELECT store_number, ST_AsGeoJSON(geometry) as isochrone_geojson
-                FROM retail_consumer_goods.geospatial_site_selection.gold_rmc_retail_locations_grocery_isochrones_features
-            """)
-        except:
-            # If isochrone query fails, create empty dataframe
-            isochrones = pd.DataFrame()
+        stores = data.store_network()
 
     if not stores.empty:
-        # Merge isochrone data if available
-        if not isochrones.empty:
-            stores = stores.merge(isochrones, on='store_number', how='left')
-        else:
-            stores['isochrone_geojson'] = None
-
         try:
             col1, col2, col3, col4 = st.columns(4)
             col1.metric("Total Stores", f"{len(stores):,}")
@@ -359,13 +275,6 @@ with tab1:
                 st.write("First few rows:", stores.head())
             # Continue to show data table anyway
 
-        # Load MA state boundary
-        ma_boundary = query(user_token, """
-            SELECT ST_AsGeoJSON(geometry) as geometry_geojson
-            FROM retail_consumer_goods.geospatial_site_selection.bronze_census_states
-            WHERE state_abbr = 'MA'
-        """)
-
         # Create 2-column layout: map (left) + table (right)
         map_col, table_col = st.columns([2, 1])
 
@@ -376,72 +285,52 @@ with tab1:
             if 'show_trade_areas' not in st.session_state:
                 st.session_state.show_trade_areas = False
 
-            m = folium.Map(
-                location=[stores['latitude'].mean(), stores['longitude'].mean()],
-                zoom_start=9,
-                tiles='https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png',
-                attr='CartoDB'
-            )
+            map_view = st.radio("Map View", ["Stores", "H3 Heatmap"], horizontal=True, label_visibility="collapsed")
+
+            view = maps.view_state(stores)
+            layers = []
+
+            if map_view == "H3 Heatmap":
+                metric_col, resolution_col = st.columns([2, 1])
+                heatmap_metrics = {
+                    "Population": "total_population",
+                    "Points of Interest": "total_poi_count",
+                    "Urbanicity Score": "urbanicity_score",
+                }
+                metric = metric_col.selectbox("Heatmap Metric", list(heatmap_metrics))
+                resolution = resolution_col.select_slider(
+                    "Hexagon Resolution", options=list(data.HEATMAP_RESOLUTIONS), value=7,
+                    help="Coarser resolutions roll cells up to their H3 parent and draw fewer hexagons"
+                )
+                heatmap = data.h3_heatmap(resolution)
+                if not heatmap.empty:
+                    layers.append(maps.h3_layer(heatmap, heatmap_metrics[metric], label=metric))
+                    st.caption(f"{len(heatmap):,} H3 cells at resolution {resolution}")
 
             # Add MA state boundary overlay
-            if not ma_boundary.empty and ma_boundary.iloc[0]['geometry_geojson']:
-                folium.GeoJson(
-                    json.loads(ma_boundary.iloc[0]['geometry_geojson']),
-                    style_function=lambda x: {
-                        'color': '#6366f1',
-                        'weight': 2,
-                        'fillOpacity': 0,
-                        'dashArray': '5, 5'
-                    },
-                    name='Massachusetts Boundary'
-                ).add_to(m)
+            layers.append(state_boundary_layer("MA", view.zoom))
 
             # Add isochrones if toggle is on
-            if st.session_state.show_trade_areas and 'isochrone_geojson' in stores.columns:
-                for _, store in stores.iterrows():
-                    if pd.notna(store.get('isochrone_geojson')) and store.get('isochrone_geojson'):
-                        try:
-                            folium.GeoJson(
-                                json.loads(store['isochrone_geojson']),
-                                style_function=lambda x: {
-                                    'color': '#3b82f6',
-                                    'weight': 1,
-                                    'fillOpacity': 0.1,
-                                    'fillColor': '#3b82f6'
-                                }
-                            ).add_to(m)
-                        except:
-                            pass
-
-            for _, store in stores.iterrows():
-                # Enhanced tooltip with all requested fields
-                tooltip_text = f"""
-                <div style="font-family: Arial; font-size: 12px;">
-                    <b>Store {store['store_number']}</b><br/>
-                    {store['address']}<br/>
-                    {store['city']}, {store['state']} {store['zip_code']}<br/>
-                    <hr style="margin: 5px 0;">
-                    <b>Annual Sales:</b> ${store['annual_sales']:,.0f}<br/>
-                    <b>Population:</b> {store['total_population']:,.0f}<br/>
-                    <b>POI Count:</b> {store['total_poi_count']:,.0f}
-                </div>
-                """
-
-                folium.CircleMarker(
-                    location=[store['latitude'], store['longitude']],
-                    radius=8,
-                    popup=tooltip_text,
-                    tooltip=tooltip_text,
-                    color='#10b981',
-                    fill=True,
-                    fillColor='#34d399',
-                    fillOpacity=0.8,
-                    weight=2
-                ).add_to(m)
-            st_folium(m, width=None, height=500)
+            if st.session_state.show_trade_areas:
+                layers.append(trade_areas_layer(stores['store_number'].tolist(), view.zoom))
+
+            layers.append(maps.points_layer(
+                stores, 'stores', fill_color=(52, 211, 153, 204), line_color=(16, 185, 129, 255), radius=8,
+                label="stores",
+                tooltip=(
+                    "<b>Store {store_number}</b><br/>"
+                    "{address}<br/>"
+                    "{city}, {state} {zip_code}<br/>"
+                    "<hr style='margin: 5px 0;'>"
+                    "<b>Annual Sales:</b> ${annual_sales:,.0f}<br/>"
+                    "<b>Population:</b> {total_population:,.0f}<br/>"
+                    "<b>POI Count:</b> {total_poi_count:,.0f}"
+                )
+            ))
+            maps.render(layers, view)
 
             # Toggle below the map
-            st.session_state.show_trade_areas = st.checkbox("Show Trade Areas", value=st.session_state.show_trade_areas)
+            st.checkbox("Show Trade Areas", key="show_trade_areas")
 
         with table_col:
             st.subheader("Locations by Sales")
@@ -530,19 +419,9 @@ with tab1:
         st.warning("No data available. Ensure tables exist and permissions are granted.")
 
 with tab2:
-    # Get user token for OAuth
-    user_token = get_user_token()
-    if not user_token:
-        st.error("Unable to authenticate. Please ensure you're logged in to Databricks.")
-        st.stop()
-
     with st.spinner("Loading candidate data..."):
-        candidates = query(user_token, """
-            SELECT store_number, city, state, latitude, longitude,
-                   predicted_annual_sales, total_population, total_poi_count,
-                   commute_under_10_min
-            FROM retail_consumer_goods.geospatial_site_selection.gold_seed_points_expansion_top_25
-        """)
+        candidates = data.expansion_candidates()
+
 
     if not candidates.empty:
         # Create 2-column layout: metrics (left) + filters (right)
@@ -595,89 +474,39 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
 
-        # Load MA state boundary
-        ma_boundary = query(user_token, """
-            SELECT ST_AsGeoJSON(geometry) as geometry_geojson
-            FROM retail_consumer_goods.geospatial_site_selection.bronze_census_states
-            WHERE state_abbr = 'MA'
-        """)
-
-        m = folium.Map(
-            location=[filtered['latitude'].mean(), filtered['longitude'].mean()],
-            zoom_start=9,
-            tiles='https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png',
-            attr='CartoDB'
-        )
+        view = maps.view_state(filtered if not filtered.empty else candidates)
 
         # Add MA state boundary overlay
-        if not ma_boundary.empty and ma_boundary.iloc[0]['geometry_geojson']:
-            folium.GeoJson(
-                json.loads(ma_boundary.iloc[0]['geometry_geojson']),
-                style_function=lambda x: {
-                    'color': '#6366f1',
-                    'weight': 2,
-                    'fillOpacity': 0,
-                    'dashArray': '5, 5'
-                },
-                name='Massachusetts Boundary'
-            ).add_to(m)
+        layers = [state_boundary_layer("MA", view.zoom)]
 
         # Add current RMC locations (always shown)
-        current_stores = query(user_token, """
-            SELECT s.store_number, s.city, s.state, s.annual_sales,
-                   e.latitude, e.longitude,
-                   r.address, r.zip_code
-            FROM retail_consumer_goods.geospatial_site_selection.gold_rmc_retail_location_sales s
-            JOIN retail_consumer_goods.geospatial_site_selection.gold_rmc_retail_locations_grocery_isochrones_features e
-                ON s.store_number = e.store_number
-            JOIN retail_consumer_goods.geospatial_site_selection.rmc_retail_locations_grocery r
-                ON s.store_number = r.store_number
-        """)
+        current_stores = data.store_network()
         if not current_stores.empty:
-                for _, store in current_stores.iterrows():
-                    tooltip_text = f"""
-                    <div style="font-family: Arial; font-size: 12px;">
-                        <b>Current Store {store['store_number']}</b><br/>
-                        {store['address']}<br/>
-                        {store['city']}, {store['state']} {store['zip_code']}<br/>
-                        <hr style="margin: 5px 0;">
-                        <b>Annual Sales:</b> ${store['annual_sales']:,.0f}
-                    </div>
-                    """
-                    folium.CircleMarker(
-                        location=[store['latitude'], store['longitude']],
-                        radius=6,
-                        popup=tooltip_text,
-                        tooltip=tooltip_text,
-                        color='#10b981',
-                        fill=True,
-                        fillColor='#34d399',
-                        fillOpacity=0.8,
-                        weight=2
-                    ).add_to(m)
+            layers.append(maps.points_layer(
+                current_stores, 'current_stores', fill_color=(52, 211, 153, 204), line_color=(16, 185, 129, 255),
+                radius=6, label="current stores",
+                tooltip=(
+                    "<b>Current Store {store_number}</b><br/>"
+                    "{address}<br/>"
+                    "{city}, {state} {zip_code}<br/>"
+                    "<hr style='margin: 5px 0;'>"
+                    "<b>Annual Sales:</b> ${annual_sales:,.0f}"
+                )
+            ))
 
         # Add expansion candidates (blue markers)
-        for _, candidate in filtered.iterrows():
-            tooltip_text = f"""
-            <div style="font-family: Arial; font-size: 12px;">
-                <b>Expansion Location {candidate['store_number']}</b><br/>
-                {candidate['city']}, {candidate['state']}<br/>
-                <hr style="margin: 5px 0;">
-                <b>Predicted Sales:</b> ${candidate['predicted_annual_sales']:,.0f}
-            </div>
-            """
-            folium.CircleMarker(
-                location=[candidate['latitude'], candidate['longitude']],
-                radius=8,
-                popup=tooltip_text,
-                tooltip=tooltip_text,
-                color='#3b82f6',
-                fill=True,
-                fillColor='#60a5fa',
-                fillOpacity=0.8,
-                weight=2
-            ).add_to(m)
-        st_folium(m, width=None, height=500)
+        if not filtered.empty:
+            layers.append(maps.points_layer(
+                filtered, 'expansion_candidates', fill_color=(96, 165, 250, 204), line_color=(59, 130, 246, 255),
+                radius=8, label="expansion candidates", weight_col='predicted_annual_sales',
+                tooltip=(
+                    "<b>Expansion Location {store_number}</b><br/>"
+                    "{city}, {state}<br/>"
+                    "<hr style='margin: 5px 0;'>"
+                    "<b>Predicted Sales:</b> ${predicted_annual_sales:,.0f}"
+                )
+            ))
+        maps.render(layers, view)
 
         # Button below the map
         if st.button(f"Optimize Filtered Locations ({len(filtered)} locations)", type="primary", use_container_width=True):
@@ -686,23 +515,118 @@ with tab2:
     else:
         st.warning("No data available. Ensure tables exist and permissions are granted.")
 
+    st.subheader("What-If Site Scoring")
+    scoring_features = data.h3_scoring_features()
+    model_versions = data.sales_model()
+
+    if not scoring_features.empty and model_versions.empty:
+        st.info("No trained sales model found; run the gold train_sales_model task to enable what-if scoring.")
+    elif not scoring_features.empty:
+        huff_cells, huff_runs = data.huff_demand_cells(), data.huff_model()
+        huff_run = tuple(huff_runs.iloc[0].items()) if not huff_cells.empty and not huff_runs.empty else None
+        scorer = site_scorer(
+            scoring_features, model_versions['artifact'].iloc[0],
+            (len(scoring_features), float(scoring_features['total_population'].sum())),
+            huff_cells, huff_run
+        )
+        st.caption(
+            "Click a hexagon to score a new store at its center, or enter coordinates. "
+            f"Trade areas: {scorer.isochrones.name}. Sales model: v{scorer.model.version} "
+            f"(cross-validated R² {scorer.model.metrics.get('cv_r2', float('nan')):.2f})."
+        )
+        if scorer.isochrones.approximate:
+            st.info("No Valhalla router configured (VALHALLA_URL or VALHALLA_CONFIG); "
+                    "trade areas are approximated by a drive-time radius.")
+        if scorer.huff is None and set(drive_time_matrix.HUFF_FEATURES) & set(scorer.model.features):
+            st.info("The sales model uses drive-time Huff market share, but no drive-time OD matrix was found; "
+                    "run the gold drive_time_od_matrix task. Huff features count as 0 meanwhile.")
+
+        # A clicked hexagon moves the site to the cell center and scores it
+        clicked = st.session_state.get("whatif_map", {}).get("selection", {}).get("objects", {}).get("whatif_grid", [])
+        score_requested = False
+        if clicked and clicked[0].get("h3_cell_id") != st.session_state.get("whatif_cell"):
+            st.session_state["whatif_cell"] = clicked[0]["h3_cell_id"]
+            st.session_state["whatif_latitude"], st.session_state["whatif_longitude"] = \
+                h3.cell_to_latlng(clicked[0]["h3_cell_id"])
+            score_requested = True
+
+        if "whatif_latitude" not in st.session_state:
+            st.session_state["whatif_latitude"] = float(candidates['latitude'].mean()) if not candidates.empty else 42.36
+            st.session_state["whatif_longitude"] = float(candidates['longitude'].mean()) if not candidates.empty else -71.06
+
+        drive_col, lat_col, lon_col, button_col = st.columns([1, 1, 1, 1])
+        drive_minutes = drive_col.selectbox("Drive Time (minutes)", [5, 10, 15, 20, 30], key="whatif_minutes")
+        lat_col.number_input("Latitude", format="%.5f", key="whatif_latitude")
+        lon_col.number_input("Longitude", format="%.5f", key="whatif_longitude")
+        button_col.markdown("<div style='height: 1.75rem'></div>", unsafe_allow_html=True)
+        score_requested = button_col.button("Score Site", use_container_width=True) or score_requested
+
+        if score_requested:
+            try:
+                st.session_state["whatif_result"] = scorer.score(
+                    st.session_state["whatif_latitude"], st.session_state["whatif_longitude"], drive_minutes
+                )
+            except Exception as e:
+                st.session_state["whatif_result"] = None
+                st.error(f"Scoring failed: {e}")
+
+        result = st.session_state.get("whatif_result")
+        if result:
+            features = result['features']
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Predicted Annual Sales", f"${result['predicted_annual_sales']:,.0f}")
+            col2.metric("Trade Area Population", f"{features['total_population']:,.0f}")
+            col3.metric("Points of Interest", f"{features['total_poi_count']:,.0f}")
+            col4.metric("H3 Cells", f"{features['h3_cell_count']:,}")
+            timings = result['timings']
+            st.caption(
+                f"{result['drive_time_minutes']}-minute trade area at "
+                f"({result['latitude']:.5f}, {result['longitude']:.5f}) scored in {timings['total_ms']:,.0f} ms "
+                f"(isochrone {timings['isochrone_ms']:,.0f} ms, polyfill {timings['polyfill_ms']:,.1f} ms, "
+                f"features {timings['features_ms']:,.1f} ms, "
+                + (f"Huff {timings['huff_ms']:,.0f} ms, " if 'huff_ms' in timings else "")
+                + f"model {timings['model_ms']:,.2f} ms)"
+            )
+            if 'huff_market_share' in features and scorer.huff is not None:
+                st.caption(
+                    f"Huff market share {features['huff_market_share']:.1%} of "
+                    f"{features['reachable_population']:,.0f} people within "
+                    f"{scorer.huff.max_minutes:g} minutes ({features['huff_captured_population']:,.0f} captured; "
+                    f"drive times: {scorer.huff.router.name})."
+                )
+
+        grid = data.h3_heatmap(7)
+        site = pd.DataFrame({'latitude': [st.session_state["whatif_latitude"]],
+                             'longitude': [st.session_state["whatif_longitude"]]})
+        view = maps.view_state(candidates if not candidates.empty else site)
+        layers = [state_boundary_layer("MA", view.zoom)]
+        if not grid.empty:
+            layers.append(maps.h3_layer(grid, 'total_population', layer_id='whatif_grid', label="Population",
+                                        opacity=0.35))
+        if result:
+            layers.append(maps.geometry_layer(result['geometry'], 'whatif_trade_area',
+                                              line_color=(245, 158, 11, 255), fill_color=(251, 191, 36, 40),
+                                              line_width=2))
+            layers.append(maps.points_layer(
+                pd.DataFrame([result]), 'whatif_site', fill_color=(251, 191, 36, 230),
+                line_color=(245, 158, 11, 255), radius=9,
+                tooltip="<b>What-If Site</b><br/>Predicted Sales: ${predicted_annual_sales:,.0f}"
+            ))
+        maps.render(layers, view, on_select="rerun", selection_mode="single-object", key="whatif_map")
+    else:
+        st.warning("H3 features unavailable; what-if scoring needs gold_h3_features.")
+
 with tab3:
     st.header("Network Optimization")
 
-    # Get user token for OAuth
-    user_token = get_user_token()
-    if not user_token:
-        st.error("Unable to authenticate. Please ensure you're logged in to Databricks.")
-        st.stop()
-
     # Check if using pre-selected candidates from Tab 2
     using_preselected = 'optimization_candidates' in st.session_state and st.session_state['optimization_candidates'] is not None
 
     with st.spinner("Loading optimization data..."):
-        existing = query(user_token, """
-            SELECT e.latitude, e.longitude
-            FROM retail_consumer_goods.geospatial_site_selection.gold_rmc_retail_locations_grocery_isochrones_features e
-        """)
+        existing = data.store_locations()
+        if not existing.empty:
+            existing = existing[['latitude', 'longitude']]
+
 
         if using_preselected:
             candidates = st.session_state['optimization_candidates']
@@ -711,11 +635,11 @@ with tab3:
                 st.session_state['optimization_candidates'] = None
                 st.rerun()
         else:
-            candidates = query(user_token, """
-                SELECT store_number, city, state, latitude, longitude, predicted_annual_sales,
-                       total_population
-                FROM retail_consumer_goods.geospatial_site_selection.gold_seed_points_expansion_top_25
-            """)
+            candidates = data.expansion_candidates()
+            if not candidates.empty:
+                candidates = candidates[['store_number', 'city', 'state', 'latitude', 'longitude',
+                                         'predicted_annual_sales', 'total_population']]
+
 
     if not existing.empty and not candidates.empty:
         st.subheader("Optimization Parameters")
@@ -727,31 +651,66 @@ with tab3:
         with col3:
             min_dist_existing = st.number_input("Minimum Distance from Existing Stores (miles)", min_value=1.0, max_value=10.0, value=2.0, step=0.5)
 
+        objective = st.radio(
+            "Optimization Objective",
+            ["Predicted Sales", "Sales Net of Cannibalization", "Population Coverage", "Population Distance (p-median)"],
+            horizontal=True,
+            help="Predicted Sales ranks candidates independently. Sales Net of Cannibalization discounts the "
+                 "population a candidate's trade area shares with open stores. Coverage objectives count "
+                 "overlapping trade-area population only once."
+        )
+        cannibalization_rate = 0.5
+        if objective == "Sales Net of Cannibalization":
+            cannibalization_rate = st.slider(
+                "Share of overlapping demand cannibalized", min_value=0.0, max_value=1.0, value=0.5, step=0.05,
+                help="Fraction of the population shared with open stores that a new store would take from them"
+            )
+
         if st.button("Run Optimization", type="primary", use_container_width=True):
             with st.spinner("Optimizing network..."):
-                selected = []
-                for _, candidate in candidates.sort_values('predicted_annual_sales', ascending=False).iterrows():
-                    if len(selected) >= max_stores:
-                        break
-
-                    # Check distance constraints
-                    too_close_existing = any(distance_miles(candidate.latitude, candidate.longitude, row.latitude, row.longitude) < min_dist_existing
-                                           for _, row in existing.iterrows())
-                    if too_close_existing:
-                        continue
-
-                    if selected:
-                        too_close_selected = any(distance_miles(candidate.latitude, candidate.longitude, s['latitude'], s['longitude']) < min_dist_new
-                                               for s in selected)
-                        if too_close_selected:
-                            continue
-
-                    selected.append(candidate.to_dict())
-
-                selected_df = pd.DataFrame(selected)
+                optimization_stats = None
+                overlap = data.trade_area_overlap() if objective == "Sales Net of Cannibalization" else None
+                if overlap is not None and overlap.empty:
+                    st.warning("Trade-area overlap unavailable (run the gold trade_area_overlap task); "
+                               "ranking by predicted sales alone.")
+                if overlap is not None and not overlap.empty:
+                    selected_df, optimization_stats = cannibalization_select(
+                        candidates,
+                        overlap,
+                        max_stores=max_stores,
+                        cannibalization_rate=cannibalization_rate,
+                        min_dist_new=min_dist_new,
+                        min_dist_existing=min_dist_existing,
+                        existing=existing
+                    )
+                elif objective in ("Predicted Sales", "Sales Net of Cannibalization"):
+                    selected_df = greedy_select(
+                        candidates,
+                        existing,
+                        max_stores=max_stores,
+                        min_dist_new=min_dist_new,
+                        min_dist_existing=min_dist_existing
+                    )
+                else:
+                    demand = data.h3_demand()
+                    candidate_cells = data.candidate_trade_area_cells()
+                    existing_cells = data.existing_trade_area_cells()
+
+                    selected_df, optimization_stats = coverage_select(
+                        candidates,
+                        candidate_cells,
+                        demand,
+                        max_stores=max_stores,
+                        existing_coverage=existing_cells,
+                        mode='max_coverage' if objective == "Population Coverage" else 'p_median',
+                        min_dist_new=min_dist_new,
+                        min_dist_existing=min_dist_existing,
+                        existing=existing
+                    )
 
                 # Store results in session state
                 st.session_state['optimization_results'] = selected_df
+                st.session_state['optimization_stats'] = optimization_stats
                 st.session_state['optimization_existing'] = existing
                 st.session_state['optimization_candidates'] = candidates
 
@@ -763,44 +722,43 @@ with tab3:
 
             st.success(f"Optimization complete: {len(selected_df)} locations selected")
 
+            optimization_stats = st.session_state.get('optimization_stats')
+            if optimization_stats:
+                if optimization_stats['mode'] == 'cannibalization':
+                    objective_text = f"Predicted sales net of cannibalization: ${optimization_stats['objective']:,.0f}"
+                elif optimization_stats['mode'] == 'max_coverage':
+                    objective_text = f"Population covered by existing + new stores: {optimization_stats['objective']:,.0f}"
+                else:
+                    objective_text = f"Population-weighted distance to nearest store: {optimization_stats['objective']:,.0f} person-miles"
+                st.caption(f"{objective_text} | solved in {optimization_stats['seconds']:.2f}s")
+                if not optimization_stats['completed']:
+                    st.warning("Time budget reached before all locations were selected; showing the best partial network.")
+
             col1, col2, col3 = st.columns(3)
             col1.metric("Locations Selected", f"{len(selected_df)}")
             col2.metric("Total Predicted Revenue", f"${selected_df['predicted_annual_sales'].sum():,.0f}")
             col3.metric("Average Revenue per Location", f"${selected_df['predicted_annual_sales'].mean():,.0f}")
 
             st.subheader("Optimized Network Map")
-            m = folium.Map(
-                location=[candidates['latitude'].mean(), candidates['longitude'].mean()],
-                zoom_start=9,
-                tiles='https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png',
-                attr='CartoDB'
-            )
-            # Add existing stores
-            for _, store in existing.iterrows():
-                folium.CircleMarker(
-                    location=[store['latitude'], store['longitude']],
-                    radius=6,
-                    tooltip="Existing Store",
-                    color='#10b981',
-                    fill=True,
-                    fillColor='#34d399',
-                    fillOpacity=0.6,
-                    weight=2
-                ).add_to(m)
-            # Add recommended new locations
-            for _, location in selected_df.iterrows():
-                folium.CircleMarker(
-                    location=[location['latitude'], location['longitude']],
-                    radius=9,
-                    popup=f"<b>New Location {location['store_number']}</b><br/>City: {location['city']}<br/>Predicted Sales: ${location['predicted_annual_sales']:,.0f}",
-                    tooltip=f"Recommended: {location['city']}",
-                    color='#f59e0b',
-                    fill=True,
-                    fillColor='#fbbf24',
-                    fillOpacity=0.9,
-                    weight=3
-                ).add_to(m)
-            st_folium(m, width=None, height=500)
+            view = maps.view_state(candidates, existing)
+            layers = [
+                # Add existing stores
+                maps.points_layer(
+                    existing, 'existing_stores', fill_color=(52, 211, 153, 153), line_color=(16, 185, 129, 255),
+                    radius=6, label="existing stores", tooltip="Existing Store"
+                ),
+                # Add recommended new locations
+                maps.points_layer(
+                    selected_df, 'recommended', fill_color=(251, 191, 36, 230), line_color=(245, 158, 11, 255),
+                    radius=9, label="recommended locations",
+                    tooltip=(
+                        "<b>New Location {store_number}</b><br/>"
+                        "City: {city}<br/>"
+                        "Predicted Sales: ${predicted_annual_sales:,.0f}"
+                    )
+                ),
+            ]
+            maps.render(layers, view)
 
             st.caption("Green: Existing Stores | Gold: Recommended New Locations")
 
@@ -858,7 +816,7 @@ with tab3:
                         WHERE e.store_number IN ({store_numbers_str})
                         """
 
-                        query(user_token, save_query)
+                        data.execute(save_query)
                         st.success(f"✓ Saved {len(store_numbers)} locations to retail_consumer_goods.geospatial_site_selection.gold_expansion_locations_final")
                     except Exception as e:
                         st.error(f"Failed to save results: {e}")
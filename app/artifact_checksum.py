@@ -0,0 +1,40 @@
+"""
+Checksums of large build artifacts (OSM extracts, Valhalla tile extracts).
+
+A file's SHA-256 is cached in a .sha256 sidecar next to it and reused while the
+sidecar is newer than the file, so multi-GB extracts are hashed once per build.
+init-valhalla.sh copies the tile extract's sidecar along with the extract.
+
+Standard library only, so the silver Valhalla notebooks can import it without
+the app's dependencies; the gold OD matrix reaches it through drive_time_matrix.
+"""
+import hashlib
+import os
+
+
+def sha256_file(path):
+    """SHA-256 of a file, cached in a .sha256 sidecar next to it"""
+    sidecar = f"{path}.sha256"
+    if os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(path):
+        with open(sidecar) as f:
+            return f.read().strip()
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024 * 1024), b""):
+            digest.update(chunk)
+    checksum = digest.hexdigest()
+    try:
+        with open(sidecar, "w") as f:
+            f.write(checksum)
+    except OSError:
+        pass
+    return checksum
+
+
+def tile_extract_checksum(tar_paths):
+    """SHA-256 of the first Valhalla tile extract found (sha256_file, so init-valhalla.sh's sidecar is reused)"""
+    for tar_path in tar_paths:
+        if os.path.exists(tar_path):
+            return sha256_file(tar_path)
+    raise FileNotFoundError(f"No Valhalla tile extract at {', '.join(tar_paths)}")
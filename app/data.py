@@ -0,0 +1,343 @@
+"""
+Data access layer for the Streamlit app.
+
+All SQL goes through one backend held in `st.cache_resource`: a small pool of
+Databricks SQL warehouse connections, or a local DuckDB/SQLite file when
+SITE_SELECTION_LOCAL_DB is set (offline development and benchmarks). Results
+are fetched as Arrow and converted to typed pandas in one step.
+
+Tabs share named datasets rather than issuing their own queries, so a dataset
+used by several tabs is queried once per TTL. `invalidate()` drops one dataset
+(or all of them) before its TTL runs out.
+
+The local stand-in holds one table per dataset, named after it. `snapshot()`
+copies the warehouse datasets into such a file:
+
+    python app/data.py snapshot site_selection.duckdb
+"""
+import itertools
+import os
+import queue
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+SCHEMA = os.getenv("SITE_SELECTION_SCHEMA", "retail_consumer_goods.geospatial_site_selection")
+DATA_TTL_SECONDS = int(os.getenv("SITE_SELECTION_DATA_TTL", "600"))
+POOL_SIZE = int(os.getenv("SITE_SELECTION_POOL_SIZE", "4"))
+LOCAL_DB = os.getenv("SITE_SELECTION_LOCAL_DB")
+HEATMAP_RESOLUTIONS = (6, 7, 8)
+
+
+def arrow_to_pandas(table):
+    """Typed pandas from an Arrow table; DECIMAL columns become float64 so metrics format directly"""
+    fields = [
+        pa.field(f.name, pa.float64()) if pa.types.is_decimal(f.type) else f
+        for f in table.schema
+    ]
+    return table.cast(pa.schema(fields)).to_pandas()
+
+
+class WarehouseBackend:
+    """Pool of Databricks SQL connections shared by every session of the app"""
+
+    def __init__(self, hostname, http_path, token, pool_size=POOL_SIZE):
+        self.hostname = hostname
+        self.http_path = http_path
+        self.token = token
+        self.pool = queue.LifoQueue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self.pool.put(None)
+
+    def _connect(self):
+        from databricks import sql as dbsql
+        return dbsql.connect(server_hostname=self.hostname, http_path=self.http_path, access_token=self.token)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection (opened lazily); a connection that fails is closed and replaced"""
+        conn = self.pool.get()
+        try:
+            if conn is None:
+                conn = self._connect()
+            yield conn
+        except Exception:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            conn = None
+            raise
+        finally:
+            self.pool.put(conn)
+
+    def fetch_arrow(self, sql, params=None):
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.fetchall_arrow()
+
+    def execute(self, sql, params=None):
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, params)
+
+
+class LocalBackend:
+    """DuckDB (preferred) or SQLite file holding one table per dataset"""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            import duckdb
+            self.conn = duckdb.connect(path)
+            self.engine = "duckdb"
+        except ImportError:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.engine = "sqlite"
+
+    def fetch_arrow(self, sql, params=None):
+        if self.engine == "duckdb":
+            return self.conn.cursor().execute(sql, params or []).fetch_arrow_table()
+        return pa.Table.from_pandas(pd.read_sql_query(sql, self.conn, params=params), preserve_index=False)
+
+    def execute(self, sql, params=None):
+        self.conn.execute(sql, params or [])
+
+    def write_table(self, name, df):
+        if self.engine == "duckdb":
+            self.conn.register("_snapshot_df", df)
+            self.conn.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM _snapshot_df")
+            self.conn.unregister("_snapshot_df")
+        else:
+            df.to_sql(name, self.conn, if_exists="replace", index=False)
+
+
+@st.cache_resource
+def get_backend():
+    """The process-wide backend: local file when SITE_SELECTION_LOCAL_DB is set, else the SQL warehouse"""
+    if LOCAL_DB:
+        return LocalBackend(LOCAL_DB)
+    return WarehouseBackend(
+        hostname=os.getenv("DATABRICKS_SERVER_HOSTNAME", "e2-demo-west.cloud.databricks.com"),
+        http_path=os.getenv("DATABRICKS_HTTP_PATH", "/sql/1.0/warehouses/75fd8278393d07eb"),
+        token=os.getenv("DATABRICKS_TOKEN"),
+    )
+
+
+@st.cache_resource
+def _generations():
+    """Per-dataset generation counters; bumping one changes the cache key of that dataset only"""
+    return {}
+
+
+@st.cache_data(ttl=DATA_TTL_SECONDS, show_spinner=False, max_entries=256)
+def _load(name, params, generation):
+    dataset = DATASETS[name]
+    backend = get_backend()
+    if isinstance(backend, LocalBackend):
+        return arrow_to_pandas(backend.fetch_arrow(dataset.local_sql, list(params)))
+    return arrow_to_pandas(backend.fetch_arrow(dataset.sql, dataset.warehouse_params(params)))
+
+
+class Dataset:
+    """
+    A named query shared across tabs. Calling it returns a cached DataFrame (empty on
+    error). Optional datasets have a fallback in the app, so their errors are not shown.
+    """
+
+    def __init__(self, name, sql, param_names=(), optional=False):
+        self.name = name
+        self.sql = sql
+        self.param_names = param_names
+        self.optional = optional
+        where = " AND ".join(f"{p} = ?" for p in param_names)
+        self.local_sql = f"SELECT * FROM {name}" + (f" WHERE {where}" if where else "")
+
+    def warehouse_params(self, params):
+        return dict(zip(self.param_names, params)) or None
+
+    def __call__(self, *params):
+        try:
+            return _load(self.name, params, _generations().get(self.name, 0))
+        except Exception as e:
+            if not self.optional:
+                st.error(f"Query failed ({self.name}): {e}")
+            return pd.DataFrame()
+
+
+def invalidate(*names):
+    """Drop cached results of the given datasets (all datasets when called without names)"""
+    generations = _generations()
+    for name in names or DATASETS:
+        generations[name] = generations.get(name, 0) + 1
+
+
+def execute(sql):
+    """Run a statement that writes rather than reads"""
+    get_backend().execute(sql)
+
+
+def _trade_area_cells_sql(isochrone_table):
+    # Multi-contour trade areas hold nested polygons per store; each cell is listed once per store
+    return f"""
+        SELECT store_number, latitude, longitude, h3_cell_id,
+               ST_Y(ST_GeomFromWKT(h3_centeraswkt(h3_cell_id))) as cell_latitude,
+               ST_X(ST_GeomFromWKT(h3_centeraswkt(h3_cell_id))) as cell_longitude
+        FROM (
+            SELECT DISTINCT store_number, latitude, longitude, h3_cell_id
+            FROM (
+                SELECT store_number, latitude, longitude,
+                       explode(h3_polyfillash3string(ST_AsText(geometry), 8)) as h3_cell_id
+                FROM {SCHEMA}.{isochrone_table}
+            )
+        )
+    """
+
+
+DATASETS = {d.name: d for d in [
+    # Current stores with sales and trade-area features (tab 1; tab 2 plots a subset of columns)
+    Dataset("store_network", f"""
+        SELECT s.store_number, s.city, s.state, s.annual_sales,
+               e.latitude, e.longitude,
+               e.total_population, e.total_poi_count,
+               e.male_18_to_24, e.female_18_to_24, e.male_45_to_54, e.female_45_to_54,
+               e.income_100k_125k, e.income_125k_150k, e.income_150k_200k, e.income_200k_plus,
+               e.bachelors_degree, e.masters_degree,
+               e.distance_to_valuemart_miles, e.distance_to_quickshop_market_miles,
+               e.poi_count_amenity, e.poi_count_leisure, e.poi_count_shop, e.poi_count_tourism,
+               e.poi_count_office, e.poi_count_public_transport,
+               r.address, r.zip_code
+        FROM {SCHEMA}.gold_rmc_retail_location_sales s
+        JOIN {SCHEMA}.gold_rmc_retail_locations_grocery_isochrones_features e
+            ON s.store_number = e.store_number
+        JOIN {SCHEMA}.rmc_retail_locations_grocery r
+            ON s.store_number = r.store_number
+    """),
+    # Store coordinates (tab 3 existing stores)
+    Dataset("store_locations", f"""
+        SELECT store_number, latitude, longitude
+        FROM {SCHEMA}.gold_rmc_retail_locations_grocery_isochrones_features
+    """),
+    # Precomputed, simplified overlays per zoom level (gold export_map_overlays)
+    Dataset("map_overlays", f"""
+        SELECT layer, feature_id, zoom_level, geojson, exported_at
+        FROM {SCHEMA}.gold_map_overlays
+    """, optional=True),
+    # Full-resolution overlays, only queried when gold_map_overlays is missing
+    Dataset("store_isochrones", f"""
+        SELECT store_number, ST_AsGeoJSON(geometry) as isochrone_geojson
+        FROM {SCHEMA}.gold_rmc_retail_locations_grocery_isochrones_features
+    """),
+    Dataset("state_boundary", f"""
+        SELECT state_abbr, ST_AsGeoJSON(geometry) as geometry_geojson
+        FROM {SCHEMA}.bronze_census_states
+        WHERE state_abbr = :state_abbr
+    """, param_names=("state_abbr",)),
+    # Expansion candidates (tabs 2 and 3)
+    Dataset("expansion_candidates", f"""
+        SELECT store_number, city, state, latitude, longitude,
+               predicted_annual_sales, total_population, total_poi_count,
+               commute_under_10_min
+        FROM {SCHEMA}.gold_seed_points_expansion_top_25
+    """),
+    # H3 features rolled up to a parent resolution for the heatmap (resolution 8 is the native grid)
+    Dataset("h3_heatmap", f"""
+        SELECT :resolution as resolution,
+               h3_toparent(h3_cell_id, :resolution) as h3_cell_id,
+               SUM(total_population) as total_population,
+               SUM(total_poi_count) as total_poi_count,
+               AVG(urbanicity_score) as urbanicity_score
+        FROM {SCHEMA}.gold_h3_features
+        GROUP BY 1, 2
+    """, param_names=("resolution",)),
+    # Per-cell inputs of the what-if sales scorer (app/scoring.py)
+    Dataset("h3_scoring_features", f"""
+        SELECT h3_cell_id, total_population, total_poi_count,
+               male_18_to_24, female_18_to_24,
+               income_100k_125k, income_125k_150k, income_150k_200k, income_200k_plus,
+               bachelors_degree, masters_degree,
+               distance_to_valuemart_miles, distance_to_quickshop_market_miles
+        FROM {SCHEMA}.gold_h3_features
+    """),
+    # Latest trained sales model artifact (gold train_sales_model), used by the what-if scorer
+    Dataset("sales_model", f"""
+        SELECT version, trained_at, artifact
+        FROM {SCHEMA}.gold_sales_model_versions
+        ORDER BY version DESC
+        LIMIT 1
+    """, optional=True),
+    Dataset("h3_demand", f"""
+        SELECT h3_cell_id, total_population
+        FROM {SCHEMA}.gold_h3_features
+    """),
+    # Candidate rows of the trade-area overlap matrix (gold trade_area_overlap), tab 3 cannibalization objective
+    Dataset("trade_area_overlap", f"""
+        SELECT store_number_a, site_type_b, store_number_b, shared_cells, shared_population,
+               shared_population_share
+        FROM {SCHEMA}.gold_trade_area_overlap
+        WHERE site_type_a = 'candidate'
+    """, optional=True),
+    # Population and competing Huff utility per cell, and the parameters of the latest drive-time OD matrix
+    # run (gold drive_time_od_matrix), used by the what-if scorer
+    Dataset("huff_demand_cells", f"""
+        SELECT h3_cell_id, total_population, competing_utility
+        FROM {SCHEMA}.gold_huff_demand_cells
+    """, optional=True),
+    Dataset("huff_model", f"""
+        SELECT od_fingerprint, h3_resolution, k_ring, max_minutes, huff_decay, huff_min_minutes,
+               candidate_attractiveness
+        FROM {SCHEMA}.gold_drive_time_od_runs
+        ORDER BY created_timestamp DESC
+        LIMIT 1
+    """, optional=True),
+    # H3 cells inside each trade area, with site and cell center coordinates (tab 3 coverage objectives)
+    Dataset("candidate_trade_area_cells", _trade_area_cells_sql("silver_seed_points_isochrones")),
+    Dataset("existing_trade_area_cells", _trade_area_cells_sql("silver_rmc_urbanicity_based_isochrones")),
+]}
+
+
+store_network = DATASETS["store_network"]
+store_locations = DATASETS["store_locations"]
+map_overlays = DATASETS["map_overlays"]
+store_isochrones = DATASETS["store_isochrones"]
+state_boundary = DATASETS["state_boundary"]
+expansion_candidates = DATASETS["expansion_candidates"]
+h3_heatmap = DATASETS["h3_heatmap"]
+h3_scoring_features = DATASETS["h3_scoring_features"]
+sales_model = DATASETS["sales_model"]
+h3_demand = DATASETS["h3_demand"]
+trade_area_overlap = DATASETS["trade_area_overlap"]
+huff_demand_cells = DATASETS["huff_demand_cells"]
+huff_model = DATASETS["huff_model"]
+candidate_trade_area_cells = DATASETS["candidate_trade_area_cells"]
+existing_trade_area_cells = DATASETS["existing_trade_area_cells"]
+
+
+def snapshot(path, state_abbrs=("MA",), resolutions=HEATMAP_RESOLUTIONS):
+    """Copy every warehouse dataset into a local DuckDB/SQLite file for offline use"""
+    source = get_backend()
+    assert isinstance(source, WarehouseBackend), "Unset SITE_SELECTION_LOCAL_DB to snapshot from the warehouse"
+    target = LocalBackend(path)
+    snapshot_values = {"state_abbr": state_abbrs, "resolution": resolutions}
+    for name, dataset in DATASETS.items():
+        if dataset.param_names:
+            frames = [arrow_to_pandas(source.fetch_arrow(dataset.sql, dataset.warehouse_params(params)))
+                      for params in itertools.product(*(snapshot_values[p] for p in dataset.param_names))]
+            df = pd.concat(frames, ignore_index=True)
+        else:
+            df = arrow_to_pandas(source.fetch_arrow(dataset.sql))
+        target.write_table(name, df)
+        print(f"{name}: {len(df):,} rows")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "snapshot":
+        snapshot(sys.argv[2])
+    else:
+        print(__doc__)
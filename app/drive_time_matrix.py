@@ -0,0 +1,314 @@
+"""
+Drive-time OD matrix between H3 demand cells and stores, and Huff market shares.
+
+The matrix is sparse: a store is only routed from the cells within an H3 k-ring
+of its own cell, so every store holds one bounded column of (cell, minutes)
+pairs. Pairs are routed in blocks (stores sharing a coarse H3 parent cell, with
+the union of their k-ring cells): a block becomes a few dense Valhalla
+`sources_to_targets` requests of up to `max_location_pairs` each, and only the
+requested pairs are kept from the answers.
+
+Huff gravity model over the matrix: a store's utility to a cell is its
+attractiveness times drive time to the power -decay (times are floored at
+min_minutes so a store's own cell stays finite), and each cell's population
+splits across the stores in reach in proportion to their utility:
+- huff_captured_population: population the store is expected to capture
+- huff_market_share: captured population over the population within reach
+- reachable_population: population of the cells routed within max_minutes
+
+A candidate is scored as if it alone joined the existing stores and competitors:
+its probability in a cell is u / (u + competing utility of the cell).
+
+Shared by the gold drive_time_od_matrix notebook (routing on executors with
+applyInPandas, Huff on the driver) and the what-if scorer (app/scoring.py); the
+tile-extract checksum comes from app/artifact_checksum.py.
+"""
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import requests
+
+from artifact_checksum import sha256_file, tile_extract_checksum  # noqa: F401
+
+H3_RESOLUTION = 8
+MAX_MINUTES = 30.0
+MAX_SPEED_MPH = 50.0
+K_RING = 51  # k_ring_for(MAX_MINUTES, MAX_SPEED_MPH, H3_RESOLUTION)
+MAX_LOCATION_PAIRS = 2500
+HUFF_DECAY = 2.0
+MIN_MINUTES = 1.0
+EARTH_RADIUS_MILES = 3958.8
+
+HUFF_FEATURES = ["reachable_population", "huff_captured_population", "huff_market_share"]
+PAIR_COLUMNS = ["h3_cell_id", "target_id", "drive_time_minutes", "drive_distance_km"]
+
+# Valhalla actors loaded in this Python process, by config path
+_ACTORS = {}
+
+
+def _parse_matrix(result, n_sources, n_targets):
+    """(minutes, km) arrays of a sources_to_targets answer, NaN where no route was found"""
+    minutes = np.full((n_sources, n_targets), np.nan)
+    km = np.full((n_sources, n_targets), np.nan)
+    matrix = (result or {}).get("sources_to_targets", [])
+    if isinstance(matrix, dict):
+        # Columnar answer (verbose=false on recent Valhalla versions)
+        durations = np.array(matrix.get("durations", []), dtype=np.float64)
+        distances = np.array(matrix.get("distances", []), dtype=np.float64)
+        if durations.size:
+            minutes[:] = durations / 60
+        if distances.size:
+            km[:] = distances
+        return minutes, km
+    for i, row in enumerate(matrix):
+        for j, cell in enumerate(row):
+            if cell.get("time") is not None:
+                minutes[i, j] = cell["time"] / 60
+            if cell.get("distance") is not None:
+                km[i, j] = cell["distance"]
+    return minutes, km
+
+
+class _ValhallaMatrix:
+    """Valhalla sources_to_targets requests; subclasses send the request"""
+
+    approximate = False
+
+    def __init__(self, costing="auto"):
+        self.costing = costing
+
+    def times(self, source_latlng, target_latlng):
+        """(minutes, km) from every source to every target in one request, NaN where unreachable"""
+        query = {
+            "sources": [{"lat": float(lat), "lon": float(lon)} for lat, lon in source_latlng],
+            "targets": [{"lat": float(lat), "lon": float(lon)} for lat, lon in target_latlng],
+            "costing": self.costing,
+        }
+        return _parse_matrix(self._request(query), len(source_latlng), len(target_latlng))
+
+
+class ValhallaServiceMatrix(_ValhallaMatrix):
+    """Valhalla HTTP service over one keep-alive session"""
+
+    def __init__(self, url, costing="auto", timeout_seconds=60):
+        super().__init__(costing)
+        self.url = url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self.session = requests.Session()
+        self.name = f"Valhalla service ({self.url})"
+
+    def _request(self, query):
+        response = self.session.post(f"{self.url}/sources_to_targets", json=query, timeout=self.timeout_seconds)
+        response.raise_for_status()
+        return response.json()
+
+
+class ValhallaActorMatrix(_ValhallaMatrix):
+    """In-process pyvalhalla actor, loaded once per process with its tiles"""
+
+    def __init__(self, config_path, costing="auto"):
+        super().__init__(costing)
+        if config_path not in _ACTORS:
+            import valhalla
+            _ACTORS[config_path] = valhalla.Actor(config_path)
+        self.actor = _ACTORS[config_path]
+        self.name = "Valhalla actor"
+
+    def _request(self, query):
+        result = self.actor.matrix(json.dumps(query))
+        return json.loads(result) if isinstance(result, str) else result
+
+
+class StraightLineMatrix:
+    """Great-circle distance at a constant average speed; an approximation when no router is available"""
+
+    approximate = True
+
+    def __init__(self, speed_mph=25.0):
+        self.speed_mph = speed_mph
+        self.name = f"Straight-line distance at {speed_mph:g} mph"
+
+    def times(self, source_latlng, target_latlng):
+        source = np.radians(np.asarray(source_latlng, dtype=np.float64).reshape(-1, 2))
+        target = np.radians(np.asarray(target_latlng, dtype=np.float64).reshape(-1, 2))
+        dlat = target[None, :, 0] - source[:, None, 0]
+        dlon = target[None, :, 1] - source[:, None, 1]
+        a = np.sin(dlat / 2) ** 2 + np.cos(source[:, None, 0]) * np.cos(target[None, :, 0]) * np.sin(dlon / 2) ** 2
+        miles = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+        return miles / self.speed_mph * 60, miles * 1.609344
+
+
+def matrix_from_env():
+    """VALHALLA_URL (HTTP service), else VALHALLA_CONFIG (local actor), else the straight-line approximation"""
+    costing = os.getenv("VALHALLA_COSTING", "auto")
+    if os.getenv("VALHALLA_URL"):
+        return ValhallaServiceMatrix(os.environ["VALHALLA_URL"], costing)
+    if os.getenv("VALHALLA_CONFIG"):
+        return ValhallaActorMatrix(os.environ["VALHALLA_CONFIG"], costing)
+    return StraightLineMatrix(float(os.getenv("SCORING_AVERAGE_SPEED_MPH", "25")))
+
+
+def k_ring_for(max_minutes, max_speed_mph, resolution=H3_RESOLUTION):
+    """
+    Smallest k-ring radius around a store's cell that holds every cell within
+    max_minutes at max_speed_mph (straight-line speed). The ring's boundary is
+    nearest to its center across its flat sides, about 1.5 * k average edge
+    lengths out, so a pair in reach is never pruned by the ring.
+    """
+    import h3
+
+    reach_km = max_minutes / 60 * max_speed_mph * 1.609344
+    return max(1, math.ceil(reach_km / (1.5 * h3.average_hexagon_edge_length(resolution, unit="km"))))
+
+
+def route_pairs(router, pairs, max_location_pairs=MAX_LOCATION_PAIRS):
+    """
+    Drive time and distance of every requested (cell, target) pair of one block.
+    `pairs` has h3_cell_id, source_latitude, source_longitude, target_id,
+    target_latitude and target_longitude; the block's distinct sources and
+    targets are routed as dense requests of at most max_location_pairs.
+    """
+    source_codes, source_ids = pd.factorize(pairs["h3_cell_id"])
+    target_codes, target_ids = pd.factorize(pairs["target_id"])
+    sources = pairs.groupby(source_codes)[["source_latitude", "source_longitude"]].first().to_numpy()
+    targets = pairs.groupby(target_codes)[["target_latitude", "target_longitude"]].first().to_numpy()
+
+    minutes = np.full((len(sources), len(targets)), np.nan)
+    km = np.full((len(sources), len(targets)), np.nan)
+    # Few targets per block, many sources: take all targets that fit, then as many sources as the limit allows
+    target_step = max(1, min(len(targets), max_location_pairs))
+    source_step = max(1, max_location_pairs // target_step)
+    for t in range(0, len(targets), target_step):
+        for s in range(0, len(sources), source_step):
+            block_minutes, block_km = router.times(sources[s:s + source_step], targets[t:t + target_step])
+            minutes[s:s + source_step, t:t + target_step] = block_minutes
+            km[s:s + source_step, t:t + target_step] = block_km
+
+    return pd.DataFrame({
+        "h3_cell_id": source_ids[source_codes],
+        "target_id": target_ids[target_codes],
+        "drive_time_minutes": minutes[source_codes, target_codes],
+        "drive_distance_km": km[source_codes, target_codes],
+    })
+
+
+def block_router(router_factory, max_location_pairs=MAX_LOCATION_PAIRS):
+    """applyInPandas function routing one block of pairs; the router is created once per worker"""
+    routers = []
+
+    def route(pairs):
+        if not routers:
+            routers.append(router_factory())
+        return route_pairs(routers[0], pairs, max_location_pairs)[PAIR_COLUMNS]
+
+    return route
+
+
+def _utility(minutes, attractiveness, decay, min_minutes):
+    return np.asarray(attractiveness, dtype=np.float64) \
+        * np.maximum(np.asarray(minutes, dtype=np.float64), min_minutes) ** -decay
+
+
+def _cell_population(cells, demand):
+    """Population of each pair's cell from a Series indexed by cell id; cells without demand count 0"""
+    return demand.reindex(cells).fillna(0).to_numpy(dtype=np.float64)
+
+
+def huff_market_share(od, demand, decay=HUFF_DECAY, min_minutes=MIN_MINUTES):
+    """
+    Huff shares of competing stores. `od` has one row per (cell, store) pair
+    with h3_cell_id, store_id, drive_time_minutes and attractiveness; `demand`
+    is population indexed by h3_cell_id. Returns (one row per store_id with the
+    HUFF_FEATURES, competing utility per cell as a Series).
+    """
+    cell_codes, cells = pd.factorize(od["h3_cell_id"])
+    store_codes, stores = pd.factorize(od["store_id"])
+    utility = _utility(od["drive_time_minutes"], od["attractiveness"], decay, min_minutes)
+    cell_utility = np.bincount(cell_codes, weights=utility, minlength=len(cells))
+    population = _cell_population(cells, demand)[cell_codes]
+
+    probability = utility / cell_utility[cell_codes]
+    reachable = np.bincount(store_codes, weights=population, minlength=len(stores))
+    captured = np.bincount(store_codes, weights=population * probability, minlength=len(stores))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.nan_to_num(captured / reachable)
+    shares = pd.DataFrame({"store_id": stores, "reachable_population": reachable,
+                           "huff_captured_population": captured, "huff_market_share": share})
+    return shares, pd.Series(cell_utility, index=cells, name="competing_utility")
+
+
+def candidate_huff(od, demand, competing_utility, attractiveness=1.0, decay=HUFF_DECAY, min_minutes=MIN_MINUTES):
+    """
+    Huff shares of candidates, each joining the competing stores alone. `od`
+    has h3_cell_id, store_id and drive_time_minutes; `competing_utility` is the
+    per-cell Series returned by huff_market_share. One row per store_id.
+    """
+    store_codes, stores = pd.factorize(od["store_id"])
+    utility = _utility(od["drive_time_minutes"], attractiveness, decay, min_minutes)
+    competing = competing_utility.reindex(od["h3_cell_id"]).fillna(0).to_numpy(dtype=np.float64)
+    population = _cell_population(od["h3_cell_id"], demand)
+
+    probability = utility / (utility + competing)
+    reachable = np.bincount(store_codes, weights=population, minlength=len(stores))
+    captured = np.bincount(store_codes, weights=population * probability, minlength=len(stores))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        share = np.nan_to_num(captured / reachable)
+    return pd.DataFrame({"store_id": stores, "reachable_population": reachable,
+                         "huff_captured_population": captured, "huff_market_share": share})
+
+
+class HuffDemand:
+    """
+    Per-cell population and competing utility (gold_huff_demand_cells) for
+    Huff features of one what-if site, routed from the cells in its k-ring
+    """
+
+    def __init__(self, df, router, k_ring=K_RING, max_minutes=MAX_MINUTES, attractiveness=1.0,
+                 decay=HUFF_DECAY, min_minutes=MIN_MINUTES, resolution=H3_RESOLUTION,
+                 max_location_pairs=MAX_LOCATION_PAIRS):
+        self.population = df.set_index("h3_cell_id")["total_population"].astype(np.float64)
+        self.competing_utility = df.set_index("h3_cell_id")["competing_utility"].astype(np.float64)
+        self.router = router
+        self.k_ring = k_ring
+        self.max_minutes = max_minutes
+        self.attractiveness = attractiveness
+        self.decay = decay
+        self.min_minutes = min_minutes
+        self.resolution = resolution
+        self.max_location_pairs = max_location_pairs
+
+    def features(self, latitude, longitude):
+        """HUFF_FEATURES of a new store at (latitude, longitude)"""
+        import h3
+
+        ring = [c for c in h3.grid_disk(h3.latlng_to_cell(latitude, longitude, self.resolution), self.k_ring)
+                if c in self.population.index]
+        if not ring:
+            return dict.fromkeys(HUFF_FEATURES, 0.0)
+        sources = np.array([h3.cell_to_latlng(c) for c in ring])
+        pairs = pd.DataFrame({"h3_cell_id": ring, "source_latitude": sources[:, 0], "source_longitude": sources[:, 1],
+                              "target_id": 0, "target_latitude": latitude, "target_longitude": longitude})
+        od = route_pairs(self.router, pairs, self.max_location_pairs) \
+            .rename(columns={"target_id": "store_id"})
+        od = od[od["drive_time_minutes"] <= self.max_minutes]
+        if od.empty:
+            return dict.fromkeys(HUFF_FEATURES, 0.0)
+        shares = candidate_huff(od, self.population, self.competing_utility, self.attractiveness,
+                                self.decay, self.min_minutes)
+        return {c: float(shares[c].iloc[0]) for c in HUFF_FEATURES}
+
+
+def store_list_hash(stores, columns):
+    """SHA-256 of a store list, independent of row order"""
+    rows = stores[list(columns)].astype(str).agg("|".join, axis=1).sort_values()
+    return hashlib.sha256("\n".join(rows).encode()).hexdigest()
+
+
+def matrix_fingerprint(tiles_checksum, store_hash, **parameters):
+    """Fingerprint of an OD matrix: routing tiles, store list and the parameters that shape it"""
+    spec = json.dumps({"tiles": tiles_checksum, "stores": store_hash, **parameters}, sort_keys=True)
+    return hashlib.sha256(spec.encode()).hexdigest()
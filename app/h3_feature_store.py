@@ -0,0 +1,169 @@
+"""
+In-memory columnar store of per-cell H3 features.
+
+The feature table is loaded once into float64 matrices, one per aggregation
+(sum, mean, min), with one contiguous row per feature, behind a hash index on
+int64 H3 cell ids. Many
+trade areas are aggregated at once: their cells are looked up in one vectorized
+call, the matching rows gathered in trade-area order and reduced per trade area
+with np.add.reduceat / np.minimum.reduceat. This replaces the explode + shuffle
+join + groupBy of aggregate_trade_area_features with a driver-side gather.
+
+Aggregations follow Spark SQL over an inner join of cells to features:
+- sum: nulls ignored, 0 when a trade area has no values
+- mean: nulls ignored, NaN when a trade area has no values
+- min: nulls ignored, NaN when a trade area has no values
+- h3_cell_count: cells found in the store
+
+Cells missing from the store are dropped, as in the inner join. The store is
+shared by the gold aggregate_trade_area_features notebook, the app and the
+what-if scorer (app/scoring.py).
+"""
+import numpy as np
+import pandas as pd
+
+SUM, MEAN, MIN = "sum", "mean", "min"
+AGGREGATIONS = (SUM, MEAN, MIN)
+BATCH_ROWS = 1_000_000
+
+
+def cell_ids_to_int(cell_ids):
+    """H3 cell ids (hex strings or integers) as int64"""
+    cell_ids = np.asarray(cell_ids)
+    if cell_ids.dtype.kind in "iu":
+        return cell_ids.astype(np.int64)
+    return np.fromiter((int(c, 16) if isinstance(c, str) else int(c) for c in cell_ids),
+                       dtype=np.int64, count=len(cell_ids))
+
+
+class TradeAreaCells:
+    """
+    Cells of many trade areas resolved against a store: store rows ordered by
+    trade area, with the start and count of each trade area's run of rows.
+    """
+
+    def __init__(self, keys, rows, order, counts):
+        self.keys = keys
+        self.rows = rows
+        self.order = order
+        self.counts = counts
+        self.starts = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def _batches(cells, batch_rows):
+    """(trade areas, first row, end row) of consecutive non-empty trade areas holding about batch_rows rows"""
+    groups = np.flatnonzero(cells.counts > 0)
+    if not len(groups):
+        return
+    ends = cells.starts[groups] + cells.counts[groups]
+    batch = ends // max(batch_rows, 1)
+    for b in np.unique(batch):
+        members = groups[batch == b]
+        yield members, cells.starts[members[0]], cells.starts[members[-1]] + cells.counts[members[-1]]
+
+
+class H3FeatureStore:
+    """Per-cell features as one (feature x cell) float64 matrix per aggregation, indexed by int64 cell id"""
+
+    def __init__(self, cell_ids, columns, aggregations):
+        self.index = pd.Index(cell_ids_to_int(cell_ids))
+        if not self.index.is_unique:
+            raise ValueError("H3 cell ids must be unique")
+        self.columns = {agg: [c for c in columns if aggregations[c] == agg] for agg in AGGREGATIONS}
+        self.values = {}
+        for agg, names in self.columns.items():
+            matrix = np.empty((len(names), len(self.index)), dtype=np.float64)
+            for i, name in enumerate(names):
+                matrix[i] = columns[name]
+            # Sums ignore nulls; min ignores them through +inf
+            if agg == SUM:
+                np.nan_to_num(matrix, copy=False, nan=0.0)
+            elif agg == MIN:
+                matrix[np.isnan(matrix)] = np.inf
+            self.values[agg] = matrix
+
+    @classmethod
+    def from_frame(cls, df, sum_columns=(), mean_columns=(), min_columns=(), id_column="h3_cell_id"):
+        """Store from a frame of one row per cell; the id column holds hex strings or int64 ids"""
+        aggregations = {**{c: SUM for c in sum_columns}, **{c: MEAN for c in mean_columns},
+                        **{c: MIN for c in min_columns}}
+        columns = {c: pd.to_numeric(df[c]).to_numpy(dtype=np.float64, na_value=np.nan) for c in aggregations}
+        return cls(df[id_column].to_numpy(), columns, aggregations)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def nbytes(self):
+        return self.index.nbytes + sum(m.nbytes for m in self.values.values())
+
+    @property
+    def feature_names(self):
+        return [c for agg in AGGREGATIONS for c in self.columns[agg]]
+
+    def lookup(self, cell_ids):
+        """Store row of each cell id, -1 for cells not in the store"""
+        return self.index.get_indexer(cell_ids_to_int(cell_ids))
+
+    def group(self, keys, cell_ids):
+        """
+        Resolve (trade area key, cell id) pairs, one per row, into runs of store
+        rows per trade area. Trade areas without any known cell are kept with a
+        count of zero.
+        """
+        codes, unique_keys = pd.factorize(np.asarray(keys), sort=False)
+        rows = self.lookup(cell_ids)
+        present = np.flatnonzero(rows >= 0)
+        order = present[np.argsort(codes[present], kind="stable")]
+        counts = np.bincount(codes[order], minlength=len(unique_keys))
+        return TradeAreaCells(unique_keys, rows[order], order, counts)
+
+    def aggregate(self, cells, weights=None, columns=None, batch_rows=BATCH_ROWS):
+        """
+        Features of every trade area in `cells` (from group()) as a frame indexed by
+        trade-area key. `weights`, aligned with the pairs passed to group(), weight
+        the summed columns. `columns` limits the output to some features. Rows are
+        gathered for about `batch_rows` cells at a time to bound memory.
+        """
+        keep = None if columns is None else set(columns)
+        weights = None if weights is None else np.asarray(weights, dtype=np.float64)[cells.order]
+        result = {}
+        for agg in AGGREGATIONS:
+            names = [c for c in self.columns[agg] if keep is None or c in keep]
+            if not names:
+                continue
+            matrix = self.values[agg]
+            if len(names) < len(self.columns[agg]):
+                matrix = matrix[[self.columns[agg].index(c) for c in names]]
+            out = np.full((len(names), len(cells)), 0.0 if agg == SUM else np.nan)
+            for groups, start, end in _batches(cells, batch_rows):
+                values = np.take(matrix, cells.rows[start:end], axis=1)
+                starts = cells.starts[groups] - start
+                if agg == SUM:
+                    if weights is not None:
+                        values *= weights[start:end]
+                    out[:, groups] = np.add.reduceat(values, starts, axis=1)
+                elif agg == MEAN:
+                    valid = ~np.isnan(values)
+                    values[~valid] = 0.0
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        out[:, groups] = np.add.reduceat(values, starts, axis=1) \
+                            / np.add.reduceat(valid, starts, axis=1)
+                else:
+                    minimum = np.minimum.reduceat(values, starts, axis=1)
+                    out[:, groups] = np.where(np.isinf(minimum), np.nan, minimum)
+            result.update(zip(names, out))
+        features = pd.DataFrame(result, index=pd.Index(cells.keys, name="key"))
+        features["h3_cell_count"] = cells.counts
+        return features
+
+    def aggregate_cells(self, cell_ids, weights=None):
+        """Features of one set of cells as a dict"""
+        cells = self.group(np.zeros(len(cell_ids), dtype=np.int8), cell_ids)
+        if not len(cells):
+            return {**{c: 0.0 if c in self.columns[SUM] else np.nan for c in self.feature_names}, "h3_cell_count": 0}
+        row = self.aggregate(cells, weights).iloc[0]
+        return {c: (int(v) if c == "h3_cell_count" else float(v)) for c, v in row.items()}
@@ -0,0 +1,28 @@
+"""
+Zoom levels and pixel tolerances shared by the app's maps and the overlay export.
+
+Overlays are simplified to one screen pixel at each of ZOOM_LEVELS and their
+coordinates rounded to the decimals that pixel can resolve. The gold
+export_map_overlays notebook precomputes them with these values and app/maps.py
+picks the level at or below the zoom its map opens at, so the two always agree.
+Standard library only, so the notebook imports it without pydeck or streamlit.
+"""
+import math
+
+ZOOM_LEVELS = (5, 8, 11, 14)
+
+
+def degrees_per_pixel(zoom):
+    """Width of one screen pixel in degrees of longitude at a web-mercator zoom level"""
+    return 360 / (256 * 2 ** zoom)
+
+
+def coordinate_decimals(tolerance):
+    """Decimals that resolve a tolerance in degrees, between 3 and 6"""
+    return min(max(math.ceil(-math.log10(tolerance)) + 1, 3), 6)
+
+
+def zoom_level(zoom):
+    """Nearest pre-simplified level at or below a view zoom"""
+    below = [z for z in ZOOM_LEVELS if z <= zoom]
+    return max(below) if below else min(ZOOM_LEVELS)
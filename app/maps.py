@@ -0,0 +1,270 @@
+"""
+Map rendering for the Streamlit app.
+
+Every layer is one batched deck.gl layer (pydeck) rather than one Leaflet
+object per row, so the browser draws points, polygons and H3 cells on the GPU
+and the page ships a single JSON payload per map:
+
+- Points above MAX_POINTS are binned on a grid into weighted bubbles, so the
+  payload is bounded by the bin count rather than the row count.
+- Polygons are simplified (Douglas-Peucker) to one pixel at the zoom level the
+  map opens at, from a fixed set of ZOOM_LEVELS (app/map_zoom.py), and
+  coordinates are rounded to that precision. Simplified geometries are cached per zoom level.
+- H3 cells are sent as ids only; deck.gl derives the hexagon outlines.
+
+Overlays exported by the gold export_map_overlays notebook are already
+simplified per zoom level; they are parsed once per export and reused by every
+session. Simplifying in the app is the fallback when that table is missing.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+import streamlit as st
+
+from map_zoom import coordinate_decimals, degrees_per_pixel, zoom_level
+
+MAP_STYLE = "https://basemaps.cartocdn.com/gl/dark-matter-gl-style/style.json"
+MAP_HEIGHT = 500
+MAP_WIDTH_PX = 900
+MAX_POINTS = 5000
+
+TOOLTIP_STYLE = {
+    "backgroundColor": "#1e293b",
+    "color": "#f1f5f9",
+    "fontFamily": "Inter, Arial",
+    "fontSize": "12px",
+}
+
+
+def view_state(*frames, lat_col="latitude", lon_col="longitude"):
+    """Initial view centred on the points of the given frames, zoomed to fit their extent"""
+    lats = np.concatenate([f[lat_col].to_numpy(float) for f in frames if not f.empty])
+    lons = np.concatenate([f[lon_col].to_numpy(float) for f in frames if not f.empty])
+    lat_mid = (lats.min() + lats.max()) / 2
+    span = max(lons.max() - lons.min(), (lats.max() - lats.min()) / np.cos(np.radians(lat_mid)), 0.01)
+    zoom = float(np.clip(np.log2(MAP_WIDTH_PX / 256 * 360 / span) - 0.5, 3, 15))
+    return pdk.ViewState(latitude=lat_mid, longitude=(lons.min() + lons.max()) / 2, zoom=zoom)
+
+
+def simplify_ring(coords, tolerance):
+    """Douglas-Peucker simplification of a closed ring; None when it collapses below tolerance"""
+    pts = np.asarray(coords, dtype=float)[:, :2]
+    if tolerance <= 0 or len(pts) <= 4:
+        return pts
+    keep = np.zeros(len(pts), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(pts) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end <= start + 1:
+            continue
+        segment = pts[start + 1:end]
+        a, b = pts[start], pts[end]
+        d = b - a
+        length = np.hypot(d[0], d[1])
+        if length == 0:
+            dist = np.hypot(segment[:, 0] - a[0], segment[:, 1] - a[1])
+        else:
+            dist = np.abs(d[0] * (segment[:, 1] - a[1]) - d[1] * (segment[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.extend([(start, split), (split, end)])
+    ring = pts[keep]
+    return ring if len(ring) >= 4 else None
+
+
+def _polygons(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiPolygon":
+        return geometry["coordinates"]
+    if geometry["type"] == "GeometryCollection":
+        return [p for g in geometry["geometries"] for p in _polygons(g)]
+    return []
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def simplify_geojson(geojson, level):
+    """
+    PolygonLayer rows ([outer, *holes] rings) for a column of GeoJSON strings,
+    simplified to one pixel at a zoom level. Returns (row index, polygon) pairs.
+    """
+    tolerance = degrees_per_pixel(level)
+    decimals = coordinate_decimals(tolerance)
+    rows = []
+    for idx, value in geojson.items():
+        if not isinstance(value, str) or not value:
+            continue
+        for polygon in _polygons(json.loads(value)):
+            rings = [simplify_ring(ring, tolerance) for ring in polygon]
+            if rings[0] is None:
+                continue
+            rows.append((idx, [np.round(r, decimals).tolist() for r in rings if r is not None]))
+    return rows
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def overlay_index(_overlays, export_version):
+    """
+    {(layer, zoom_level): {feature_id: [polygon, ...]}} of an overlay export. Cached as a
+    shared resource per export version, so each export is parsed once for all sessions.
+    """
+    index = {}
+    for layer, level, feature_id, value in zip(
+            _overlays["layer"], _overlays["zoom_level"], _overlays["feature_id"], _overlays["geojson"]):
+        index.setdefault((layer, int(level)), {}).setdefault(feature_id, []).extend(_polygons(json.loads(value)))
+    return index
+
+
+def overlay_layer(overlays, layer, zoom, layer_id, feature_ids=None, **style):
+    """
+    PolygonLayer from precomputed overlays at the exported level at or below the
+    view zoom, optionally limited to some features. None when the layer was not exported.
+    """
+    if overlays.empty:
+        return None
+    index = overlay_index(overlays, str(overlays["exported_at"].max()))
+    levels = sorted(level for name, level in index if name == layer)
+    if not levels:
+        return None
+    polygons = index[(layer, max([z for z in levels if z <= zoom] or levels[:1]))]
+    ids = polygons.keys() if feature_ids is None else [str(f) for f in feature_ids]
+    return _polygon_layer([p for f in ids for p in polygons.get(f, [])], layer_id, **style)
+
+
+def polygon_layer(df, geojson_col, zoom, layer_id, line_color, fill_color=(0, 0, 0, 0), line_width=1,
+                  tooltip=None):
+    """One PolygonLayer for every polygon in a GeoJSON column, simplified for the view zoom"""
+    rows = simplify_geojson(df[geojson_col], zoom_level(zoom))
+    tooltips = None
+    if tooltip:
+        tooltips = df.loc[[i for i, _ in rows]].apply(lambda r: tooltip.format(**r), axis=1).to_numpy()
+    return _polygon_layer([p for _, p in rows], layer_id, line_color, fill_color, line_width, tooltips)
+
+
+def geometry_layer(geometry, layer_id, **style):
+    """PolygonLayer for one GeoJSON geometry (e.g. a freshly routed isochrone)"""
+    return _polygon_layer(_polygons(geometry), layer_id, **style)
+
+
+def _polygon_layer(polygons, layer_id, line_color, fill_color=(0, 0, 0, 0), line_width=1, tooltips=None):
+    layer_data = pd.DataFrame({"polygon": polygons})
+    if tooltips is not None:
+        layer_data["tooltip"] = tooltips
+    return pdk.Layer(
+        "PolygonLayer",
+        data=layer_data,
+        id=layer_id,
+        get_polygon="polygon",
+        get_line_color=list(line_color),
+        get_fill_color=list(fill_color),
+        line_width_min_pixels=line_width,
+        stroked=True,
+        filled=fill_color[3] > 0,
+        pickable=tooltips is not None,
+    )
+
+
+def bin_points(df, max_points=MAX_POINTS, weight_col=None):
+    """
+    Grid-aggregate points into at most `max_points` bins (count, mean position,
+    optional summed weight). The cell size doubles until the bins fit.
+    """
+    lat = df["latitude"].to_numpy(float)
+    lon = df["longitude"].to_numpy(float)
+    cell = max(np.ptp(lat), np.ptp(lon), 1e-6) / np.sqrt(max_points)
+    while True:
+        keys = np.floor(lat / cell).astype(np.int64) * 1_000_003 + np.floor(lon / cell).astype(np.int64)
+        bins, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        if len(bins) <= max_points:
+            break
+        cell *= 2
+    binned = pd.DataFrame({
+        "latitude": np.bincount(inverse, lat) / counts,
+        "longitude": np.bincount(inverse, lon) / counts,
+        "count": counts,
+    })
+    if weight_col:
+        binned[weight_col] = np.bincount(inverse, df[weight_col].to_numpy(float))
+    return binned
+
+
+def points_layer(df, layer_id, fill_color, line_color, radius=8, tooltip=None, label="locations",
+                 weight_col=None, max_points=MAX_POINTS):
+    """
+    One ScatterplotLayer for a frame of points. Beyond `max_points` rows the
+    points are binned and drawn as bubbles sized by count.
+    """
+    if len(df) > max_points:
+        layer_data = bin_points(df, max_points, weight_col)
+        layer_data["radius"] = np.round(radius * np.sqrt(layer_data["count"]).clip(1, 6), 1)
+        layer_data["tooltip"] = [f"<b>{c:,} {label}</b>" for c in layer_data["count"]]
+    else:
+        layer_data = df[["latitude", "longitude"]].copy()
+        layer_data["radius"] = radius
+        if tooltip:
+            layer_data["tooltip"] = [tooltip.format(**r) for r in df.to_dict("records")]
+    layer_data[["latitude", "longitude"]] = layer_data[["latitude", "longitude"]].round(5)
+    return pdk.Layer(
+        "ScatterplotLayer",
+        data=layer_data,
+        id=layer_id,
+        get_position="[longitude, latitude]",
+        get_radius="radius",
+        radius_units="pixels",
+        get_fill_color=list(fill_color),
+        get_line_color=list(line_color),
+        line_width_min_pixels=2,
+        stroked=True,
+        pickable=True,
+    )
+
+
+def h3_layer(df, value_col, layer_id="h3_heatmap", label=None, opacity=0.6):
+    """
+    H3HexagonLayer colouring each cell by `value_col`. Values are rank-normalised
+    on the server so the colour ramp is computed per cell in the browser from one
+    number rather than shipped as an RGBA array per row.
+    """
+    label = label or value_col
+    values = df[value_col].fillna(0)
+    layer_data = pd.DataFrame({
+        "h3_cell_id": df["h3_cell_id"].astype(str),
+        "norm": values.rank(pct=True).round(3),
+        "tooltip": [f"<b>{label}:</b> {v:,.0f}" if abs(v) >= 10 else f"<b>{label}:</b> {v:,.2f}" for v in values],
+    })
+    return pdk.Layer(
+        "H3HexagonLayer",
+        data=layer_data,
+        id=layer_id,
+        get_hexagon="h3_cell_id",
+        get_fill_color="[255 * norm, 64 + 96 * (1 - norm), 255 * (1 - norm), 40 + 180 * norm]",
+        opacity=opacity,
+        stroked=False,
+        filled=True,
+        extruded=False,
+        pickable=True,
+    )
+
+
+def deck(layers, view):
+    return pdk.Deck(
+        layers=[layer for layer in layers if layer is not None],
+        initial_view_state=view,
+        map_style=MAP_STYLE,
+        tooltip={"html": "{tooltip}", "style": TOOLTIP_STYLE},
+    )
+
+
+def render(layers, view, height=MAP_HEIGHT, **kwargs):
+    """Draw the layers as one deck.gl map"""
+    return st.pydeck_chart(deck(layers, view), height=height, **kwargs)
+
+
+def payload_bytes(layers, view):
+    """Size of the JSON the browser receives for a map"""
+    return len(deck(layers, view).to_json())
@@ -0,0 +1,444 @@
+"""
+Network optimizer for selecting new store locations.
+
+Greedy selection ranks candidates by predicted sales and accepts each one that
+respects the minimum distance to existing stores and to sites already picked.
+Distance checks go through a uniform lat/lon grid so each candidate is only
+compared against stores in neighbouring buckets.
+
+Coverage selection treats H3 cells as demand nodes and each candidate's trade
+area cells as its coverage set. It solves max-coverage or p-median with a lazy
+greedy (priority queue) search, so overlapping demand is only counted once.
+
+Cannibalization selection ranks candidates by predicted sales net of the demand
+their trade area shares with open stores, read from the precomputed trade-area
+overlap matrix (app/trade_area_overlap.py), so no geometry is touched per run.
+"""
+import heapq
+import time
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_MILES = 3959
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance in miles; broadcasts over NumPy arrays"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_MILES * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+class GridIndex:
+    """
+    Fixed-radius neighbour index over lat/lon points.
+
+    Points are bucketed into cells at least `radius_miles` wide in both
+    directions, so every point within the radius of a query lies in the 3x3
+    block of cells around it. Longitude width is sized for the highest
+    latitude that will be indexed or queried (`max_abs_lat`).
+    """
+
+    def __init__(self, radius_miles, max_abs_lat):
+        self.radius_miles = float(radius_miles)
+        half_angle = self.radius_miles / (2 * EARTH_RADIUS_MILES)
+        cos_lat = np.cos(np.radians(min(abs(max_abs_lat), 89.0)))
+        self.lat_step = np.degrees(2 * half_angle)
+        self.lon_step = np.degrees(2 * np.arcsin(min(1.0, np.sin(half_angle) / cos_lat)))
+        self._buckets = {}
+
+    def _keys(self, lats, lons):
+        rows = np.floor(np.asarray(lats, dtype=float) / self.lat_step).astype(np.int64)
+        cols = np.floor(np.asarray(lons, dtype=float) / self.lon_step).astype(np.int64)
+        return rows, cols
+
+    def _neighbours(self, row, col):
+        lats, lons = [], []
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                bucket = self._buckets.get((row + dr, col + dc))
+                if bucket is not None:
+                    lats.append(bucket[0])
+                    lons.append(bucket[1])
+        if not lats:
+            return None
+        return np.concatenate(lats), np.concatenate(lons)
+
+    def add(self, lats, lons):
+        """Index one or more points"""
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lons = np.atleast_1d(np.asarray(lons, dtype=float))
+        rows, cols = self._keys(lats, lons)
+        keys, inverse = np.unique(np.stack([rows, cols], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for k, (row, col) in enumerate(keys):
+            member = inverse == k
+            key = (int(row), int(col))
+            old = self._buckets.get(key)
+            if old is None:
+                self._buckets[key] = (lats[member], lons[member])
+            else:
+                self._buckets[key] = (np.concatenate([old[0], lats[member]]), np.concatenate([old[1], lons[member]]))
+
+    def any_within(self, lat, lon):
+        """True if any indexed point is closer than the radius to (lat, lon)"""
+        row, col = self._keys(lat, lon)
+        near = self._neighbours(int(row), int(col))
+        if near is None:
+            return False
+        return bool((haversine_miles(lat, lon, near[0], near[1]) < self.radius_miles).any())
+
+    def any_within_many(self, lats, lons):
+        """Vectorized `any_within` for arrays of query points, evaluated one grid cell at a time"""
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        result = np.zeros(len(lats), dtype=bool)
+        if not self._buckets or len(lats) == 0:
+            return result
+
+        rows, cols = self._keys(lats, lons)
+        keys, inverse = np.unique(np.stack([rows, cols], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+
+        for k, (row, col) in enumerate(keys):
+            near = self._neighbours(int(row), int(col))
+            if near is None:
+                continue
+            idx = order[bounds[k]:bounds[k + 1]]
+            dist = haversine_miles(lats[idx, None], lons[idx, None], near[0][None, :], near[1][None, :])
+            result[idx] = (dist < self.radius_miles).any(axis=1)
+        return result
+
+
+def greedy_select(candidates, existing, max_stores, min_dist_new, min_dist_existing,
+                  score_col='predicted_annual_sales'):
+    """
+    Pick up to `max_stores` candidates in descending `score_col` order.
+
+    A candidate is skipped if it is closer than `min_dist_existing` miles to an
+    existing store or closer than `min_dist_new` miles to an already selected
+    site. Returns the selected candidate rows in pick order.
+    """
+    ranked = candidates.sort_values(score_col, ascending=False)
+    if ranked.empty or max_stores <= 0:
+        return ranked.iloc[:0].reset_index(drop=True)
+
+    cand_lat = ranked['latitude'].to_numpy(dtype=float)
+    cand_lon = ranked['longitude'].to_numpy(dtype=float)
+    exist_lat = existing['latitude'].to_numpy(dtype=float)
+    exist_lon = existing['longitude'].to_numpy(dtype=float)
+    max_abs_lat = float(np.abs(np.concatenate([cand_lat, exist_lat])).max())
+
+    # Existing stores never change, so screen every candidate against them up front
+    existing_index = GridIndex(min_dist_existing, max_abs_lat)
+    existing_index.add(exist_lat, exist_lon)
+    eligible = np.flatnonzero(~existing_index.any_within_many(cand_lat, cand_lon))
+
+    selected_index = GridIndex(min_dist_new, max_abs_lat)
+    picks = []
+    for i in eligible:
+        if len(picks) >= max_stores:
+            break
+        if selected_index.any_within(cand_lat[i], cand_lon[i]):
+            continue
+        picks.append(i)
+        selected_index.add(cand_lat[i], cand_lon[i])
+
+    return ranked.iloc[picks].reset_index(drop=True)
+
+
+def distance_rules(candidates, existing, min_dist_new, min_dist_existing):
+    """
+    Distance constraints of `greedy_select` for the heap-based selections:
+    (eligible, is_blocked, on_select) as taken by `lazy_greedy`, each None
+    when its distance is not given.
+    """
+    cand_lat = candidates['latitude'].to_numpy(dtype=float)
+    cand_lon = candidates['longitude'].to_numpy(dtype=float)
+    lats = [cand_lat] + ([existing['latitude'].to_numpy(dtype=float)] if existing is not None else [])
+    max_abs_lat = float(np.abs(np.concatenate(lats)).max()) if len(candidates) else 0.0
+
+    eligible = None
+    if min_dist_existing is not None and existing is not None and not existing.empty:
+        existing_index = GridIndex(min_dist_existing, max_abs_lat)
+        existing_index.add(existing['latitude'].to_numpy(dtype=float), existing['longitude'].to_numpy(dtype=float))
+        eligible = ~existing_index.any_within_many(cand_lat, cand_lon)
+
+    is_blocked = on_select = None
+    if min_dist_new is not None:
+        selected_index = GridIndex(min_dist_new, max_abs_lat)
+        is_blocked = lambda j: selected_index.any_within(cand_lat[j], cand_lon[j])
+        on_select = lambda j: selected_index.add(cand_lat[j], cand_lon[j])
+    return eligible, is_blocked, on_select
+
+
+def build_coverage(pairs, demand, site_ids, site_col='store_number', cell_col='h3_cell_id',
+                   weight_col='total_population', cost_col=None):
+    """
+    Convert (site, cell) pairs into CSR arrays over `site_ids` and the demand cells.
+
+    Returns (indptr, indices, costs, weights): the cells of site `j` are
+    `indices[indptr[j]:indptr[j + 1]]`, `costs` holds the matching `cost_col`
+    values (zeros when no cost column is given) and `weights` the demand weight
+    of every cell. Pairs whose site or cell is unknown are dropped.
+    """
+    cell_ids = demand[cell_col].to_numpy()
+    weights = demand[weight_col].fillna(0).to_numpy(dtype=float)
+    cell_pos = pd.Index(cell_ids).get_indexer(pairs[cell_col])
+    site_pos = pd.Index(site_ids).get_indexer(pairs[site_col])
+    keep = (cell_pos >= 0) & (site_pos >= 0)
+
+    site_pos = site_pos[keep]
+    cell_pos = cell_pos[keep]
+    costs = pairs[cost_col].to_numpy(dtype=float)[keep] if cost_col else np.zeros(keep.sum())
+
+    order = np.argsort(site_pos, kind="stable")
+    indptr = np.searchsorted(site_pos[order], np.arange(len(site_ids) + 1))
+    return indptr, cell_pos[order], costs[order], weights
+
+
+def lazy_greedy(indptr, indices, weights, max_sites, costs=None, base_cost=None,
+                eligible=None, is_blocked=None, on_select=None, time_budget_s=None):
+    """
+    Greedy facility selection with lazy gain evaluation.
+
+    Each demand cell `i` pays `weights[i] * current_cost[i]`, starting at
+    `base_cost` (1 everywhere when omitted). Opening site `j` lowers the cost of
+    each of its cells to `costs` (0 when omitted, i.e. max-coverage). The gain
+    of a site only shrinks as others open, so stale heap entries are
+    re-evaluated only when they reach the top.
+
+    `is_blocked(j)` can veto a site permanently (e.g. a distance rule against
+    sites already picked) and `on_select(j)` is called after each pick.
+    Returns (picks, gains, current_cost, completed), where `completed` is
+    False if `time_budget_s` ran out before `max_sites` sites were chosen.
+    """
+    started = time.perf_counter()
+    n_sites = len(indptr) - 1
+    costs = np.zeros(len(indices)) if costs is None else np.asarray(costs, dtype=float)
+    current = np.ones(len(weights)) if base_cost is None else np.asarray(base_cost, dtype=float).copy()
+
+    def gain(j):
+        cells = indices[indptr[j]:indptr[j + 1]]
+        if len(cells) == 0:
+            return 0.0
+        saving = current[cells] - costs[indptr[j]:indptr[j + 1]]
+        return float((weights[cells] * np.maximum(saving, 0)).sum())
+
+    # Initial gains for every site in one vectorized pass
+    saving = np.maximum(current[indices] - costs, 0) * weights[indices]
+    sizes = np.diff(indptr)
+    initial = np.zeros(n_sites)
+    nonempty = sizes > 0
+    if len(indices):
+        initial[nonempty] = np.add.reduceat(saving, indptr[:-1][nonempty])
+
+    sites = np.arange(n_sites) if eligible is None else np.flatnonzero(eligible)
+    heap = [(-initial[j], int(j)) for j in sites]
+    heapq.heapify(heap)
+
+    picks, gains = [], []
+    completed = True
+    while heap and len(picks) < max_sites:
+        if time_budget_s is not None and time.perf_counter() - started > time_budget_s:
+            completed = False
+            break
+        neg_gain, j = heapq.heappop(heap)
+        if is_blocked is not None and is_blocked(j):
+            continue
+        fresh = gain(j)
+        if heap and fresh < -heap[0][0]:
+            heapq.heappush(heap, (-fresh, j))
+            continue
+
+        picks.append(j)
+        gains.append(fresh)
+        cells = indices[indptr[j]:indptr[j + 1]]
+        np.minimum.at(current, cells, costs[indptr[j]:indptr[j + 1]])
+        if on_select is not None:
+            on_select(j)
+
+    return picks, gains, current, completed
+
+
+def coverage_select(candidates, coverage, demand, max_stores, existing_coverage=None,
+                    mode='max_coverage', min_dist_new=None, min_dist_existing=None,
+                    existing=None, time_budget_s=2.0, weight_col='total_population'):
+    """
+    Pick up to `max_stores` candidates that maximize covered demand.
+
+    `coverage` and `existing_coverage` hold one row per (store_number,
+    h3_cell_id) trade-area cell for candidates and existing stores; `demand`
+    holds one row per H3 cell with `weight_col`. In `p_median` mode they must
+    also carry site `latitude`/`longitude` and `cell_latitude`/`cell_longitude`,
+    and the objective becomes weighted distance to the nearest open store,
+    with cells outside every trade area charged the largest observed distance.
+
+    Distance constraints behave as in `greedy_select`. Returns the selected
+    rows in pick order with a `marginal_gain` column, and a stats dict.
+    """
+    started = time.perf_counter()
+    candidates = candidates.reset_index(drop=True)
+    site_ids = candidates['store_number'].to_numpy()
+    cost_col = None
+
+    if mode == 'p_median':
+        coverage = coverage.assign(distance_miles=haversine_miles(
+            coverage['latitude'], coverage['longitude'], coverage['cell_latitude'], coverage['cell_longitude']))
+        cost_col = 'distance_miles'
+    elif mode != 'max_coverage':
+        raise ValueError(f"Unknown optimization mode: {mode}")
+
+    indptr, indices, costs, weights = build_coverage(coverage, demand, site_ids, weight_col=weight_col, cost_col=cost_col)
+
+    ex_idx = np.zeros(0, dtype=np.int64)
+    ex_costs = np.zeros(0)
+    if existing_coverage is not None and not existing_coverage.empty:
+        if mode == 'p_median':
+            existing_coverage = existing_coverage.assign(distance_miles=haversine_miles(
+                existing_coverage['latitude'], existing_coverage['longitude'],
+                existing_coverage['cell_latitude'], existing_coverage['cell_longitude']))
+        ex_sites = existing_coverage['store_number'].drop_duplicates().to_numpy()
+        _, ex_idx, ex_costs, _ = build_coverage(existing_coverage, demand, ex_sites, weight_col=weight_col, cost_col=cost_col)
+
+    if mode == 'p_median':
+        all_costs = np.concatenate([costs, ex_costs])
+        base_cost = np.full(len(weights), float(all_costs.max()) if len(all_costs) else 0.0)
+    else:
+        base_cost = np.ones(len(weights))
+
+    # Demand already served by existing stores starts at its served cost
+    np.minimum.at(base_cost, ex_idx, ex_costs)
+
+    eligible, is_blocked, on_select = distance_rules(candidates, existing, min_dist_new, min_dist_existing)
+
+    picks, gains, current, completed = lazy_greedy(
+        indptr, indices, weights, max_stores, costs=costs, base_cost=base_cost,
+        eligible=eligible, is_blocked=is_blocked, on_select=on_select, time_budget_s=time_budget_s)
+
+    if mode == 'p_median':
+        objective = float((weights * current).sum())
+    else:
+        objective = float((weights * (current == 0)).sum())
+
+    selected = candidates.iloc[picks].reset_index(drop=True).assign(marginal_gain=gains)
+    stats = {
+        'mode': mode,
+        'objective': objective,
+        'completed': completed,
+        'candidates': len(candidates),
+        'demand_cells': len(weights),
+        'coverage_pairs': len(indices),
+        'seconds': time.perf_counter() - started,
+    }
+    return selected, stats
+
+
+def cannibalization_select(candidates, overlap, max_stores, cannibalization_rate=0.5,
+                           min_dist_new=None, min_dist_existing=None, existing=None, time_budget_s=2.0,
+                           score_col='predicted_annual_sales', share_col='shared_population_share'):
+    """
+    Pick up to `max_stores` candidates by predicted sales net of cannibalization.
+
+    `overlap` holds rows of the trade-area overlap matrix whose side a is a
+    candidate: `store_number_a`, `site_type_b` ('existing' or 'candidate'),
+    `store_number_b` and `share_col`, the share of a's trade-area demand that
+    b's trade area also covers. A candidate's net value is
+
+        score * (1 - cannibalization_rate * min(1, shares with open sites))
+
+    where open sites are every existing store plus the candidates already
+    picked. Net values only fall as sites open, so the search is a lazy greedy
+    over a priority queue, like `lazy_greedy`. Distance constraints behave as in
+    `greedy_select`. Returns the selected rows in pick order with `net_sales`
+    and `cannibalized_share` columns, and a stats dict.
+    """
+    started = time.perf_counter()
+    candidates = candidates.reset_index(drop=True)
+    site_index = pd.Index(candidates['store_number'])
+    scores = candidates[score_col].fillna(0).to_numpy(dtype=float)
+
+    a = site_index.get_indexer(overlap['store_number_a'])
+    shares = overlap[share_col].fillna(0).to_numpy(dtype=float)
+    is_existing = (overlap['site_type_b'] == 'existing').to_numpy()
+
+    # Every existing store is open from the start
+    open_share = np.zeros(len(candidates))
+    from_existing = is_existing & (a >= 0)
+    np.add.at(open_share, a[from_existing], shares[from_existing])
+
+    # Candidate-candidate overlap as CSR by side b: opening b adds its shares to each a
+    b = np.where(is_existing, -1, site_index.get_indexer(overlap['store_number_b']))
+    pairs = np.flatnonzero((a >= 0) & (b >= 0))
+    pairs = pairs[np.argsort(b[pairs], kind="stable")]
+    indptr = np.searchsorted(b[pairs], np.arange(len(candidates) + 1))
+    neighbours, neighbour_shares = a[pairs], shares[pairs]
+
+    def net(j):
+        return scores[j] * (1 - cannibalization_rate * min(1.0, open_share[j]))
+
+    eligible, is_blocked, on_select = distance_rules(candidates, existing, min_dist_new, min_dist_existing)
+    sites = np.arange(len(candidates)) if eligible is None else np.flatnonzero(eligible)
+    heap = [(-net(j), int(j)) for j in sites]
+    heapq.heapify(heap)
+
+    # The budget covers the search, as in lazy_greedy
+    search_started = time.perf_counter()
+    picks, values, cannibalized = [], [], []
+    completed = True
+    while heap and len(picks) < max_stores:
+        if time_budget_s is not None and time.perf_counter() - search_started > time_budget_s:
+            completed = False
+            break
+        _, j = heapq.heappop(heap)
+        if is_blocked is not None and is_blocked(j):
+            continue
+        fresh = net(j)
+        if heap and fresh < -heap[0][0]:
+            heapq.heappush(heap, (-fresh, j))
+            continue
+
+        picks.append(j)
+        values.append(fresh)
+        cannibalized.append(min(1.0, open_share[j]))
+        np.add.at(open_share, neighbours[indptr[j]:indptr[j + 1]], neighbour_shares[indptr[j]:indptr[j + 1]])
+        if on_select is not None:
+            on_select(j)
+
+    selected = candidates.iloc[picks].reset_index(drop=True).assign(net_sales=values,
+                                                                    cannibalized_share=cannibalized)
+    stats = {
+        'mode': 'cannibalization',
+        'objective': float(sum(values)),
+        'completed': completed,
+        'candidates': len(candidates),
+        'overlap_pairs': int((a >= 0).sum()),
+        'seconds': time.perf_counter() - started,
+    }
+    return selected, stats
+
+
+def coverage_objective(site_ids, coverage, demand, mode='max_coverage', existing_coverage=None,
+                       weight_col='total_population'):
+    """Score an arbitrary set of sites with the same objective `coverage_select` reports"""
+    frames = [coverage[coverage['store_number'].isin(site_ids)]]
+    if existing_coverage is not None:
+        frames.append(existing_coverage)
+    served = pd.concat(frames, ignore_index=True)
+    weights = demand.set_index('h3_cell_id')[weight_col].fillna(0)
+
+    if mode == 'p_median':
+        all_pairs = pd.concat(frames[1:] + [coverage], ignore_index=True)
+        uncovered = float(haversine_miles(all_pairs['latitude'], all_pairs['longitude'],
+                                          all_pairs['cell_latitude'], all_pairs['cell_longitude']).max())
+        served = served.assign(distance_miles=haversine_miles(
+            served['latitude'], served['longitude'], served['cell_latitude'], served['cell_longitude']))
+        best = served.groupby('h3_cell_id')['distance_miles'].min().reindex(weights.index).fillna(uncovered)
+        return float((weights * best).sum())
+
+    return float(weights[weights.index.isin(served['h3_cell_id'])].sum())
@@ -0,0 +1,154 @@
+"""
+Trained sales model shared by the gold notebooks and the app.
+
+A ridge (L2-regularized linear) regression of annual sales on trade-area
+features, fitted on RMC stores with known sales. The regularization strength is
+chosen by k-fold cross-validation. The fitted model is a JSON artifact
+(coefficients in raw feature units, intercept, feature list, metrics), stored as
+one versioned row of gold_sales_model_versions by train_sales_model:
+
+- predict_seed_point_sales scores seed points with `partition_predictor` in
+  mapInPandas; the artifact is parsed once per executor Python worker.
+- The app loads the latest version through the data layer; one site is a dot
+  product over a dozen features.
+
+Missing feature values count as 0, as in the formula the model replaces (no
+competitor within range gives no distance bonus). The Huff features come from the
+drive-time OD matrix (gold drive_time_od_matrix, app/drive_time_matrix.py) and are
+only used when the training table has them.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+FEATURES = [
+    "total_population", "total_poi_count",
+    "male_18_to_24", "female_18_to_24",
+    "income_100k_125k", "income_125k_150k", "income_150k_200k", "income_200k_plus",
+    "bachelors_degree", "masters_degree",
+    "distance_to_valuemart_miles", "distance_to_quickshop_market_miles",
+    "huff_captured_population", "huff_market_share",
+]
+TARGET = "annual_sales"
+ALPHAS = (0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+MODEL_TYPE = "ridge"
+
+# Models parsed in this Python process, by artifact
+_LOADED = {}
+
+
+def _matrix(df, features):
+    return np.nan_to_num(np.column_stack([pd.to_numeric(df[c]).to_numpy(dtype=np.float64, na_value=np.nan)
+                                          for c in features]))
+
+
+def _ridge(X, y, alpha):
+    """Coefficients on standardized features and the standardization, fitted by the normal equations"""
+    means = X.mean(axis=0)
+    scales = X.std(axis=0)
+    scales[scales == 0] = 1.0
+    Z = (X - means) / scales
+    weights = np.linalg.solve(Z.T @ Z + alpha * len(Z) * np.eye(Z.shape[1]), Z.T @ (y - y.mean()))
+    coefficients = weights / scales
+    return coefficients, y.mean() - means @ coefficients
+
+
+def _r2(y, predicted):
+    total = ((y - y.mean()) ** 2).sum()
+    return float(1 - ((y - predicted) ** 2).sum() / total) if total else 0.0
+
+
+class SalesModel:
+    """Linear sales model: intercept + features . coefficients, in raw feature units"""
+
+    def __init__(self, features, coefficients, intercept, alpha=None, metrics=None, version=None,
+                 trained_at=None, model_type=MODEL_TYPE):
+        self.features = list(features)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.alpha = alpha
+        self.metrics = metrics or {}
+        self.version = version
+        self.trained_at = trained_at
+        self.model_type = model_type
+
+    @classmethod
+    def fit(cls, df, features=FEATURES, target=TARGET, alphas=ALPHAS, folds=5, seed=0):
+        """Ridge fit with alpha chosen by k-fold cross-validated error; metrics are out-of-fold"""
+        features = [c for c in features if c in df.columns]
+        X = _matrix(df, features)
+        y = pd.to_numeric(df[target]).to_numpy(dtype=np.float64)
+        fold = np.random.default_rng(seed).permutation(len(y)) % max(2, min(folds, len(y)))
+
+        best = None
+        for alpha in alphas:
+            predicted = np.empty_like(y)
+            for k in np.unique(fold):
+                coefficients, intercept = _ridge(X[fold != k], y[fold != k], alpha)
+                predicted[fold == k] = intercept + X[fold == k] @ coefficients
+            error = float(np.mean((y - predicted) ** 2))
+            if best is None or error < best[0]:
+                best = (error, alpha, predicted)
+
+        _, alpha, predicted = best
+        coefficients, intercept = _ridge(X, y, alpha)
+        metrics = {
+            "rows": int(len(y)),
+            "cv_folds": int(len(np.unique(fold))),
+            "cv_r2": _r2(y, predicted),
+            "cv_mae": float(np.mean(np.abs(y - predicted))),
+            "train_r2": _r2(y, intercept + X @ coefficients),
+        }
+        return cls(features, coefficients, intercept, alpha, metrics)
+
+    def predict(self, df):
+        """Predicted annual sales (non-negative whole dollars) for every row of a frame"""
+        return np.clip(self.intercept + _matrix(df, self.features) @ self.coefficients, 0, None) \
+            .round().astype(np.int64)
+
+    def predict_one(self, features):
+        """Predicted annual sales of one site from a {feature: value} dict; absent features count as 0"""
+        x = np.array([features.get(c, np.nan) for c in self.features], dtype=np.float64)
+        return int(round(max(self.intercept + np.nan_to_num(x) @ self.coefficients, 0.0)))
+
+    def to_dict(self):
+        return {
+            "model_type": self.model_type,
+            "version": self.version,
+            "trained_at": self.trained_at,
+            "features": self.features,
+            "coefficients": dict(zip(self.features, self.coefficients.tolist())),
+            "intercept": self.intercept,
+            "alpha": self.alpha,
+            "metrics": self.metrics,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, artifact):
+        spec = json.loads(artifact)
+        return cls(spec["features"], [spec["coefficients"][c] for c in spec["features"]], spec["intercept"],
+                   spec.get("alpha"), spec.get("metrics"), spec.get("version"), spec.get("trained_at"),
+                   spec.get("model_type", MODEL_TYPE))
+
+
+def load(artifact):
+    """Model of a JSON artifact, parsed once per process"""
+    if artifact not in _LOADED:
+        _LOADED[artifact] = SalesModel.from_json(artifact)
+    return _LOADED[artifact]
+
+
+def partition_predictor(artifact, output_column="predicted_annual_sales"):
+    """mapInPandas function appending predicted sales to every batch; the model loads once per worker"""
+
+    def predict(batches):
+        model = load(artifact)
+        for batch in batches:
+            batch[output_column] = model.predict(batch)
+            yield batch
+
+    return predict
@@ -0,0 +1,176 @@
+"""
+In-process what-if scoring of arbitrary sites.
+
+A site is scored like a seed point in the gold pipeline, without writing it to a
+table or rerunning any notebooks:
+
+1. Route its drive-time isochrone with a warm Valhalla client (HTTP service or
+   in-process actor). Without Valhalla, a straight-line radius at an assumed
+   average speed stands in for the isochrone.
+2. Polyfill the isochrone to H3 cells at the feature resolution.
+3. Look the cells up in an in-memory H3FeatureStore of gold_h3_features
+   (app/h3_feature_store.py) and aggregate them the way
+   aggregate_trade_area_features does: counts are summed, distances take the minimum.
+4. When the model uses drive-time Huff features and a drive-time OD matrix has
+   been built, route the site from the cells in its k-ring and add its Huff
+   market share against the existing stores and competitors
+   (app/drive_time_matrix.py).
+5. Predict sales with the trained model that scores seed points (app/sales_model.py).
+"""
+import json
+import os
+import time
+
+import h3
+import numpy as np
+import requests
+
+from h3_feature_store import SUM, H3FeatureStore, cell_ids_to_int
+from sales_model import FEATURES
+
+H3_RESOLUTION = 8
+DEFAULT_DRIVE_MINUTES = 5
+
+
+def feature_store(df, features=FEATURES):
+    """
+    H3FeatureStore over the model features present in a frame of gold_h3_features
+    rows: distances take the minimum over the trade area, everything else is summed
+    """
+    features = [c for c in features if c in df.columns]
+    return H3FeatureStore.from_frame(
+        df,
+        sum_columns=[c for c in features if not c.startswith("distance_to_")],
+        min_columns=[c for c in features if c.startswith("distance_to_")],
+    )
+
+
+class _ValhallaIsochrones:
+    """Valhalla isochrone requests; subclasses send the request"""
+
+    approximate = False
+
+    def __init__(self, costing="auto"):
+        self.costing = costing
+
+    def polygon(self, latitude, longitude, minutes):
+        """GeoJSON geometry of one drive-time contour, or None when Valhalla returns none"""
+        query = {
+            "locations": [{"lat": float(latitude), "lon": float(longitude)}],
+            "costing": self.costing,
+            "contours": [{"time": float(minutes)}],
+            "polygons": True,
+        }
+        result = self._request(query)
+        for feature in (result or {}).get("features", []):
+            if feature.get("geometry"):
+                return feature["geometry"]
+        return None
+
+
+class ValhallaServiceIsochrones(_ValhallaIsochrones):
+    """Valhalla HTTP service over one keep-alive session"""
+
+    def __init__(self, url, costing="auto", timeout_seconds=10):
+        super().__init__(costing)
+        self.url = url.rstrip("/")
+        self.timeout_seconds = timeout_seconds
+        self.session = requests.Session()
+        self.name = f"Valhalla service ({self.url})"
+
+    def _request(self, query):
+        response = self.session.post(f"{self.url}/isochrone", json=query, timeout=self.timeout_seconds)
+        response.raise_for_status()
+        return response.json()
+
+
+class ValhallaActorIsochrones(_ValhallaIsochrones):
+    """In-process pyvalhalla actor, loaded once with its tiles"""
+
+    def __init__(self, config_path, costing="auto"):
+        import valhalla
+        super().__init__(costing)
+        self.actor = valhalla.Actor(config_path)
+        self.name = "Valhalla actor"
+
+    def _request(self, query):
+        result = self.actor.isochrone(json.dumps(query))
+        return json.loads(result) if isinstance(result, str) else result
+
+
+class RadiusIsochrones:
+    """Circle reachable at a constant average speed; an approximation when no router is available"""
+
+    approximate = True
+
+    def __init__(self, speed_mph=25.0, vertices=64):
+        self.speed_mph = speed_mph
+        self.vertices = vertices
+        self.name = f"Straight-line radius at {speed_mph:g} mph"
+
+    def polygon(self, latitude, longitude, minutes):
+        radius_miles = self.speed_mph * minutes / 60
+        angles = np.linspace(0, 2 * np.pi, self.vertices + 1)
+        lat = latitude + radius_miles / 69.0 * np.sin(angles)
+        lon = longitude + radius_miles / (69.0 * np.cos(np.radians(latitude))) * np.cos(angles)
+        return {"type": "Polygon", "coordinates": [np.column_stack([lon, lat]).tolist()]}
+
+
+def isochrones_from_env():
+    """VALHALLA_URL (HTTP service), else VALHALLA_CONFIG (local actor), else the radius approximation"""
+    costing = os.getenv("VALHALLA_COSTING", "auto")
+    if os.getenv("VALHALLA_URL"):
+        return ValhallaServiceIsochrones(os.environ["VALHALLA_URL"], costing)
+    if os.getenv("VALHALLA_CONFIG"):
+        return ValhallaActorIsochrones(os.environ["VALHALLA_CONFIG"], costing)
+    return RadiusIsochrones(float(os.getenv("SCORING_AVERAGE_SPEED_MPH", "25")))
+
+
+class SiteScorer:
+    """Scores (lat, lon) sites against an H3 feature store with a warm isochrone provider and a sales model"""
+
+    def __init__(self, store, isochrones, model, resolution=H3_RESOLUTION, huff=None):
+        self.store = store
+        self.isochrones = isochrones
+        self.model = model
+        self.resolution = resolution
+        self.huff = huff
+
+    def score(self, latitude, longitude, minutes=DEFAULT_DRIVE_MINUTES):
+        """Predicted sales, trade-area features, isochrone and per-step timings (ms) of one site"""
+        timings = {}
+        started = time.perf_counter()
+        geometry = self.isochrones.polygon(latitude, longitude, minutes)
+        if geometry is None:
+            raise ValueError(f"No {minutes}-minute isochrone for ({latitude:.5f}, {longitude:.5f})")
+        timings["isochrone_ms"] = (time.perf_counter() - started) * 1000
+
+        step = time.perf_counter()
+        cells = h3.geo_to_cells(geometry, self.resolution)
+        timings["polyfill_ms"] = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        features = self.store.aggregate_cells(cell_ids_to_int(list(cells)))
+        # Summed counts are made positive as in aggregate_trade_area_features
+        features.update({c: abs(v) for c, v in features.items() if c in self.store.columns[SUM]})
+        timings["features_ms"] = (time.perf_counter() - step) * 1000
+
+        if self.huff is not None:
+            step = time.perf_counter()
+            features.update(self.huff.features(latitude, longitude))
+            timings["huff_ms"] = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        predicted = self.model.predict_one(features)
+        timings["model_ms"] = (time.perf_counter() - step) * 1000
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+
+        return {
+            "latitude": latitude,
+            "longitude": longitude,
+            "drive_time_minutes": minutes,
+            "predicted_annual_sales": predicted,
+            "features": features,
+            "geometry": geometry,
+            "timings": timings,
+        }
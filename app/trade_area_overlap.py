@@ -0,0 +1,157 @@
+"""
+Trade-area overlap on H3 cell sets.
+
+Each trade area is held as a sorted, de-duplicated int64 array of the H3 cells
+its isochrone covers (CSR layout: one cell array, one offset per trade area).
+Overlap between trade areas comes from an inverted index, cell -> trade areas
+holding it: only trade areas that share a cell are ever paired, so the work
+grows with the number of (cell, trade area, trade area) triples instead of with
+the square of the number of trade areas, and no polygon is intersected.
+
+The matrix is sparse and symmetric, with one row per ordered pair (a, b) of
+trade areas sharing at least one cell:
+- shared_cells: cells in both trade areas
+- shared_<weight>: sum of a per-cell weight (population, POIs) over those cells
+- shared_<...>_share: the shared amount as a fraction of trade area a's total
+
+The gold trade_area_overlap notebook writes the matrix to Delta; the Network
+Optimizer (app/optimizer.py) reads the candidate rows to penalize cannibalization.
+"""
+import numpy as np
+import pandas as pd
+
+from h3_feature_store import cell_ids_to_int
+
+# Ordered pairs generated per batch of cells, to bound memory on dense areas
+BATCH_PAIRS = 5_000_000
+
+
+def _cell_batches(counts, batch_pairs):
+    """Slices of consecutive cells whose ordered pairs total about batch_pairs"""
+    pairs = counts.astype(np.int64) ** 2
+    batch = np.cumsum(pairs) // max(batch_pairs, 1)
+    bounds = np.flatnonzero(np.diff(batch)) + 1
+    return zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(counts)]]))
+
+
+class TradeAreaCellSets:
+    """Sorted int64 H3 cell array per trade area; trade area i holds cell_ids[indptr[i]:indptr[i + 1]]"""
+
+    def __init__(self, keys, indptr, cell_ids):
+        self.keys = keys.reset_index(drop=True)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.cell_ids = np.asarray(cell_ids, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df, key_columns, cell_column="h3_cell_id"):
+        """Cell sets from (key columns..., cell id) rows; cell ids are hex strings or int64"""
+        codes, uniques = pd.MultiIndex.from_frame(df[list(key_columns)]).factorize()
+        cells = cell_ids_to_int(df[cell_column].to_numpy())
+        order = np.lexsort((cells, codes))
+        codes, cells = codes[order], cells[order]
+        keep = np.ones(len(cells), dtype=bool)
+        keep[1:] = (codes[1:] != codes[:-1]) | (cells[1:] != cells[:-1])
+        codes, cells = codes[keep], cells[keep]
+        indptr = np.searchsorted(codes, np.arange(len(uniques) + 1))
+        return cls(uniques.set_names(list(key_columns)).to_frame(index=False), indptr, cells)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def counts(self):
+        return np.diff(self.indptr)
+
+    def cells_of(self, i):
+        return self.cell_ids[self.indptr[i]:self.indptr[i + 1]]
+
+    def to_frame(self):
+        """One row per trade area: key columns, h3_cells (sorted list of int64) and h3_cell_count"""
+        frame = self.keys.copy()
+        frame["h3_cells"] = [cells.tolist() for cells in np.split(self.cell_ids, self.indptr[1:-1])] \
+            if len(self) else []
+        frame["h3_cell_count"] = self.counts
+        return frame
+
+    def _weights(self, weights):
+        """Per-cell weights aligned with cell_ids; cells missing from `weights` weigh 0"""
+        if weights is None:
+            return {}
+        rows = pd.Index(cell_ids_to_int(weights.index.to_numpy())).get_indexer(self.cell_ids)
+        aligned = {}
+        for name in weights.columns:
+            values = np.append(pd.to_numeric(weights[name]).to_numpy(dtype=np.float64, na_value=0.0), 0.0)
+            aligned[name] = values[rows]
+        return aligned
+
+    def overlap(self, weights=None, batch_pairs=BATCH_PAIRS):
+        """
+        Sparse overlap matrix as a frame of ordered pairs (a, b), a != b. Key
+        columns are suffixed _a and _b. `weights` is a frame indexed by H3 cell
+        id whose numeric columns are summed over the shared cells.
+        """
+        aligned = self._weights(weights)
+        totals = self._totals(aligned)
+        owner = np.repeat(np.arange(len(self), dtype=np.int64), self.counts)
+        order = np.argsort(self.cell_ids, kind="stable")
+        sorted_cells = self.cell_ids[order]
+        owner = owner[order]
+        weights = {name: values[order] for name, values in aligned.items()}
+
+        # Posting lists: runs of equal cells; cells in a single trade area pair with nothing
+        starts = np.flatnonzero(np.concatenate([[True], sorted_cells[1:] != sorted_cells[:-1]]))
+        counts = np.diff(np.append(starts, len(sorted_cells)))
+        shared = counts > 1
+        starts, counts = starts[shared], counts[shared]
+
+        n = np.int64(len(self))
+        parts = []
+        for first, last in _cell_batches(counts, batch_pairs):
+            c, s = counts[first:last], starts[first:last]
+            # Every element of a posting list, then every ordered pair within it
+            group = np.repeat(np.arange(len(c)), c)
+            element = s[group] + np.arange(len(group)) - np.repeat(np.cumsum(c) - c, c)
+            a = np.repeat(element, c[group])
+            b = np.repeat(s[group], c[group]) + np.arange(len(a)) - np.repeat(np.cumsum(c[group]) - c[group],
+                                                                              c[group])
+            distinct = a != b
+            a, b = a[distinct], b[distinct]
+            codes, inverse = np.unique(owner[a] * n + owner[b], return_inverse=True)
+            part = {"code": codes, "shared_cells": np.bincount(inverse).astype(np.float64)}
+            for name, values in weights.items():
+                part[f"shared_{name}"] = np.bincount(inverse, weights=values[a], minlength=len(codes))
+            parts.append(pd.DataFrame(part))
+
+        columns = ["shared_cells"] + [f"shared_{name}" for name in weights]
+        if parts:
+            matrix = pd.concat(parts, ignore_index=True).groupby("code", sort=True)[columns].sum()
+            codes = matrix.index.to_numpy()
+        else:
+            matrix = pd.DataFrame(columns=columns, dtype=np.float64)
+            codes = np.zeros(0, dtype=np.int64)
+        a, b = codes // n, codes % n
+
+        result = pd.concat([self.keys.iloc[a].add_suffix("_a").reset_index(drop=True),
+                            self.keys.iloc[b].add_suffix("_b").reset_index(drop=True)], axis=1)
+        result["shared_cells"] = matrix["shared_cells"].to_numpy().astype(np.int64)
+        result["shared_cells_share"] = result["shared_cells"] / self.counts[a]
+        for name in weights:
+            result[f"shared_{name}"] = matrix[f"shared_{name}"].to_numpy()
+            with np.errstate(invalid="ignore", divide="ignore"):
+                share = result[f"shared_{name}"].to_numpy() / totals[name][a]
+            result[f"shared_{name}_share"] = np.nan_to_num(share)
+        return result
+
+    def totals(self, weights):
+        """Per-trade-area sum of each weight column ({name: array}); `weights` as in overlap()"""
+        return self._totals(self._weights(weights))
+
+    def _totals(self, weights):
+        nonempty = self.counts > 0
+        result = {}
+        for name, values in weights.items():
+            sums = np.zeros(len(self))
+            if len(values):
+                sums[nonempty] = np.add.reduceat(values, self.indptr[:-1][nonempty])
+            result[name] = sums
+        return result
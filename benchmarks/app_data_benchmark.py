@@ -0,0 +1,251 @@
+"""
+Benchmark the app data layer against the previous per-query fetch path, offline.
+
+A synthetic Massachusetts-sized local database (DuckDB when installed, else
+SQLite) holds one table per dataset of app/data.py. The legacy path opens a new
+connection for each distinct query the tabs issued, fetches Python row tuples
+and coerces every column with pd.to_numeric. The data layer is timed cold
+(pooled connection, Arrow fetch) and warm (served from the TTL cache).
+
+Usage:
+    python benchmarks/app_data_benchmark.py --stores 60 --candidates 10000 --cells 100000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+
+# Massachusetts bounding box
+LAT_MIN, LAT_MAX = 41.2, 42.9
+LON_MIN, LON_MAX = -73.5, -69.9
+
+STORE_FEATURES = [
+    "total_population", "total_poi_count",
+    "male_18_to_24", "female_18_to_24", "male_45_to_54", "female_45_to_54",
+    "income_100k_125k", "income_125k_150k", "income_150k_200k", "income_200k_plus",
+    "bachelors_degree", "masters_degree",
+    "distance_to_valuemart_miles", "distance_to_quickshop_market_miles",
+    "poi_count_amenity", "poi_count_leisure", "poi_count_shop", "poi_count_tourism",
+    "poi_count_office", "poi_count_public_transport",
+]
+
+SCORING_COUNTS = [
+    "total_population", "total_poi_count", "male_18_to_24", "female_18_to_24",
+    "income_100k_125k", "income_125k_150k", "income_150k_200k", "income_200k_plus",
+    "bachelors_degree", "masters_degree",
+]
+
+# Distinct queries the tabs issued before the data layer: (table, columns)
+LEGACY_QUERIES = [
+    ("store_network", "*"),
+    ("store_isochrones", "store_number, isochrone_geojson"),
+    ("state_boundary", "geometry_geojson"),
+    ("expansion_candidates", "*"),
+    ("store_network", "store_number, city, state, annual_sales, latitude, longitude, address, zip_code"),
+    ("store_locations", "latitude, longitude"),
+    ("expansion_candidates", "store_number, city, state, latitude, longitude, predicted_annual_sales, total_population"),
+    ("h3_demand", "*"),
+    ("candidate_trade_area_cells", "*"),
+    ("existing_trade_area_cells", "*"),
+]
+
+# Parameters of the parameterised datasets on a default page load
+PAGE_PARAMS = {"state_boundary": ("MA",), "h3_heatmap": (7,)}
+
+
+def polygon_geojson(lat, lon, radius_deg, vertices, rng):
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    radii = radius_deg * rng.uniform(0.6, 1.0, vertices)
+    ring = [[round(lon + r * np.cos(a), 6), round(lat + r * np.sin(a), 6)] for a, r in zip(angles, radii)]
+    return json.dumps({"type": "Polygon", "coordinates": [ring + ring[:1]]})
+
+
+def make_sites(n_sites, prefix, rng):
+    return pd.DataFrame({
+        "store_number": [f"{prefix}{i}" for i in range(n_sites)],
+        "city": rng.choice(["Boston", "Worcester", "Springfield", "Lowell", "Cambridge"], n_sites),
+        "state": "MA",
+        "latitude": rng.uniform(LAT_MIN, LAT_MAX, n_sites),
+        "longitude": rng.uniform(LON_MIN, LON_MAX, n_sites),
+    })
+
+
+def trade_area_cells(sites, n_cells, cells_per_site, rng):
+    site_idx = np.repeat(np.arange(len(sites)), cells_per_site)
+    return pd.DataFrame({
+        "store_number": sites["store_number"].to_numpy()[site_idx],
+        "latitude": sites["latitude"].to_numpy()[site_idx],
+        "longitude": sites["longitude"].to_numpy()[site_idx],
+        "h3_cell_id": rng.integers(0, n_cells, len(site_idx)).astype(str),
+        "cell_latitude": sites["latitude"].to_numpy()[site_idx] + rng.normal(0, 0.03, len(site_idx)),
+        "cell_longitude": sites["longitude"].to_numpy()[site_idx] + rng.normal(0, 0.03, len(site_idx)),
+    })
+
+
+def map_overlays(store_numbers, isochrones, zoom_levels=(5, 8, 11, 14)):
+    """Exported overlay rows: every polygon decimated and rounded per zoom level"""
+    rows = []
+    for zoom in zoom_levels:
+        step = max(1, 2 ** (14 - zoom) // 8)
+        for store_number, geojson in zip(store_numbers, isochrones):
+            ring = json.loads(geojson)["coordinates"][0]
+            ring = [[round(x, 5), round(y, 5)] for x, y in ring[:-1:step]]
+            rows.append(("store_trade_areas", store_number, zoom,
+                         json.dumps({"type": "Polygon", "coordinates": [ring + ring[:1]]})))
+    overlays = pd.DataFrame(rows, columns=["layer", "feature_id", "zoom_level", "geojson"])
+    overlays["exported_at"] = pd.Timestamp("2024-01-01")
+    return overlays
+
+
+def make_tables(args, rng):
+    stores = make_sites(args.stores, "S", rng)
+    stores["annual_sales"] = rng.normal(2_000_000, 400_000, args.stores).round()
+    for col in STORE_FEATURES:
+        stores[col] = rng.lognormal(8, 1, args.stores).round()
+    stores["address"] = [f"{i} Main St" for i in range(args.stores)]
+    stores["zip_code"] = "02139"
+
+    isochrones = [polygon_geojson(lat, lon, 0.05, args.isochrone_vertices, rng)
+                  for lat, lon in zip(stores["latitude"], stores["longitude"])]
+
+    candidates = make_sites(args.candidates, "C", rng)
+    candidates["predicted_annual_sales"] = rng.normal(1_500_000, 300_000, args.candidates).round()
+    candidates["total_population"] = rng.lognormal(10, 0.5, args.candidates).round()
+    candidates["total_poi_count"] = rng.poisson(300, args.candidates)
+    candidates["commute_under_10_min"] = rng.poisson(2000, args.candidates)
+
+    return {
+        "store_network": stores,
+        "store_locations": stores[["store_number", "latitude", "longitude"]],
+        "store_isochrones": pd.DataFrame({
+            "store_number": stores["store_number"],
+            "isochrone_geojson": isochrones,
+        }),
+        "map_overlays": map_overlays(stores["store_number"], isochrones),
+        "state_boundary": pd.DataFrame({
+            "state_abbr": ["MA"],
+            "geometry_geojson": [polygon_geojson(42.05, -71.7, 1.0, args.boundary_vertices, rng)],
+        }),
+        "expansion_candidates": candidates,
+        "h3_heatmap": pd.DataFrame({
+            "resolution": 7,
+            "h3_cell_id": np.arange(args.cells // 7).astype(str),
+            "total_population": rng.lognormal(8, 1.2, args.cells // 7).round(),
+            "total_poi_count": rng.poisson(20, args.cells // 7),
+            "urbanicity_score": rng.uniform(0, 1, args.cells // 7),
+        }),
+        "h3_scoring_features": pd.DataFrame({
+            "h3_cell_id": np.arange(args.cells).astype(str),
+            **{col: rng.lognormal(3, 1, args.cells).round() for col in SCORING_COUNTS},
+            "distance_to_valuemart_miles": rng.uniform(0, 10, args.cells),
+            "distance_to_quickshop_market_miles": rng.uniform(0, 10, args.cells),
+        }),
+        "h3_demand": pd.DataFrame({
+            "h3_cell_id": np.arange(args.cells).astype(str),
+            "total_population": rng.lognormal(6, 1.2, args.cells).round(),
+        }),
+        "candidate_trade_area_cells": trade_area_cells(candidates, args.cells, args.cells_per_site, rng),
+        "existing_trade_area_cells": trade_area_cells(stores, args.cells, args.cells_per_site, rng),
+    }
+
+
+def legacy_fetch(backend, sql):
+    """Previous app path: new connection per query, row tuples, to_numeric on every column"""
+    if backend.engine == "duckdb":
+        import duckdb
+        conn = duckdb.connect(backend.path)
+    else:
+        conn = sqlite3.connect(backend.path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        columns = [desc[0] for desc in cursor.description]
+        df = pd.DataFrame(cursor.fetchall(), columns=columns)
+        for col in df.columns:
+            try:
+                df[col] = pd.to_numeric(df[col])
+            except (ValueError, TypeError):
+                pass
+        return df
+    finally:
+        conn.close()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", type=int, default=60)
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--cells", type=int, default=100000)
+    parser.add_argument("--cells-per-site", type=int, default=100)
+    parser.add_argument("--isochrone-vertices", type=int, default=500)
+    parser.add_argument("--boundary-vertices", type=int, default=20000)
+    parser.add_argument("--reruns", type=int, default=5, help="Warm page reruns to time")
+    parser.add_argument("--db", help="Local database file (default: a temporary file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "site_selection.db")
+    assert not os.path.exists(db_path), f"{db_path} already exists; the benchmark writes a new database"
+    # The data layer picks its backend at import time
+    os.environ["SITE_SELECTION_LOCAL_DB"] = db_path
+    sys.path.insert(0, APP_DIR)
+    import data
+
+    rng = np.random.default_rng(args.seed)
+    tables = make_tables(args, rng)
+    writer = data.LocalBackend(db_path)
+    for name, df in tables.items():
+        writer.write_table(name, df)
+    writer.conn.close()
+    total_rows = sum(len(df) for df in tables.values())
+    print(f"Engine: {writer.engine}  Tables: {len(tables)}  Rows: {total_rows:,}  DB: {db_path}")
+
+    backend = data.get_backend()
+    results = []
+
+    legacy_seconds, _ = timed(lambda: [
+        legacy_fetch(backend, f"SELECT {columns} FROM {table}") for table, columns in LEGACY_QUERIES])
+    results.append({"path": "legacy_per_query", "queries": len(LEGACY_QUERIES), "seconds": legacy_seconds})
+
+    def page_load():
+        return [dataset(*PAGE_PARAMS.get(name, ())) for name, dataset in data.DATASETS.items()]
+
+    cold_seconds, frames = timed(page_load)
+    results.append({"path": "data_layer_cold", "queries": len(data.DATASETS), "seconds": cold_seconds})
+
+    warm_seconds, _ = timed(lambda: [page_load() for _ in range(args.reruns)])
+    results.append({"path": "data_layer_warm", "queries": 0, "seconds": warm_seconds / args.reruns})
+
+    data.invalidate("h3_demand")
+    invalidated_seconds, _ = timed(page_load)
+    results.append({"path": "data_layer_one_invalidated", "queries": 1, "seconds": invalidated_seconds})
+
+    assert sum(len(df) for df in frames) == total_rows, "Data layer returned a different row count"
+
+    print(f"\n{'path':<28}{'queries':>9}{'seconds':>10}")
+    for r in results:
+        print(f"{r['path']:<28}{r['queries']:>9}{r['seconds']:>10.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "engine": writer.engine, "rows": total_rows, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
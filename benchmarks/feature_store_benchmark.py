@@ -0,0 +1,163 @@
+"""
+Benchmark trade-area feature aggregation: join path against the H3 feature store, offline.
+
+A synthetic Massachusetts-sized feature table (one row per resolution-8 cell,
+with the count, median and distance columns of gold_h3_features) is aggregated
+over synthetic trade areas, each a disk of neighbouring cells. Paths:
+
+- join_groupby: the shape of aggregate_trade_area_features on Spark, run
+  single-node in pandas: explode (store, cell) pairs, inner join to the feature
+  table, groupBy store with sum/avg/min.
+- spark_join: the same plan on a local Spark session (--spark, needs pyspark).
+- feature_store: app/h3_feature_store.py. Load time (frame to arrays) is
+  reported separately from the batched aggregation; single trade-area latency
+  is what the what-if scorer pays per site.
+
+The feature store output is checked against join_groupby.
+
+Usage:
+    python benchmarks/feature_store_benchmark.py --cells 100000 --trade-areas 60 600 10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from h3_feature_store import H3FeatureStore  # noqa: E402
+
+# Resolution-8 cells of Massachusetts are laid out on a square grid of this many columns
+GRID_COLUMNS = 400
+
+
+def make_features(n_cells, n_sum, n_mean, n_min, rng):
+    """Feature table keyed by int64 cell id, with ~1% nulls in every column"""
+    columns = {
+        "sum": [f"count_{i}" for i in range(n_sum)],
+        "mean": [f"median_{i}" for i in range(n_mean)],
+        "min": [f"distance_to_{i}_miles" for i in range(n_min)],
+    }
+    df = pd.DataFrame({"h3_cell_id": np.arange(n_cells, dtype=np.int64) + 0x8828308281fffff})
+    for c in columns["sum"]:
+        df[c] = rng.lognormal(3, 1, n_cells).round()
+    for c in columns["mean"]:
+        df[c] = rng.lognormal(10, 0.5, n_cells)
+    for c in columns["min"]:
+        df[c] = rng.uniform(0, 20, n_cells)
+    for c in df.columns[1:]:
+        df.loc[rng.random(n_cells) < 0.01, c] = np.nan
+    return df, columns
+
+
+def make_trade_areas(n_trade_areas, n_cells, radius, rng):
+    """(store_number, h3_cell_id) pairs: a disk of grid cells around each site, some off the table"""
+    offsets = np.array([(dr, dc) for dr in range(-radius, radius + 1) for dc in range(-radius, radius + 1)
+                        if dr * dr + dc * dc <= radius * radius])
+    centers = rng.integers(0, n_cells, n_trade_areas)
+    rows = centers[:, None] // GRID_COLUMNS + offsets[None, :, 0]
+    cols = centers[:, None] % GRID_COLUMNS + offsets[None, :, 1]
+    cells = rows * GRID_COLUMNS + cols
+    return pd.DataFrame({
+        "store_number": np.repeat([f"S{i}" for i in range(n_trade_areas)], len(offsets)),
+        "h3_cell_id": cells.ravel().astype(np.int64) + 0x8828308281fffff,
+    })
+
+
+def join_groupby(pairs, features, columns):
+    joined = pairs.merge(features, on="h3_cell_id", how="inner")
+    aggs = {**{c: "sum" for c in columns["sum"]}, **{c: "mean" for c in columns["mean"]},
+            **{c: "min" for c in columns["min"]}, "h3_cell_id": "count"}
+    return joined.groupby("store_number", sort=False).agg(aggs).rename(columns={"h3_cell_id": "h3_cell_count"})
+
+
+def spark_join(spark, pairs_sdf, features_sdf, columns):
+    from pyspark.sql import functions as F
+    aggs = ([F.sum(c).alias(c) for c in columns["sum"]] + [F.avg(c).alias(c) for c in columns["mean"]]
+            + [F.min(c).alias(c) for c in columns["min"]] + [F.count("h3_cell_id").alias("h3_cell_count")])
+    return pairs_sdf.join(features_sdf, "h3_cell_id", "inner").groupBy("store_number").agg(*aggs).collect()
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=100000, help="Cells in the feature table")
+    parser.add_argument("--trade-areas", type=int, nargs="+", default=[60, 600, 10000])
+    parser.add_argument("--radius", type=int, default=18, help="Trade-area radius in cells (~1000 cells)")
+    parser.add_argument("--sum-columns", type=int, default=55)
+    parser.add_argument("--mean-columns", type=int, default=6)
+    parser.add_argument("--min-columns", type=int, default=4)
+    parser.add_argument("--spark", action="store_true", help="Also time the join on a local Spark session")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    features, columns = make_features(args.cells, args.sum_columns, args.mean_columns, args.min_columns, rng)
+
+    load_seconds, store = timed(lambda: H3FeatureStore.from_frame(
+        features, sum_columns=columns["sum"], mean_columns=columns["mean"], min_columns=columns["min"]))
+    print(f"Feature store: {len(store):,} cells x {len(store.feature_names)} features, "
+          f"{store.nbytes / 1e6:,.1f} MB, loaded in {load_seconds:.3f} s")
+
+    spark = features_sdf = None
+    if args.spark:
+        from pyspark.sql import SparkSession
+        spark = SparkSession.builder.master("local[*]").appName("feature_store_benchmark").getOrCreate()
+        spark.conf.set("spark.sql.execution.arrow.pyspark.enabled", "true")
+        features_sdf = spark.createDataFrame(features).cache()
+        features_sdf.count()
+
+    results = []
+    for n in args.trade_areas:
+        pairs = make_trade_areas(n, args.cells, args.radius, rng)
+
+        join_seconds, expected = timed(lambda: join_groupby(pairs, features, columns))
+        results.append({"path": "join_groupby", "trade_areas": n, "pairs": len(pairs), "seconds": join_seconds})
+
+        if spark is not None:
+            pairs_sdf = spark.createDataFrame(pairs).cache()
+            pairs_sdf.count()
+            spark_seconds, _ = timed(lambda: spark_join(spark, pairs_sdf, features_sdf, columns))
+            results.append({"path": "spark_join", "trade_areas": n, "pairs": len(pairs), "seconds": spark_seconds})
+            pairs_sdf.unpersist()
+
+        def feature_store():
+            cells = store.group(pairs["store_number"].to_numpy(), pairs["h3_cell_id"].to_numpy())
+            return store.aggregate(cells)
+
+        store_seconds, actual = timed(feature_store)
+        results.append({"path": "feature_store", "trade_areas": n, "pairs": len(pairs), "seconds": store_seconds})
+
+        actual = actual[actual["h3_cell_count"] > 0].loc[expected.index, expected.columns]
+        assert np.allclose(actual.to_numpy(), expected.to_numpy(dtype=np.float64), equal_nan=True), \
+            "Feature store differs from the join"
+
+    one = make_trade_areas(1, args.cells, args.radius, rng)["h3_cell_id"].to_numpy()
+    single_seconds, _ = timed(lambda: store.aggregate_cells(one), repeat=100)
+    results.append({"path": "feature_store_single", "trade_areas": 1, "pairs": len(one), "seconds": single_seconds})
+
+    print(f"\n{'path':<22}{'trade_areas':>12}{'pairs':>12}{'seconds':>10}{'pairs/s':>14}")
+    for r in results:
+        print(f"{r['path']:<22}{r['trade_areas']:>12,}{r['pairs']:>12,}{r['seconds']:>10.4f}"
+              f"{r['pairs'] / r['seconds']:>14,.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "load_seconds": load_seconds, "store_bytes": store.nbytes,
+                       "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Measure the map payload the app sends to the browser as layers grow.
+
+Points are drawn one row per point and through the binned ScatterplotLayer of
+app/maps.py; trade-area polygons are drawn at full detail and simplified for
+each pre-simplified zoom level. Payload is the serialized deck.gl JSON.
+
+Usage:
+    python benchmarks/map_payload_benchmark.py --points 1000 10000 100000 1000000 --polygons 60 600
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import maps  # noqa: E402
+
+# Massachusetts bounding box
+LAT_MIN, LAT_MAX = 41.2, 42.9
+LON_MIN, LON_MAX = -73.5, -69.9
+
+
+def make_points(n_points, rng):
+    return pd.DataFrame({
+        "store_number": [f"C{i}" for i in range(n_points)],
+        "latitude": rng.uniform(LAT_MIN, LAT_MAX, n_points),
+        "longitude": rng.uniform(LON_MIN, LON_MAX, n_points),
+        "predicted_annual_sales": rng.normal(1_500_000, 300_000, n_points).round(),
+    })
+
+
+def make_isochrones(n_polygons, vertices, rng):
+    """Lobed drive-time polygons with slightly noisy radii, as GeoJSON strings"""
+    sites = make_points(n_polygons, rng)
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    geojson = []
+    for lat, lon in zip(sites["latitude"], sites["longitude"]):
+        phase = rng.uniform(0, 2 * np.pi, 2)
+        radii = 0.08 * (0.8 + 0.15 * np.sin(3 * angles + phase[0]) + 0.05 * np.sin(7 * angles + phase[1])) \
+            + rng.normal(0, 0.0005, vertices)
+        ring = np.column_stack([lon + radii * np.cos(angles), lat + radii * np.sin(angles)]).tolist()
+        geojson.append(json.dumps({"type": "Polygon", "coordinates": [ring + ring[:1]]}))
+    sites["isochrone_geojson"] = geojson
+    return sites
+
+
+def measure(layers, view):
+    started = time.perf_counter()
+    size = maps.payload_bytes(layers, view)
+    return size, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--polygons", type=int, nargs="+", default=[60, 600])
+    parser.add_argument("--vertices", type=int, default=2000, help="Vertices per isochrone polygon")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    style = dict(fill_color=(96, 165, 250, 204), line_color=(59, 130, 246, 255),
+                 tooltip="<b>{store_number}</b><br/>${predicted_annual_sales:,.0f}")
+    results = []
+
+    for n in args.points:
+        points = make_points(n, rng)
+        view = maps.view_state(points)
+        for mode, max_points in (("per_point", n), ("binned", maps.MAX_POINTS)):
+            size, seconds = measure([maps.points_layer(points, "points", max_points=max_points, **style)], view)
+            results.append({"layer": "points", "rows": n, "mode": mode, "bytes": size, "seconds": seconds})
+
+    for n in args.polygons:
+        isochrones = make_isochrones(n, args.vertices, rng)
+        view = maps.view_state(isochrones)
+        full = maps.pdk.Layer("PolygonLayer", data=pd.DataFrame({"polygon": [
+            json.loads(g)["coordinates"] for g in isochrones["isochrone_geojson"]]}), get_polygon="polygon")
+        for level in (None, *maps.ZOOM_LEVELS):
+            layer = full if level is None else maps.polygon_layer(
+                isochrones, "isochrone_geojson", level, "trade_areas", line_color=(59, 130, 246, 255))
+            size, seconds = measure([layer], view)
+            results.append({"layer": "polygons", "rows": n, "mode": "full" if level is None else f"zoom_{level}",
+                            "bytes": size, "seconds": seconds})
+
+    print(f"{'layer':<10}{'rows':>10}{'mode':>12}{'bytes':>14}{'bytes/row':>12}{'seconds':>10}")
+    for r in results:
+        print(f"{r['layer']:<10}{r['rows']:>10,}{r['mode']:>12}{r['bytes']:>14,}"
+              f"{r['bytes'] / r['rows']:>12,.1f}{r['seconds']:>10.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
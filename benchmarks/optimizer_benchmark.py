@@ -0,0 +1,156 @@
+"""
+Benchmark the Network Optimizer solvers on a synthetic Massachusetts-sized problem.
+
+Demand cells sit on a regular lat/lon lattice (a stand-in for H3 res-8 cells)
+with log-normal population, and every candidate covers the cells within a fixed
+radius (a stand-in for its drive-time isochrone). The sales-ranked greedy loop
+used by the app is compared with lazy-greedy max-coverage and p-median on wall
+time and on both coverage objectives.
+
+Usage:
+    python benchmarks/optimizer_benchmark.py --candidates 10000 --cells 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from optimizer import coverage_objective, coverage_select, greedy_select, haversine_miles  # noqa: E402
+
+# Massachusetts bounding box
+LAT_MIN, LAT_MAX = 41.2, 42.9
+LON_MIN, LON_MAX = -73.5, -69.9
+
+
+def make_demand(n_cells, rng):
+    """Regular lattice of demand cells with log-normal population"""
+    side_lat = int(np.sqrt(n_cells * (LAT_MAX - LAT_MIN) / (LON_MAX - LON_MIN) / 0.74))
+    side_lon = int(np.ceil(n_cells / side_lat))
+    lat_axis = np.linspace(LAT_MIN, LAT_MAX, side_lat)
+    lon_axis = np.linspace(LON_MIN, LON_MAX, side_lon)
+    grid_lat, grid_lon = np.meshgrid(lat_axis, lon_axis, indexing="ij")
+    demand = pd.DataFrame({
+        "h3_cell_id": np.arange(grid_lat.size),
+        "cell_latitude": grid_lat.ravel(),
+        "cell_longitude": grid_lon.ravel(),
+        "total_population": rng.lognormal(mean=6, sigma=1.2, size=grid_lat.size).round(),
+    })
+    return demand, lat_axis, lon_axis
+
+
+def make_sites(n_sites, prefix, rng):
+    return pd.DataFrame({
+        "store_number": [f"{prefix}{i}" for i in range(n_sites)],
+        "latitude": rng.uniform(LAT_MIN, LAT_MAX, n_sites),
+        "longitude": rng.uniform(LON_MIN, LON_MAX, n_sites),
+    })
+
+
+def make_coverage(sites, demand, lat_axis, lon_axis, radius_miles):
+    """(store_number, h3_cell_id) pairs for every lattice cell within `radius_miles` of a site"""
+    lat_step = lat_axis[1] - lat_axis[0]
+    lon_step = lon_axis[1] - lon_axis[0]
+    reach_lat = int(np.ceil(radius_miles / 69.0 / lat_step))
+    reach_lon = int(np.ceil(radius_miles / (69.0 * np.cos(np.radians(LAT_MAX))) / lon_step))
+    d_row, d_col = np.meshgrid(np.arange(-reach_lat, reach_lat + 1), np.arange(-reach_lon, reach_lon + 1), indexing="ij")
+
+    rows = np.rint((sites["latitude"].to_numpy() - lat_axis[0]) / lat_step).astype(int)[:, None] + d_row.ravel()
+    cols = np.rint((sites["longitude"].to_numpy() - lon_axis[0]) / lon_step).astype(int)[:, None] + d_col.ravel()
+    site_idx = np.broadcast_to(np.arange(len(sites))[:, None], rows.shape)
+    inside = (rows >= 0) & (rows < len(lat_axis)) & (cols >= 0) & (cols < len(lon_axis))
+    rows, cols, site_idx = rows[inside], cols[inside], site_idx[inside]
+
+    cells = rows * len(lon_axis) + cols
+    site_lat = sites["latitude"].to_numpy()[site_idx]
+    site_lon = sites["longitude"].to_numpy()[site_idx]
+    cell_lat = demand["cell_latitude"].to_numpy()[cells]
+    cell_lon = demand["cell_longitude"].to_numpy()[cells]
+    within = haversine_miles(site_lat, site_lon, cell_lat, cell_lon) < radius_miles
+
+    return pd.DataFrame({
+        "store_number": sites["store_number"].to_numpy()[site_idx[within]],
+        "latitude": site_lat[within],
+        "longitude": site_lon[within],
+        "h3_cell_id": cells[within],
+        "cell_latitude": cell_lat[within],
+        "cell_longitude": cell_lon[within],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--existing", type=int, default=60)
+    parser.add_argument("--cells", type=int, default=100000)
+    parser.add_argument("--radius-miles", type=float, default=3.0)
+    parser.add_argument("--max-stores", type=int, default=20)
+    parser.add_argument("--min-dist-new", type=float, default=3.0)
+    parser.add_argument("--min-dist-existing", type=float, default=2.0)
+    parser.add_argument("--time-budget", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    demand, lat_axis, lon_axis = make_demand(args.cells, rng)
+    candidates = make_sites(args.candidates, "C", rng)
+    existing = make_sites(args.existing, "E", rng)
+    coverage = make_coverage(candidates, demand, lat_axis, lon_axis, args.radius_miles)
+    existing_coverage = make_coverage(existing, demand, lat_axis, lon_axis, args.radius_miles)
+
+    # Predicted sales follow trade-area population with noise, like the gold formula
+    population = coverage.merge(demand[["h3_cell_id", "total_population"]], on="h3_cell_id") \
+        .groupby("store_number")["total_population"].sum()
+    candidates["predicted_annual_sales"] = (
+        300000 + candidates["store_number"].map(population).fillna(0) / 100 * 30
+        + rng.normal(0, 50000, len(candidates))
+    ).round()
+
+    print(f"Demand cells: {len(demand):,}  Candidates: {len(candidates):,}  "
+          f"Coverage pairs: {len(coverage):,}  Existing stores: {len(existing):,}")
+
+    constraints = dict(min_dist_new=args.min_dist_new, min_dist_existing=args.min_dist_existing)
+    results = []
+
+    started = time.perf_counter()
+    greedy = greedy_select(candidates, existing, args.max_stores, **constraints)
+    greedy_seconds = time.perf_counter() - started
+    results.append({
+        "solver": "sales_greedy",
+        "seconds": greedy_seconds,
+        "sites": len(greedy),
+        "covered_population": coverage_objective(greedy["store_number"], coverage, demand, "max_coverage", existing_coverage),
+        "weighted_distance": coverage_objective(greedy["store_number"], coverage, demand, "p_median", existing_coverage),
+    })
+
+    for mode in ("max_coverage", "p_median"):
+        selected, stats = coverage_select(
+            candidates, coverage, demand, args.max_stores, existing_coverage=existing_coverage,
+            mode=mode, existing=existing, time_budget_s=args.time_budget, **constraints)
+        results.append({
+            "solver": mode,
+            "seconds": stats["seconds"],
+            "sites": len(selected),
+            "completed": stats["completed"],
+            "covered_population": coverage_objective(selected["store_number"], coverage, demand, "max_coverage", existing_coverage),
+            "weighted_distance": coverage_objective(selected["store_number"], coverage, demand, "p_median", existing_coverage),
+        })
+
+    print(f"\n{'solver':<14}{'seconds':>10}{'sites':>7}{'covered population':>22}{'weighted distance':>20}")
+    for r in results:
+        print(f"{r['solver']:<14}{r['seconds']:>10.3f}{r['sites']:>7}{r['covered_population']:>22,.0f}{r['weighted_distance']:>20,.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
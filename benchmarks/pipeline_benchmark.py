@@ -0,0 +1,724 @@
+"""
+End-to-end pipeline benchmark on synthetic data, runnable offline.
+
+Synthetic inputs at 1x/10x/100x Massachusetts (benchmarks/synthetic_data.py) are
+run through the shapes of the pipeline's stages on a local engine, DuckDB or
+local Spark (--engine spark, needs pyspark and Java):
+
+- blockgroup_h3_coverage: block group -> resolution-8 cell area ratios from
+  child-cell counts (silver blockgroup_h3_coverage)
+- create_h3_features: POI and competitor counts, area-weighted demographics,
+  largest-overlap medians, nearest-neighbour distances and urbanicity per cell
+  (silver create_h3_features)
+- trade_area_h3_cells: isochrone polyfill of stores and seed points
+- aggregate_trade_area_features: join + group-by of trade-area cells to features
+  (Spark path of gold aggregate_trade_area_features)
+- aggregate_trade_area_features_store: the same through app/h3_feature_store.py,
+  checked against the join
+- trade_area_overlap: population/POI overlap of every pair of trade areas as a
+  self-join on shared cells
+- trade_area_overlap_index: the same through the inverted index of
+  app/trade_area_overlap.py, checked against the self-join
+- drive_time_od_matrix: k-ring pruned (cell, store) pairs of stores,
+  competitors and seed points, routed per block through app/drive_time_matrix.py
+  with straight-line drive times standing in for Valhalla (gold
+  drive_time_od_matrix without the router)
+- huff_market_share: Huff captured population and market share per store and
+  candidate, checked to split each reached cell's population exactly once
+- train_sales_model / predict_seed_point_sales: app/sales_model.py fitted on
+  store features labelled by the formula it replaced, then seed points scored
+  in Arrow batches (mapInPandas on Spark)
+
+Joins, group-bys and windows run as SQL on the engine. The H3 functions used by
+the notebooks are Databricks built-ins, so indexing and polyfill run in h3-py on
+the driver. That SQL is a stand-in re-implementation of the notebooks' Spark
+code and gives no regression signal for it; the nearest-neighbour distances
+(h3_nearest_neighbors), feature column names (h3_feature_schema) and the app
+modules are imported and run as the notebooks run them.
+
+Each stage appends a record (commit, engine, scale, stage, seconds, peak RSS of
+this process and its children, shuffle bytes written on Spark, rows) to a JSON
+lines results file. --compare prints two commits' latest records side by side.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py --scales 1 10 --results benchmarks/results.jsonl
+    python benchmarks/pipeline_benchmark.py --engine spark --scales 1 --results benchmarks/results.jsonl
+    python benchmarks/pipeline_benchmark.py --compare benchmarks/results.jsonl
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import h3
+import numpy as np
+import pandas as pd
+from h3.api import numpy_int as h3_int
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transformations", "02_silver"))
+
+import drive_time_matrix  # noqa: E402
+import h3_feature_schema  # noqa: E402
+import h3_nearest_neighbors  # noqa: E402
+import sales_model  # noqa: E402
+import synthetic_data  # noqa: E402
+from h3_feature_store import H3FeatureStore  # noqa: E402
+from sales_model_benchmark import formula_sales  # noqa: E402
+from trade_area_overlap import TradeAreaCellSets  # noqa: E402
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+STAGES = [
+    "blockgroup_h3_coverage",
+    "create_h3_features",
+    "trade_area_h3_cells",
+    "aggregate_trade_area_features",
+    "aggregate_trade_area_features_store",
+    "trade_area_overlap",
+    "trade_area_overlap_index",
+    "drive_time_od_matrix",
+    "huff_market_share",
+    "train_sales_model",
+    "predict_seed_point_sales",
+]
+
+
+# ---------------------------------------------------------------------------
+# Engines: load a pandas frame as a table, create a table from SQL, fetch results
+
+
+class DuckDBEngine:
+    name = "duckdb"
+
+    def __init__(self, args):
+        import duckdb
+        self.con = duckdb.connect()
+        if args.threads:
+            self.con.execute(f"SET threads = {args.threads}")
+
+    def load(self, name, df):
+        self.con.register("_frame", df)
+        self.con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM _frame")
+        self.con.unregister("_frame")
+        return len(df)
+
+    def create(self, name, sql):
+        self.con.execute(f"CREATE OR REPLACE TABLE {name} AS {sql}")
+        return self.con.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+    def fetch(self, sql):
+        return self.con.execute(sql).df()
+
+    def map_batches(self, name, sql, fn, batch_rows):
+        """Table of fn applied to the Arrow record batches of a query"""
+        result = self.con.execute(sql)
+        # to_arrow_reader replaces fetch_record_batch in DuckDB 1.4
+        reader = getattr(result, "to_arrow_reader", result.fetch_record_batch)(batch_rows)
+        frames = list(fn(batch.to_pandas() for batch in reader))
+        return self.load(name, pd.concat(frames, ignore_index=True) if frames else pd.DataFrame())
+
+    def shuffle_bytes(self):
+        return None
+
+    def close(self):
+        self.con.close()
+
+
+class SparkEngine:
+    """Local Spark session; tables are cached temp views"""
+
+    name = "spark"
+
+    def __init__(self, args):
+        from pyspark.sql import SparkSession
+        self.spark = SparkSession.builder \
+            .master(f"local[{args.threads or '*'}]") \
+            .appName("pipeline_benchmark") \
+            .config("spark.driver.memory", args.spark_driver_memory) \
+            .config("spark.sql.shuffle.partitions", str(args.shuffle_partitions)) \
+            .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
+            .config("spark.sql.execution.arrow.maxRecordsPerBatch", str(args.batch_rows)) \
+            .getOrCreate()
+        self.tables = {}
+
+    def _register(self, name, sdf):
+        sdf = sdf.cache()
+        rows = sdf.count()
+        sdf.createOrReplaceTempView(name)
+        if name in self.tables:
+            self.tables[name].unpersist()
+        self.tables[name] = sdf
+        return rows
+
+    def load(self, name, df):
+        return self._register(name, self.spark.createDataFrame(df))
+
+    def create(self, name, sql):
+        return self._register(name, self.spark.sql(sql))
+
+    def fetch(self, sql):
+        return self.spark.sql(sql).toPandas()
+
+    def map_batches(self, name, sql, fn, batch_rows):
+        from pyspark.sql.types import LongType, StructField, StructType
+        sdf = self.spark.sql(sql)
+        schema = StructType(sdf.schema.fields + [StructField("predicted_annual_sales", LongType())])
+        return self._register(name, sdf.mapInPandas(fn, schema=schema))
+
+    def shuffle_bytes(self):
+        """Shuffle bytes written by every stage of the application so far, from the UI's REST API"""
+        sc = self.spark.sparkContext
+        if not sc.uiWebUrl:
+            return None
+        try:
+            with urllib.request.urlopen(f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/stages") as r:
+                return sum(stage.get("shuffleWriteBytes", 0) for stage in json.load(r))
+        except OSError:
+            return None
+
+    def close(self):
+        self.spark.stop()
+
+
+ENGINES = {"duckdb": DuckDBEngine, "spark": SparkEngine}
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _process_tree(pid):
+    pids = [pid]
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return pids
+    for tid in tids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                for child in f.read().split():
+                    pids.extend(_process_tree(int(child)))
+        except OSError:
+            pass
+    return pids
+
+
+class PeakMemory:
+    """Peak RSS of this process and its children (the Spark JVM) while the block runs"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._proc = os.path.exists(f"/proc/{os.getpid()}/task")
+
+    def _sample(self):
+        return sum(_rss_bytes(pid) for pid in _process_tree(os.getpid()))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._sample())
+
+    def __enter__(self):
+        if self._proc:
+            self.peak = self._sample()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._proc:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, self._sample())
+        else:
+            # Lifetime peak of this process only (kilobytes on Linux, bytes on macOS)
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            self.peak = maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def git_commit():
+    """Short hash of HEAD, suffixed +dirty when tracked files have uncommitted changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}+dirty" if dirty else commit
+
+
+# ---------------------------------------------------------------------------
+# H3 helpers (the notebooks use Databricks' h3_* SQL functions)
+
+
+def wkt_latlng(wkt):
+    """(lat, lng) ring of a single-ring WKT polygon, without the closing point"""
+    xy = re.findall(r"(-?\d+(?:\.\d+)?) (-?\d+(?:\.\d+)?)", wkt)
+    return [(float(y), float(x)) for x, y in xy[:-1]]
+
+
+def polyfill(wkt, resolution):
+    """int64 cells whose centers fall in the polygon, or the cell of its first vertex for a sliver"""
+    ring = wkt_latlng(wkt)
+    cells = h3_int.polygon_to_cells(h3.LatLngPoly(ring), resolution).astype(np.int64)
+    if not len(cells):
+        cells = np.array([h3.str_to_int(h3.latlng_to_cell(*ring[0], resolution))], dtype=np.int64)
+    return cells
+
+
+def cell_parents(cells, resolution):
+    """Parents of int64 H3 cells at a coarser resolution (resolution field set, finer digits to 7)"""
+    cells = cells.astype(np.uint64)
+    unused = sum(7 << (3 * (15 - r)) for r in range(resolution + 1, 16))
+    parents = (cells & ~np.uint64(0xF << 52)) | np.uint64(resolution << 52) | np.uint64(unused)
+    return parents.astype(np.int64)
+
+
+def point_cells(lat, lon, resolution):
+    return np.fromiter((h3.str_to_int(h3.latlng_to_cell(a, o, resolution)) for a, o in zip(lat, lon)),
+                       dtype=np.int64, count=len(lat))
+
+
+# ---------------------------------------------------------------------------
+# Stages: each takes the run context and returns the number of output rows
+
+
+class Run:
+    def __init__(self, engine, tables, config, args):
+        self.engine = engine
+        self.tables = tables
+        self.config = config
+        self.args = args
+        self.resolution = config["h3_grid"]["resolution"]
+        demo = config["demographic_variables"]
+        self.count_vars = [v for group in ["population", "income", "households", "education", "employment",
+                                           "housing", "commute"] for v in demo[group]]
+        self.rate_vars = demo["median"] + ["per_capita_income"]
+        self.sum_columns = self.mean_columns = self.min_columns = None
+
+
+def blockgroup_h3_coverage(run):
+    child = run.args.child_resolution or run.config["h3_grid"]["blockgroup_coverage"]["child_resolution"]
+    parts = []
+    for geoid, wkt in zip(run.tables["bronze_census_blockgroups"]["geoid"],
+                          run.tables["bronze_census_blockgroups"]["geometry_wkt"]):
+        cells, counts = np.unique(cell_parents(polyfill(wkt, child), run.resolution), return_counts=True)
+        parts.append(pd.DataFrame({"bg_geoid": geoid, "h3_cell_id": cells,
+                                   "intersection_ratio": counts / counts.sum()}))
+    return run.engine.load("blockgroup_h3_coverage", pd.concat(parts, ignore_index=True))
+
+
+def create_h3_features(run):
+    engine, tables, config = run.engine, run.tables, run.config
+    k = config["distance"]["nearest_neighbors"]["k"]
+    radii = config["distance"]["nearest_neighbors"]["radii_miles"]
+    null_distance = float(config["distance"]["null_value"])
+
+    # Cells of the region (the state polygon in the notebook)
+    blockgroups = tables["bronze_census_blockgroups"]
+    lat0, lat1 = blockgroups["latitude"].min(), blockgroups["latitude"].max()
+    lon0, lon1 = blockgroups["longitude"].min(), blockgroups["longitude"].max()
+    cells = h3_int.polygon_to_cells(
+        h3.LatLngPoly([(lat0, lon0), (lat0, lon1), (lat1, lon1), (lat1, lon0)]), run.resolution).astype(np.int64)
+    centers = np.array([h3.cell_to_latlng(h3.int_to_str(c)) for c in cells])
+    engine.load("h3_base", pd.DataFrame({"h3_cell_id": cells, "h3_area_sqkm": h3.average_hexagon_area(
+        run.resolution, "km^2")}))
+
+    pois = tables["bronze_pois"]
+    engine.load("pois_h3", pd.DataFrame({
+        "h3_cell_id": point_cells(pois["latitude"], pois["longitude"], run.resolution),
+        "poi_category": pois["poi_category"]}))
+    competitors = tables["competitor_locations"]
+    engine.load("competitors_h3", pd.DataFrame({
+        "h3_cell_id": point_cells(competitors["latitude"], competitors["longitude"], run.resolution),
+        "store_type": competitors["store_type"]}))
+
+    # Nearest-neighbour distances and counts per store group: the notebook's mapInPandas code
+    stores = tables["rmc_retail_locations_grocery"]
+    group_points = {"rmc": (stores["latitude"].to_numpy(), stores["longitude"].to_numpy())}
+    for brand, brand_df in competitors.groupby("store_type"):
+        group_points[h3_feature_schema.store_group(brand)] = (brand_df["latitude"].to_numpy(),
+                                                              brand_df["longitude"].to_numpy())
+    group_columns = {group: h3_feature_schema.nearest_neighbor_columns(group, k, radii) for group in group_points}
+    distances = {"h3_cell_id": cells}
+    distances.update(h3_nearest_neighbors.nearest_neighbor_features(
+        h3_nearest_neighbors.build_trees(group_points), group_points, group_columns,
+        centers[:, 0], centers[:, 1], k, radii, null_distance))
+    engine.load("distance_features", pd.DataFrame(distances))
+
+    demographics = tables["bronze_census_demographics"]
+    count_vars = [v for v in run.count_vars if v in demographics.columns]
+    rate_vars = [v for v in run.rate_vars if v in demographics.columns]
+    categories = sorted(pois["poi_category"].unique())
+    brands = sorted(competitors["store_type"].unique())
+    engine.load("bronze_census_demographics", demographics)
+
+    engine.create("demo_features", f"""
+        SELECT c.h3_cell_id,
+            {", ".join(f"CAST(SUM(COALESCE(d.{v}, 0) * c.intersection_ratio) AS BIGINT) AS {v}" for v in count_vars)}
+        FROM blockgroup_h3_coverage c JOIN bronze_census_demographics d ON c.bg_geoid = d.bg_geoid
+        GROUP BY c.h3_cell_id
+    """)
+    engine.create("demo_rate_features", f"""
+        SELECT h3_cell_id, {", ".join(rate_vars)} FROM (
+            SELECT c.h3_cell_id, {", ".join(f"d.{v}" for v in rate_vars)},
+                ROW_NUMBER() OVER (PARTITION BY c.h3_cell_id ORDER BY c.intersection_ratio DESC, c.bg_geoid) AS rank
+            FROM blockgroup_h3_coverage c JOIN bronze_census_demographics d ON c.bg_geoid = d.bg_geoid
+        ) ranked WHERE rank = 1
+    """)
+    engine.create("poi_features", f"""
+        SELECT h3_cell_id,
+            {", ".join(f"SUM(CASE WHEN poi_category = '{c}' THEN 1 ELSE 0 END) AS {h3_feature_schema.poi_count_column(c)}" for c in categories)},
+            COUNT(*) AS total_poi_count
+        FROM pois_h3 GROUP BY h3_cell_id
+    """)
+    engine.create("competitor_features", f"""
+        SELECT h3_cell_id,
+            {", ".join(f"SUM(CASE WHEN store_type = '{b}' THEN 1 ELSE 0 END) AS {h3_feature_schema.competitor_count_column(b)}"
+                       for b in brands)},
+            COUNT(*) AS total_competitor_count
+        FROM competitors_h3 GROUP BY h3_cell_id
+    """)
+
+    poi_cols = [h3_feature_schema.poi_count_column(c) for c in categories] + ["total_poi_count"]
+    competitor_cols = [h3_feature_schema.competitor_count_column(b) for b in brands] + ["total_competitor_count"]
+    distance_cols = [c for c in distances if c != "h3_cell_id"]
+    weight = config["urbanicity"]["weights"]["poi_count"]
+    rows = engine.create("h3_features", f"""
+        WITH joined AS (
+            SELECT b.h3_cell_id, b.h3_area_sqkm,
+                {", ".join(f"COALESCE(p.{c}, 0) AS {c}" for c in poi_cols)},
+                {", ".join(f"COALESCE(d.{c}, 0) AS {c}" for c in count_vars)},
+                {", ".join(f"COALESCE(r.{c}, 0) AS {c}" for c in rate_vars)},
+                {", ".join(f"COALESCE(m.{c}, 0) AS {c}" for c in competitor_cols)},
+                {", ".join(f"n.{c}" for c in distance_cols)}
+            FROM h3_base b
+            LEFT JOIN poi_features p ON b.h3_cell_id = p.h3_cell_id
+            LEFT JOIN demo_features d ON b.h3_cell_id = d.h3_cell_id
+            LEFT JOIN demo_rate_features r ON b.h3_cell_id = r.h3_cell_id
+            LEFT JOIN competitor_features m ON b.h3_cell_id = m.h3_cell_id
+            LEFT JOIN distance_features n ON b.h3_cell_id = n.h3_cell_id
+        ), normalized AS (
+            SELECT *, CASE WHEN MAX(total_poi_count) OVER () > MIN(total_poi_count) OVER ()
+                THEN (total_poi_count - MIN(total_poi_count) OVER ())
+                    / (MAX(total_poi_count) OVER () - MIN(total_poi_count) OVER ())
+                ELSE 0 END AS total_poi_count_norm
+            FROM joined
+        )
+        SELECT *, {weight} * total_poi_count_norm AS urbanicity_score,
+            NTILE(10) OVER (ORDER BY total_poi_count_norm, h3_cell_id) AS urbanicity_decile
+        FROM normalized
+    """)
+
+    # Trade-area aggregations, as in aggregate_trade_area_features
+    run.sum_columns = count_vars + poi_cols + competitor_cols
+    run.mean_columns = rate_vars + ["urbanicity_score"]
+    run.min_columns = [c for c in distance_cols if c.startswith("distance_to_")]
+    return rows
+
+
+def trade_area_h3_cells(run):
+    parts = []
+    for site_type, name in [("existing", "silver_rmc_urbanicity_based_isochrones"),
+                            ("candidate", "silver_seed_points_isochrones")]:
+        isochrones = run.tables[name]
+        for store_number, wkt in zip(isochrones["store_number"], isochrones["geometry_wkt"]):
+            cells = polyfill(wkt, run.resolution)
+            parts.append(pd.DataFrame({"site_type": site_type, "store_number": store_number, "h3_cell_id": cells}))
+    return run.engine.load("trade_area_cells", pd.concat(parts, ignore_index=True))
+
+
+def aggregate_trade_area_features(run):
+    aggregations = ([f"CAST(ABS(SUM(f.{c})) AS BIGINT) AS {c}" for c in run.sum_columns]
+                    + [f"ABS(AVG(f.{c})) AS {c}" for c in run.mean_columns]
+                    + [f"MIN(f.{c}) AS {c}" for c in run.min_columns]
+                    + ["COUNT(*) AS h3_cell_count"])
+    return run.engine.create("trade_area_features", f"""
+        SELECT t.store_number, {", ".join(aggregations)}
+        FROM trade_area_cells t JOIN h3_features f ON t.h3_cell_id = f.h3_cell_id
+        GROUP BY t.store_number
+    """)
+
+
+def aggregate_trade_area_features_store(run):
+    features = run.engine.fetch(
+        f"SELECT h3_cell_id, {', '.join(run.sum_columns + run.mean_columns + run.min_columns)} FROM h3_features")
+    store = H3FeatureStore.from_frame(features, run.sum_columns, run.mean_columns, run.min_columns)
+    del features
+    pairs = run.engine.fetch("SELECT store_number, h3_cell_id FROM trade_area_cells")
+    cells = store.group(pairs["store_number"].to_numpy(), pairs["h3_cell_id"].to_numpy())
+    aggregated = store.aggregate(cells)
+    aggregated = aggregated[aggregated["h3_cell_count"] > 0]
+    aggregated[run.sum_columns] = aggregated[run.sum_columns].abs()
+    aggregated[run.mean_columns] = aggregated[run.mean_columns].abs()
+    run.store_features = aggregated
+    return len(aggregated)
+
+
+def check_feature_store(run):
+    """The feature store must match the join (the join casts sums to whole numbers)"""
+    expected = run.engine.fetch("SELECT * FROM trade_area_features").set_index("store_number")
+    actual = run.store_features.loc[expected.index, expected.columns].copy()
+    actual[run.sum_columns] = actual[run.sum_columns].astype(np.int64)
+    assert np.allclose(actual.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64), equal_nan=True), \
+        "Feature store differs from the join"
+
+
+def trade_area_overlap(run):
+    return run.engine.create("trade_area_overlap", """
+        SELECT a.site_type AS site_type_a, a.store_number AS store_number_a,
+            b.site_type AS site_type_b, b.store_number AS store_number_b,
+            COUNT(*) AS shared_cells,
+            SUM(COALESCE(f.total_population, 0)) AS shared_population,
+            SUM(COALESCE(f.total_poi_count, 0)) AS shared_poi_count
+        FROM trade_area_cells a
+        JOIN trade_area_cells b ON a.h3_cell_id = b.h3_cell_id
+            AND (a.site_type <> b.site_type OR a.store_number <> b.store_number)
+        LEFT JOIN h3_features f ON a.h3_cell_id = f.h3_cell_id
+        GROUP BY a.site_type, a.store_number, b.site_type, b.store_number
+    """)
+
+
+def trade_area_overlap_index(run):
+    weights = run.engine.fetch(
+        "SELECT h3_cell_id, total_population AS population, total_poi_count AS poi_count FROM h3_features")
+    pairs = run.engine.fetch("SELECT site_type, store_number, h3_cell_id FROM trade_area_cells")
+    cell_sets = TradeAreaCellSets.from_frame(pairs, ["site_type", "store_number"])
+    run.overlap = cell_sets.overlap(weights.set_index("h3_cell_id"))
+    return len(run.overlap)
+
+
+def check_overlap(run):
+    """The inverted index must find the same pairs and sums as the self-join"""
+    keys = ["site_type_a", "store_number_a", "site_type_b", "store_number_b"]
+    expected = run.engine.fetch("SELECT * FROM trade_area_overlap").set_index(keys).sort_index()
+    actual = run.overlap.set_index(keys).sort_index()
+    assert actual.index.equals(expected.index), "Inverted-index overlap pairs differ from the self-join"
+    for column in ["shared_cells", "shared_population", "shared_poi_count"]:
+        assert np.allclose(actual[column].to_numpy(dtype=np.float64), expected[column].to_numpy(dtype=np.float64)), \
+            f"Inverted-index {column} differs from the self-join"
+
+
+def drive_time_od_matrix(run):
+    od_config = synthetic_data.load_config()[1]["od_matrix"]
+    resolution = od_config["h3_resolution"]
+    k = drive_time_matrix.k_ring_for(od_config["max_minutes"], od_config["max_speed_mph"], resolution)
+    competitors = run.tables["competitor_locations"]
+    stores = pd.concat([
+        run.tables["rmc_retail_locations_grocery"].assign(site_type="existing", store_group="rmc"),
+        competitors.assign(site_type="competitor",
+                           store_group=competitors["store_type"].str.lower().str.replace(" ", "_"),
+                           store_number=[f"C{i}" for i in range(len(competitors))]),
+        run.tables["seed_points_expansion"].assign(site_type="candidate", store_group="rmc"),
+    ], ignore_index=True)[["site_type", "store_group", "store_number", "latitude", "longitude"]]
+    stores["store_number"] = stores["store_number"].astype(str)
+    store_cells = point_cells(stores["latitude"].to_numpy(), stores["longitude"].to_numpy(), resolution)
+
+    # k-ring pruning against the demand cells of the feature grid
+    demand = run.engine.fetch("SELECT h3_cell_id, total_population FROM h3_features")
+    rings = [h3_int.grid_disk(cell, k) for cell in store_cells]
+    pairs = pd.DataFrame({
+        "target_id": np.repeat(np.arange(len(stores)), [len(r) for r in rings]),
+        "h3_cell_id": np.concatenate(rings).astype(np.int64),
+    })
+    pairs = pairs[pairs["h3_cell_id"].isin(demand["h3_cell_id"])]
+    cells = pairs["h3_cell_id"].unique()
+    centers = pd.DataFrame([h3_int.cell_to_latlng(c) for c in cells], index=cells,
+                           columns=["source_latitude", "source_longitude"])
+    pairs = pairs.join(centers, on="h3_cell_id")
+    pairs["target_latitude"] = stores["latitude"].to_numpy()[pairs["target_id"]]
+    pairs["target_longitude"] = stores["longitude"].to_numpy()[pairs["target_id"]]
+    pairs["block_id"] = cell_parents(store_cells, od_config["block_resolution"])[pairs["target_id"]]
+
+    router = drive_time_matrix.StraightLineMatrix()
+    routed = pd.concat([drive_time_matrix.route_pairs(router, block, od_config["max_location_pairs"])
+                        for _, block in pairs.groupby("block_id", sort=False)], ignore_index=True)
+    routed = routed[routed["drive_time_minutes"] <= od_config["max_minutes"]]
+    run.od = stores.iloc[routed["target_id"].to_numpy()].reset_index(drop=True) \
+        .assign(h3_cell_id=routed["h3_cell_id"].to_numpy(), drive_time_minutes=routed["drive_time_minutes"].to_numpy())
+    run.demand = demand.set_index("h3_cell_id")["total_population"]
+    return len(run.od)
+
+
+def huff_market_share(run):
+    huff_config = synthetic_data.load_config()[1]["huff"]
+    od = run.od
+    od["store_id"] = od["site_type"] + ":" + od["store_number"]
+    od["attractiveness"] = od["store_group"].map(huff_config["attractiveness"]) \
+        .fillna(huff_config["attractiveness"]["default"])
+    is_candidate = od["site_type"] == "candidate"
+    run.huff, run.competing_utility = drive_time_matrix.huff_market_share(
+        od[~is_candidate], run.demand, huff_config["decay"], huff_config["min_minutes"])
+    candidates = drive_time_matrix.candidate_huff(
+        od[is_candidate], run.demand, run.competing_utility, huff_config["attractiveness"]["rmc"],
+        huff_config["decay"], huff_config["min_minutes"])
+    return len(run.huff) + len(candidates)
+
+
+def check_huff(run):
+    """Existing stores and competitors must split each reached cell's population exactly once"""
+    reached = run.demand.reindex(run.competing_utility.index).fillna(0).sum()
+    assert np.isclose(run.huff["huff_captured_population"].sum(), reached), \
+        "Huff captured population does not add up to the population of the reached cells"
+
+
+def train_sales_model(run):
+    stores = run.engine.fetch("""
+        SELECT f.* FROM trade_area_features f
+        JOIN rmc_retail_locations_grocery s ON f.store_number = s.store_number
+    """)
+    rng = np.random.default_rng(run.args.seed)
+    stores["annual_sales"] = formula_sales(stores) * rng.normal(1, 0.05, len(stores))
+    model = sales_model.SalesModel.fit(stores)
+    model.version = 1
+    run.artifact = model.to_json()
+    return len(stores)
+
+
+def predict_seed_point_sales(run):
+    return run.engine.map_batches("seed_point_sales", """
+        SELECT f.* FROM trade_area_features f
+        JOIN seed_points_expansion s ON f.store_number = s.store_number
+    """, sales_model.partition_predictor(run.artifact), run.args.batch_rows)
+
+
+# ---------------------------------------------------------------------------
+
+
+def run_scale(engine_name, scale, args, commit, config):
+    started = time.perf_counter()
+    tables = synthetic_data.read(os.path.join(args.data_dir, f"scale_{scale:g}"), scale, args.seed) \
+        if args.data_dir else None
+    if tables is None:
+        tables = synthetic_data.generate(scale, args.seed)
+        if args.data_dir:
+            synthetic_data.write(tables, os.path.join(args.data_dir, f"scale_{scale:g}"), scale, args.seed)
+    print(f"\nScale {scale:g}: {len(tables['bronze_pois']):,} POIs, "
+          f"{len(tables['bronze_census_blockgroups']):,} block groups, "
+          f"{len(tables['silver_seed_points_isochrones']):,} seed points "
+          f"({time.perf_counter() - started:.1f} s to generate or read)")
+
+    engine = ENGINES[engine_name](args)
+    run = Run(engine, tables, config, args)
+    for name in ["rmc_retail_locations_grocery", "seed_points_expansion"]:
+        engine.load(name, tables[name])
+
+    records = []
+    try:
+        for stage in STAGES:
+            shuffle_before = engine.shuffle_bytes()
+            with PeakMemory() as memory:
+                stage_started = time.perf_counter()
+                rows = globals()[stage](run)
+                seconds = time.perf_counter() - stage_started
+            shuffle_after = engine.shuffle_bytes()
+            record = {
+                "commit": commit,
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "engine": engine_name,
+                "scale": scale,
+                "stage": stage,
+                "seconds": round(seconds, 4),
+                "peak_rss_mb": round(memory.peak / 1e6, 1),
+                "shuffle_bytes": None if shuffle_before is None else shuffle_after - shuffle_before,
+                "rows": int(rows),
+                "cpus": os.cpu_count(),
+            }
+            records.append(record)
+            print(f"  {stage:<38}{seconds:>10.2f} s{record['peak_rss_mb']:>10,.0f} MB{rows:>12,} rows")
+            if stage == "aggregate_trade_area_features_store":
+                check_feature_store(run)
+            elif stage == "trade_area_overlap_index":
+                check_overlap(run)
+            elif stage == "huff_market_share":
+                check_huff(run)
+    finally:
+        engine.close()
+    return records
+
+
+def compare(path, baseline=None, candidate=None):
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    commits = list(dict.fromkeys(r["commit"] for r in records))
+    if candidate is None:
+        candidate = commits[-1]
+    if baseline is None:
+        earlier = [c for c in commits if c != candidate]
+        if not earlier:
+            sys.exit(f"{path} holds results of one commit only ({candidate})")
+        baseline = earlier[-1]
+
+    latest = {}
+    for r in records:
+        latest[(r["commit"], r["engine"], r["scale"], r["stage"])] = r
+    keys = list(dict.fromkeys((r["engine"], r["scale"], r["stage"]) for r in records
+                              if r["commit"] in (baseline, candidate)))
+
+    print(f"Baseline {baseline}, candidate {candidate}\n")
+    print(f"{'engine':<8}{'scale':>6}  {'stage':<38}{'base s':>9}{'cand s':>9}{'ratio':>7}"
+          f"{'base MB':>9}{'cand MB':>9}")
+    for engine, scale, stage in keys:
+        base, cand = latest.get((baseline, engine, scale, stage)), latest.get((candidate, engine, scale, stage))
+        fmt = lambda r, key, spec: format(r[key], spec) if r else "-"  # noqa: E731
+        ratio = f"{cand['seconds'] / base['seconds']:.2f}" if base and cand and base["seconds"] else "-"
+        print(f"{engine:<8}{scale:>6g}  {stage:<38}{fmt(base, 'seconds', '.2f'):>9}{fmt(cand, 'seconds', '.2f'):>9}"
+              f"{ratio:>7}{fmt(base, 'peak_rss_mb', ',.0f'):>9}{fmt(cand, 'peak_rss_mb', ',.0f'):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", choices=list(ENGINES), default="duckdb")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100], help="Multiples of Massachusetts")
+    parser.add_argument("--results", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl"),
+                        help="JSON lines file the stage records are appended to")
+    parser.add_argument("--data-dir", help="Keep synthetic data here (one directory per scale) and reuse it")
+    parser.add_argument("--child-resolution", type=int,
+                        help="Block group coverage child resolution (default: h3_features_config.yml)")
+    parser.add_argument("--batch-rows", type=int, default=10000, help="Arrow batch size for scoring")
+    parser.add_argument("--threads", type=int, help="Engine threads (default: all cores)")
+    parser.add_argument("--shuffle-partitions", type=int, default=8, help="spark.sql.shuffle.partitions")
+    parser.add_argument("--spark-driver-memory", default="4g")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--compare", metavar="RESULTS", help="Compare two commits in a results file and exit")
+    parser.add_argument("--baseline", help="Commit to compare against (default: the one before the latest)")
+    parser.add_argument("--candidate", help="Commit to compare (default: the latest)")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare, args.baseline, args.candidate)
+        return
+
+    config, _ = synthetic_data.load_config()
+    commit = git_commit()
+    print(f"Commit {commit}, engine {args.engine}")
+    for scale in args.scales:
+        records = run_scale(args.engine, scale, args, commit, config)
+        with open(args.results, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    print(f"\nResults appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
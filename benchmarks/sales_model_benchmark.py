@@ -0,0 +1,107 @@
+"""
+Benchmark the trained sales model (app/sales_model.py) offline.
+
+Synthetic stores get trade-area features and sales from the formula the model
+replaced, plus noise; the model is fitted on them and scored on synthetic seed
+points:
+
+- fit: ridge fit with cross-validated regularization, and out-of-fold R^2.
+- batch: the mapInPandas path, i.e. Arrow record batches of --batch-rows
+  converted to pandas and passed through partition_predictor (rows/sec).
+- single: predict_one on a feature dict, as the app's what-if scorer calls it.
+
+Usage:
+    python benchmarks/sales_model_benchmark.py --stores 60 --seed-points 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+import sales_model  # noqa: E402
+
+
+def make_features(n_rows, rng):
+    df = pd.DataFrame({c: rng.lognormal(7, 1, n_rows).round() for c in sales_model.FEATURES
+                       if not c.startswith("distance_to_")})
+    df["total_population"] = rng.lognormal(10, 0.6, n_rows).round()
+    df["distance_to_valuemart_miles"] = np.where(rng.random(n_rows) < 0.1, np.nan, rng.uniform(0, 10, n_rows))
+    df["distance_to_quickshop_market_miles"] = rng.uniform(0, 10, n_rows)
+    return df
+
+
+def formula_sales(df):
+    """The hand-written formula the model replaces, used to label synthetic stores"""
+    return (
+        300000
+        + (df["male_18_to_24"] + df["female_18_to_24"]) * 30
+        + (df["income_100k_125k"] + df["income_125k_150k"] + df["income_150k_200k"] + df["income_200k_plus"]) * 5
+        + (df["bachelors_degree"] + df["masters_degree"]) * 3
+        + df["total_poi_count"] * 100
+        + df["distance_to_valuemart_miles"].fillna(0) * 10000
+        + df["distance_to_quickshop_market_miles"].fillna(0) * 5000
+        + df["total_population"] / 100
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", type=int, default=60, help="Training stores")
+    parser.add_argument("--noise", type=float, default=0.05, help="Sales noise as a fraction of sales")
+    parser.add_argument("--seed-points", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--batch-rows", type=int, default=10000, help="Arrow batch size (maxRecordsPerBatch)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    stores = make_features(args.stores, rng)
+    stores["annual_sales"] = formula_sales(stores) * rng.normal(1, args.noise, args.stores)
+
+    started = time.perf_counter()
+    model = sales_model.SalesModel.fit(stores)
+    fit_seconds = time.perf_counter() - started
+    model.version = 1
+    artifact = model.to_json()
+    print(f"Fitted on {args.stores} stores in {fit_seconds * 1000:.1f} ms: alpha {model.alpha}, "
+          f"cross-validated R2 {model.metrics['cv_r2']:.3f}, MAE ${model.metrics['cv_mae']:,.0f}")
+
+    results = [{"path": "fit", "rows": args.stores, "seconds": fit_seconds}]
+    for n in args.seed_points:
+        seed_points = make_features(n, rng)
+        seed_points["store_number"] = [f"C{i}" for i in range(n)]
+        table = pa.Table.from_pandas(seed_points, preserve_index=False)
+        batches = table.to_batches(max_chunksize=args.batch_rows)
+
+        started = time.perf_counter()
+        predictor = sales_model.partition_predictor(artifact)
+        scored = sum(len(batch) for batch in predictor(b.to_pandas() for b in batches))
+        seconds = time.perf_counter() - started
+        results.append({"path": "batch", "rows": scored, "seconds": seconds})
+
+    site = make_features(1, rng).iloc[0].to_dict()
+    repeat = 10000
+    started = time.perf_counter()
+    for _ in range(repeat):
+        model.predict_one(site)
+    results.append({"path": "single", "rows": 1, "seconds": (time.perf_counter() - started) / repeat})
+
+    print(f"\n{'path':<8}{'rows':>12}{'seconds':>12}{'rows/sec':>16}")
+    for r in results:
+        print(f"{r['path']:<8}{r['rows']:>12,}{r['seconds']:>12.6f}{r['rows'] / r['seconds']:>16,.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "model": model.to_dict(), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Scalable synthetic inputs for the offline pipeline benchmark.
+
+Builds the tables the pipeline reads, at a multiple of Massachusetts' size, with
+no Census API, Geofabrik extract or Valhalla build:
+
+- bronze_census_blockgroups / bronze_census_demographics: block groups as squares
+  sized by their spacing (small in towns, large in the countryside), with the
+  count, median and rate columns of h3_features_config.yml
+- bronze_pois: POIs clustered around towns, one OSM category each
+- rmc_retail_locations_grocery / competitor_locations: stores in the larger towns,
+  one competitor chain per configured brand
+- seed_points_expansion: centers of the top 25% of H3 cells by POI count, as
+  exploration/generate_rmc_retail_locations picks them
+- silver_rmc_urbanicity_based_isochrones / silver_seed_points_isochrones: stand-in
+  drive-time polygons (lobed circles reached at an urbanicity-dependent speed
+  within the configured drive time) in place of Valhalla
+
+Scale 1 matches Massachusetts' counts (about 5,100 block groups, 150,000 POIs and
+60 stores). Larger scales grow the area by the same factor at the same density.
+Tables are written as Parquet with WKT geometries.
+
+Usage:
+    python benchmarks/synthetic_data.py --scale 10 --output-dir /tmp/synthetic_10x
+"""
+import argparse
+import json
+import os
+import time
+
+import h3
+import numpy as np
+import pandas as pd
+import yaml
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources", "configs")
+
+# Massachusetts at scale 1; larger scales grow both spans by sqrt(scale) around the same center
+CENTER_LAT, CENTER_LON = 42.05, -71.7
+HALF_LAT, HALF_LON = 0.85, 1.8
+
+# Counts at scale 1
+BLOCK_GROUPS = 5100
+POIS = 150000
+TOWNS = 350
+STORES = 60
+COMPETITORS_PER_BRAND = 80
+SEED_POINTS = 2500
+
+POI_CATEGORIES = {"shop": 0.3, "amenity": 0.35, "leisure": 0.12, "tourism": 0.05, "office": 0.08,
+                  "public_transport": 0.08, "railway": 0.02}
+# Average speed (mph) within a stand-in isochrone by urbanicity
+SPEED_MPH = {"urban": 15.0, "suburban": 25.0, "rural": 35.0}
+
+
+def load_config():
+    with open(os.path.join(CONFIG_DIR, "h3_features_config.yml")) as f:
+        features = yaml.safe_load(f)
+    with open(os.path.join(CONFIG_DIR, "isochrone_config.yml")) as f:
+        isochrones = yaml.safe_load(f)
+    return features, isochrones
+
+
+class Region:
+    """Bounding box and town centers of a synthetic region"""
+
+    def __init__(self, scale, rng):
+        self.scale = scale
+        span = np.sqrt(scale)
+        self.lat_min, self.lat_max = CENTER_LAT - HALF_LAT * span, CENTER_LAT + HALF_LAT * span
+        self.lon_min, self.lon_max = CENTER_LON - HALF_LON * span, CENTER_LON + HALF_LON * span
+        n_towns = int(TOWNS * scale)
+        self.town_lat = rng.uniform(self.lat_min, self.lat_max, n_towns)
+        self.town_lon = rng.uniform(self.lon_min, self.lon_max, n_towns)
+        # A few cities, many villages
+        self.town_weight = rng.pareto(1.2, n_towns) + 0.05
+        self.town_weight /= self.town_weight.sum()
+        self.town_radius = 0.01 + 0.06 * np.sqrt(self.town_weight / self.town_weight.max())
+
+    def sample(self, n, rng, background=0.2, weight_power=1.0):
+        """Points clustered around towns, with a uniform background share"""
+        n_background = int(n * background)
+        weights = self.town_weight ** weight_power
+        towns = rng.choice(len(self.town_lat), n - n_background, p=weights / weights.sum())
+        lat = np.concatenate([self.town_lat[towns] + rng.normal(0, 1, len(towns)) * self.town_radius[towns],
+                              rng.uniform(self.lat_min, self.lat_max, n_background)])
+        lon = np.concatenate([self.town_lon[towns] + rng.normal(0, 1, len(towns)) * self.town_radius[towns] * 1.35,
+                              rng.uniform(self.lon_min, self.lon_max, n_background)])
+        order = rng.permutation(n)
+        return (np.clip(lat[order], self.lat_min, self.lat_max), np.clip(lon[order], self.lon_min, self.lon_max),
+                np.concatenate([towns, np.full(n_background, -1)])[order])
+
+
+def square_wkt(lat, lon, half_deg):
+    half_lon = half_deg / np.cos(np.radians(lat))
+    ring = [(lon - half_lon, lat - half_deg), (lon + half_lon, lat - half_deg), (lon + half_lon, lat + half_deg),
+            (lon - half_lon, lat + half_deg), (lon - half_lon, lat - half_deg)]
+    return "POLYGON ((" + ", ".join(f"{x:.6f} {y:.6f}" for x, y in ring) + "))"
+
+
+def make_block_groups(region, config, rng):
+    from scipy.spatial import cKDTree
+
+    n = int(BLOCK_GROUPS * region.scale)
+    lat, lon, towns = region.sample(n, rng, background=0.3, weight_power=0.8)
+    # Each block group spans about the distance to its nearest neighbour
+    xy = np.column_stack([lat, lon * np.cos(np.radians(lat))])
+    spacing, _ = cKDTree(xy).query(xy, k=2)
+    half = np.clip(spacing[:, 1], 0.002, 0.08) * 0.5
+
+    geoid = np.array([f"25{i // 1000000:03d}{i:07d}" for i in range(n)])
+    blockgroups = pd.DataFrame({
+        "geoid": geoid,
+        "state_fips": "25",
+        "county_fips": [f"{i % 14 * 2 + 1:03d}" for i in range(n)],
+        "name": [f"Block Group {i % 9 + 1}, Town {t if t >= 0 else 'Rural'}" for i, t in enumerate(towns)],
+        "latitude": lat,
+        "longitude": lon,
+        "geometry_wkt": [square_wkt(a, o, h) for a, o, h in zip(lat, lon, half)],
+    })
+
+    demo_vars = config["demographic_variables"]
+    population = rng.lognormal(7.1, 0.45, n).round()
+    households = (population / rng.uniform(2.1, 2.9, n)).round()
+    demographics = {"bg_geoid": geoid, "total_population": population, "total_households": households}
+    for group in ["population", "income", "households", "education", "employment", "housing", "commute"]:
+        base = households if group in ("income", "housing") else population
+        for var in demo_vars[group]:
+            if var not in demographics:
+                demographics[var] = (base * rng.beta(2, 18, n)).round()
+    income = rng.lognormal(11.3, 0.45, n)
+    demographics["median_household_income"] = income.round()
+    demographics["median_home_value"] = (income * rng.uniform(4, 7, n)).round()
+    demographics["median_gross_rent"] = (income / rng.uniform(40, 60, n)).round()
+    demographics["per_capita_income"] = (income / rng.uniform(2.2, 2.8, n)).round()
+    return blockgroups, pd.DataFrame(demographics)
+
+
+def make_pois(region, rng):
+    n = int(POIS * region.scale)
+    lat, lon, _ = region.sample(n, rng)
+    categories = list(POI_CATEGORIES)
+    return pd.DataFrame({
+        "poi_id": [f"poi_{i}" for i in range(n)],
+        "poi_category": rng.choice(categories, n, p=list(POI_CATEGORIES.values())),
+        "latitude": lat,
+        "longitude": lon,
+    })
+
+
+def make_stores(region, config, rng):
+    n = int(STORES * region.scale)
+    lat, lon, _ = region.sample(n, rng, background=0.0, weight_power=1.5)
+    stores = pd.DataFrame({
+        "store_number": [str(10001 + i) for i in range(n)],
+        "store_type": "RMC Grocery",
+        "city": [f"Town {i % 97}" for i in range(n)],
+        "state": "MA",
+        "latitude": lat,
+        "longitude": lon,
+    })
+    brands = config["distance"]["competitor_brands"]
+    competitors = []
+    for brand in brands:
+        m = int(COMPETITORS_PER_BRAND * region.scale)
+        lat, lon, _ = region.sample(m, rng, background=0.1)
+        competitors.append(pd.DataFrame({"store_type": brand, "latitude": lat, "longitude": lon}))
+    return stores, pd.concat(competitors, ignore_index=True)
+
+
+def poi_cell_counts(pois, resolution):
+    cells = [h3.latlng_to_cell(a, o, resolution) for a, o in zip(pois["latitude"], pois["longitude"])]
+    return pd.Series(cells).value_counts()
+
+
+def make_seed_points(region, pois, resolution, rng):
+    """Centers of the top 25% of cells by POI count, sampled down to the seed point budget"""
+    counts = poi_cell_counts(pois, resolution)
+    top = counts[counts >= max(counts.quantile(0.75), 1)]
+    n = min(len(top), int(SEED_POINTS * region.scale))
+    cells = rng.choice(top.index.to_numpy(), n, replace=False)
+    centers = np.array([h3.cell_to_latlng(c) for c in cells])
+    return pd.DataFrame({
+        "store_number": [str(20001 + i) for i in range(n)],
+        "store_type": "New Expansion",
+        "city": [f"Town {i % 97}" for i in range(n)],
+        "state": "MA",
+        "latitude": centers[:, 0],
+        "longitude": centers[:, 1],
+    }), counts
+
+
+def lobed_polygon_wkt(lat, lon, radius_miles, rng, vertices=48):
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    phase = rng.uniform(0, 2 * np.pi, 2)
+    radius = radius_miles * (0.8 + 0.15 * np.sin(3 * angles + phase[0]) + 0.05 * np.sin(5 * angles + phase[1]))
+    ring_lat = lat + radius / 69.0 * np.sin(angles)
+    ring_lon = lon + radius / (69.0 * np.cos(np.radians(lat))) * np.cos(angles)
+    ring = list(zip(ring_lon, ring_lat)) + [(ring_lon[0], ring_lat[0])]
+    return "POLYGON ((" + ", ".join(f"{x:.6f} {y:.6f}" for x, y in ring) + "))", \
+        float(np.pi * np.mean(radius) ** 2 * 2.58999)
+
+
+def make_isochrones(sites, poi_counts, resolution, drive_times, rng):
+    """Stand-in drive-time polygons; urbanicity from the POI count of the site's cell"""
+    cells = [h3.latlng_to_cell(a, o, resolution) for a, o in zip(sites["latitude"], sites["longitude"])]
+    pois_here = poi_counts.reindex(cells).fillna(0).to_numpy()
+    urban_cut, suburban_cut = np.quantile(poi_counts.to_numpy(), [0.9, 0.5])
+    category = np.where(pois_here >= urban_cut, "urban", np.where(pois_here >= suburban_cut, "suburban", "rural"))
+    rows = []
+    for site, cat in zip(sites.itertuples(index=False), category):
+        minutes = drive_times.get(cat, drive_times["default"])
+        wkt, area = lobed_polygon_wkt(site.latitude, site.longitude, SPEED_MPH[cat] * minutes / 60, rng)
+        rows.append((site.store_number, site.latitude, site.longitude, site.store_type, site.city, site.state,
+                     cat, minutes, area, wkt))
+    return pd.DataFrame(rows, columns=["store_number", "latitude", "longitude", "store_type", "city", "state",
+                                       "urbanicity_category", "drive_time_minutes", "area_sqkm", "geometry_wkt"])
+
+
+def generate(scale, seed=42):
+    """All tables of one scale as {name: DataFrame}"""
+    config, isochrone_config = load_config()
+    resolution = config["h3_grid"]["resolution"]
+    drive_times = isochrone_config["urbanicity_routing"]["drive_times"]
+    rng = np.random.default_rng(seed)
+    region = Region(scale, rng)
+
+    blockgroups, demographics = make_block_groups(region, config, rng)
+    pois = make_pois(region, rng)
+    stores, competitors = make_stores(region, config, rng)
+    seed_points, poi_counts = make_seed_points(region, pois, resolution, rng)
+    return {
+        "bronze_census_blockgroups": blockgroups,
+        "bronze_census_demographics": demographics,
+        "bronze_pois": pois,
+        "rmc_retail_locations_grocery": stores,
+        "competitor_locations": competitors,
+        "seed_points_expansion": seed_points,
+        "silver_rmc_urbanicity_based_isochrones": make_isochrones(stores, poi_counts, resolution, drive_times, rng),
+        "silver_seed_points_isochrones": make_isochrones(seed_points, poi_counts, resolution, drive_times, rng),
+    }
+
+
+def write(tables, output_dir, scale, seed):
+    os.makedirs(output_dir, exist_ok=True)
+    for name, df in tables.items():
+        df.to_parquet(os.path.join(output_dir, f"{name}.parquet"), index=False)
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump({"scale": scale, "seed": seed, "rows": {n: len(df) for n, df in tables.items()}}, f, indent=2)
+
+
+def read(output_dir, scale, seed):
+    """Tables previously written for this scale and seed, or None"""
+    try:
+        with open(os.path.join(output_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest["scale"] != scale or manifest["seed"] != seed:
+        return None
+    return {name: pd.read_parquet(os.path.join(output_dir, f"{name}.parquet")) for name in manifest["rows"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiple of Massachusetts")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    tables = generate(args.scale, args.seed)
+    write(tables, args.output_dir, args.scale, args.seed)
+    for name, df in tables.items():
+        print(f"{name:<42}{len(df):>12,}")
+    print(f"\nGenerated scale {args.scale:g} in {time.perf_counter() - started:.1f} s: {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
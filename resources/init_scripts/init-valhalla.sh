@@ -1,7 +1,12 @@
 #!/bin/bash
 # Valhalla Init Script for Databricks Cluster
-# Installs Valhalla routing engine on all cluster nodes at startup
-# Pulls pre-built tiles from Silver volume to local disk for fast access
+# Installs the pinned pyvalhalla wheel on all cluster nodes at startup and copies the
+# current tile artifact (built by the silver build_valhalla_tiles task) to local disk.
+# valhalla.Actor memory-maps the tile extract, so no tiles are unpacked or rebuilt here.
+#
+# Cluster environment (spark_env_vars):
+#   VALHALLA_ARTIFACT_VOLUME  /Volumes/<catalog>/<schema>/valhalla_data
+#   VALHALLA_VERSION          pyvalhalla version the artifact was built with
 
 set -e
 
@@ -10,154 +15,126 @@ echo "Valhalla Init Script - Starting"
 echo "========================================="
 
 # Configuration
-VALHALLA_VERSION="3.4.0"
+VALHALLA_VERSION="${VALHALLA_VERSION:-3.5.1}"
+ARTIFACT_VOLUME="${VALHALLA_ARTIFACT_VOLUME:-/Volumes/retail_consumer_goods/geospatial_site_selection/valhalla_data}"
 BUILD_DIR="/local_disk0/valhalla_build"
-TILES_VOLUME="/Volumes/geo_site_selection/silver/valhalla_data"
-CONFIG_WORKSPACE="/Workspace/resources/configs/valhalla_config.json"
-
-# Install system dependencies
-echo "[1/5] Installing system dependencies..."
-apt-get update -qq
-apt-get install -y -qq \
-    cmake \
-    g++ \
-    libboost-all-dev \
-    libcurl4-openssl-dev \
-    libprotobuf-dev \
-    protobuf-compiler \
-    liblz4-dev \
-    libsqlite3-dev \
-    libspatialite-dev \
-    libgeos-dev \
-    libgeos++-dev \
-    libluajit-5.1-dev \
-    python3-dev \
-    wget \
-    tar \
-    > /dev/null 2>&1
-
-echo "✓ System dependencies installed"
-
-# Download and compile Valhalla
-echo "[2/5] Compiling Valhalla ${VALHALLA_VERSION}..."
-
-mkdir -p /tmp/valhalla_build
-cd /tmp/valhalla_build
-
-# Download source
-wget -q https://github.com/valhalla/valhalla/archive/refs/tags/${VALHALLA_VERSION}.tar.gz
-tar -xzf ${VALHALLA_VERSION}.tar.gz
-cd valhalla-${VALHALLA_VERSION}
-
-# Configure with Python bindings and disable strict warnings
-cmake -B build \
-    -DCMAKE_BUILD_TYPE=Release \
-    -DENABLE_PYTHON_BINDINGS=ON \
-    -DCMAKE_CXX_FLAGS="-Wno-error=format-truncation" \
-    > /dev/null 2>&1
-
-# Compile (use all CPU cores)
-cmake --build build -j$(nproc) > /dev/null 2>&1
-
-# Install to system
-cmake --install build > /dev/null 2>&1
-
-echo "✓ Valhalla compiled and installed"
-
-# Install Python bindings
-echo "[3/5] Installing Python bindings..."
-cd build/python
-python3 -m pip install -q .
-
-echo "✓ Python bindings installed"
-
-# Copy pre-built tiles from Silver volume to local disk
-echo "[4/5] Copying routing tiles from Silver volume..."
+PYTHON="/databricks/python/bin/python"
+TIMINGS="${BUILD_DIR}/init_timings.json"
 
+now() { date +%s.%N; }
+elapsed() { awk -v a="$1" -v b="$(now)" 'BEGIN { printf "%.2f", b - a }'; }
+
+INIT_START=$(now)
 mkdir -p ${BUILD_DIR}
 
-# Copy tiles archive from Silver volume
-if [ -f "${TILES_VOLUME}/valhalla_tiles.tar" ]; then
-    echo "  Extracting tiles from ${TILES_VOLUME}/valhalla_tiles.tar"
-    tar -xf ${TILES_VOLUME}/valhalla_tiles.tar -C ${BUILD_DIR}
-    echo "✓ Tiles extracted to ${BUILD_DIR}"
-else
-    echo "⚠ WARNING: Tiles not found at ${TILES_VOLUME}/valhalla_tiles.tar"
-    echo "  You need to run the setup notebook first to generate tiles"
+# Install Python bindings (wheel ships the Valhalla libraries; nothing is compiled)
+echo "[1/4] Installing pyvalhalla ${VALHALLA_VERSION}..."
+STEP_START=$(now)
+/databricks/python/bin/pip install -q "pyvalhalla==${VALHALLA_VERSION}"
+INSTALL_SECONDS=$(elapsed ${STEP_START})
+echo "✓ pyvalhalla installed (${INSTALL_SECONDS} s)"
+
+# Resolve the current tile artifact
+echo "[2/4] Resolving tile artifact..."
+if [ ! -f "${ARTIFACT_VOLUME}/current" ]; then
+    echo "⚠ WARNING: No tile artifact at ${ARTIFACT_VOLUME}/current"
+    echo "  Run the silver build_valhalla_tiles task first"
+    exit 0
 fi
-
-# Copy Valhalla config from workspace
-echo "[5/5] Copying Valhalla configuration..."
-
-if [ -f "${CONFIG_WORKSPACE}" ]; then
-    cp ${CONFIG_WORKSPACE} ${BUILD_DIR}/valhalla.json
-    echo "✓ Config copied from ${CONFIG_WORKSPACE}"
-else
-    # Create minimal config if workspace config doesn't exist yet
-    cat > ${BUILD_DIR}/valhalla.json << 'EOF'
-{
-  "mjolnir": {
-    "tile_dir": "/local_disk0/valhalla_build/valhalla_tiles",
-    "admin": "/local_disk0/valhalla_build/valhalla_tiles/admin.sqlite",
-    "timezone": "/local_disk0/valhalla_build/valhalla_tiles/tz_world.sqlite"
-  },
-  "service_limits": {
-    "auto": {
-      "max_distance": 5000000.0,
-      "max_locations": 20,
-      "max_matrix_distance": 400000.0,
-      "max_matrix_locations": 50
-    },
-    "isochrone": {
-      "max_contours": 10,
-      "max_time": 120,
-      "max_distance": 200000.0,
-      "max_locations": 1
-    }
-  }
-}
-EOF
-    echo "✓ Created minimal config (workspace config not found)"
+ARTIFACT_KEY=$(tr -d '[:space:]' < "${ARTIFACT_VOLUME}/current")
+ARTIFACT_DIR="${ARTIFACT_VOLUME}/tiles/${ARTIFACT_KEY}"
+if [ ! -f "${ARTIFACT_DIR}/manifest.json" ]; then
+    echo "⚠ WARNING: Artifact ${ARTIFACT_KEY} has no manifest.json (incomplete build)"
+    exit 0
 fi
-
-# Verify installation
-echo ""
-echo "========================================="
-echo "Verifying Valhalla installation..."
-echo "========================================="
-
-# Test Python import
-python3 -c "import valhalla; print('✓ Valhalla Python module imported successfully')" || {
-    echo "✗ ERROR: Failed to import valhalla Python module"
+# Tiles are only loaded by the Valhalla version that built them
+BUILT_VERSION=$(${PYTHON} -c "import json; print(json.load(open('${ARTIFACT_DIR}/manifest.json')).get('valhalla_version', ''))")
+if [ "${BUILT_VERSION}" != "${VALHALLA_VERSION}" ]; then
+    echo "✗ ERROR: Artifact ${ARTIFACT_KEY} was built with pyvalhalla ${BUILT_VERSION}, cluster installs ${VALHALLA_VERSION}"
+    echo "  Rebuild the tiles with build_valhalla_tiles or set VALHALLA_VERSION to ${BUILT_VERSION}"
     exit 1
-}
+fi
+echo "✓ Artifact ${ARTIFACT_KEY} (pyvalhalla ${BUILT_VERSION})"
+
+# Copy the tile extract to local disk (under a temporary name, so a partial copy is never loaded)
+echo "[3/4] Copying tile extract to local disk..."
+STEP_START=$(now)
+cp "${ARTIFACT_DIR}/valhalla_tiles.tar" "${BUILD_DIR}/valhalla_tiles.tar.partial"
+mv "${BUILD_DIR}/valhalla_tiles.tar.partial" "${BUILD_DIR}/valhalla_tiles.tar"
+cp "${ARTIFACT_DIR}/valhalla.json" "${ARTIFACT_DIR}/manifest.json" ${BUILD_DIR}/
+cp "${ARTIFACT_DIR}/valhalla_tiles.tar.sha256" ${BUILD_DIR}/
+# Sidecar newer than the tar, so readers trust the checksum instead of rehashing
+touch "${BUILD_DIR}/valhalla_tiles.tar.sha256"
+COPY_SECONDS=$(elapsed ${STEP_START})
+
+EXPECTED_BYTES=$(${PYTHON} -c "import json; print(json.load(open('${BUILD_DIR}/manifest.json'))['tiles_bytes'])")
+ACTUAL_BYTES=$(stat -c %s "${BUILD_DIR}/valhalla_tiles.tar")
+if [ "${EXPECTED_BYTES}" != "${ACTUAL_BYTES}" ]; then
+    echo "✗ ERROR: Tile extract is ${ACTUAL_BYTES} bytes, manifest says ${EXPECTED_BYTES}"
+    exit 1
+fi
+echo "✓ ${ACTUAL_BYTES} bytes copied (${COPY_SECONDS} s)"
 
-# Test actor initialization
-python3 -c "
-import valhalla
+# Load the actor and route one isochrone at the manifest's probe location
+echo "[4/4] Verifying Valhalla actor..."
+${PYTHON} - <<EOF
 import json
-try:
-    actor = valhalla.Actor('${BUILD_DIR}/valhalla.json')
-    status_json = actor.status()
-    status = json.loads(status_json) if isinstance(status_json, str) else status_json
-    print(f\"✓ Valhalla actor initialized\")
-    print(f\"  Version: {status.get('version', 'unknown')}\")
-    actions = status.get('available_actions', [])
-    print(f\"  Available actions: {', '.join(actions)}\")
-except Exception as e:
-    print(f'✗ ERROR: Failed to initialize actor: {e}')
-    exit(1)
-" || {
-    echo "✗ ERROR: Failed to initialize Valhalla actor"
-    exit 1
+import time
+
+import valhalla
+
+with open("${BUILD_DIR}/manifest.json") as f:
+    manifest = json.load(f)
+
+started = time.perf_counter()
+actor = valhalla.Actor("${BUILD_DIR}/valhalla.json")
+actor_load = time.perf_counter() - started
+
+first_isochrone = None
+probe = manifest.get("probe")
+if probe:
+    started = time.perf_counter()
+    result = actor.isochrone(json.dumps({
+        "locations": [probe],
+        "costing": manifest.get("costing", "auto"),
+        "contours": [{"time": 5.0}],
+        "polygons": True
+    }))
+    first_isochrone = time.perf_counter() - started
+    features = (json.loads(result) if isinstance(result, str) else result).get("features", [])
+    assert features, f"No isochrone at the probe location {probe}"
+
+timings = {
+    "artifact_key": "${ARTIFACT_KEY}",
+    "valhalla_version": "${VALHALLA_VERSION}",
+    "install_seconds": float("${INSTALL_SECONDS}"),
+    "copy_seconds": float("${COPY_SECONDS}"),
+    "tiles_bytes": ${ACTUAL_BYTES},
+    "actor_load_seconds": round(actor_load, 3),
+    "first_isochrone_seconds": round(first_isochrone, 3) if first_isochrone is not None else None,
+    "total_seconds": float("$(elapsed ${INIT_START})"),
+    "host": "$(hostname)",
+    "cluster_id": "${DB_CLUSTER_ID:-unknown}",
+    "is_driver": "${DB_IS_DRIVER:-}" == "TRUE",
+    "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
 }
+with open("${TIMINGS}", "w") as f:
+    json.dump(timings, f, indent=2)
+
+print(f"✓ Actor loaded in {actor_load:.2f} s", end="")
+print(f", first isochrone in {first_isochrone:.2f} s" if first_isochrone is not None else "")
+EOF
+
+# Publish this node's startup timings (best effort; the volume may be read-only here)
+mkdir -p "${ARTIFACT_VOLUME}/init_timings/${DB_CLUSTER_ID:-unknown}" 2>/dev/null || true
+cp ${TIMINGS} "${ARTIFACT_VOLUME}/init_timings/${DB_CLUSTER_ID:-unknown}/$(hostname).json" 2>/dev/null || true
 
 echo ""
 echo "========================================="
-echo "Valhalla Init Script - Complete"
+echo "Valhalla Init Script - Complete ($(elapsed ${INIT_START}) s)"
 echo "========================================="
-echo "✓ Valhalla ${VALHALLA_VERSION} installed"
-echo "✓ Python bindings available"
+echo "✓ pyvalhalla ${VALHALLA_VERSION}"
 echo "✓ Config: ${BUILD_DIR}/valhalla.json"
-echo "✓ Tiles: ${BUILD_DIR}/valhalla_tiles/"
+echo "✓ Tiles: ${BUILD_DIR}/valhalla_tiles.tar (artifact ${ARTIFACT_KEY})"
+echo "✓ Timings: ${TIMINGS}"
 echo "========================================="
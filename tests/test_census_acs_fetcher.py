@@ -0,0 +1,157 @@
+"""
+CensusACSFetcher against a local stub of the Census API (http.server on a free port).
+
+The stub serves three counties: 001 and 003 with two tracts of two block groups
+each, and 005 with no block groups (HTTP 204). The first request of every
+variable chunk for county 003 answers 503 once, so each chunk is retried.
+"""
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transformations", "01_bronze"))
+
+from census_acs_fetcher import CensusACSFetcher, chunk_variables  # noqa: E402
+
+YEAR = 2022
+STATE = "25"
+COUNTIES = ["001", "003", "005"]
+EMPTY_COUNTY = "005"
+FLAKY_COUNTY = "003"
+TRACTS = ["000100", "000200"]
+BLOCK_GROUPS = ["1", "2"]
+VARIABLES = [f"B{n:05d}_001E" for n in range(120)]
+
+
+def value(variable, county, tract, block_group):
+    return f"{variable}|{county}|{tract}|{block_group}"
+
+
+class StubCensusAPI(BaseHTTPRequestHandler):
+    requests_seen = []
+    failed_once = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _status(self, code):
+        self.send_response(code)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        with self.lock:
+            self.requests_seen.append(params)
+        assert url.path == f"/{YEAR}/acs/acs5"
+        get = params["get"][0].split(",")
+        ins = dict(clause.split(":", 1) for clause in params.get("in", []))
+
+        if params["for"] == ["county:*"]:
+            self._json([["NAME", "state", "county"]] + [[f"County {c}", STATE, c] for c in COUNTIES])
+            return
+
+        county = ins["county"]
+        if county == EMPTY_COUNTY:
+            self._status(204)
+            return
+        if county == FLAKY_COUNTY:
+            with self.lock:
+                first_attempt = tuple(get) not in self.failed_once
+                self.failed_once.add(tuple(get))
+            if first_attempt:
+                self._status(503)
+                return
+
+        variables = get[1:]
+        rows = [
+            [f"Block Group {bg}"] + [value(v, county, tract, bg) for v in variables] + [STATE, county, tract, bg]
+            for tract in TRACTS for bg in BLOCK_GROUPS
+        ]
+        self._json([get + ["state", "county", "tract", "block group"]] + rows)
+
+
+@pytest.fixture
+def stub_api():
+    StubCensusAPI.requests_seen = []
+    StubCensusAPI.failed_once = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCensusAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def make_fetcher(base_url, cache_dir):
+    return CensusACSFetcher("test-key", YEAR, base_url=base_url, cache_dir=str(cache_dir),
+                            max_workers=4, max_retries=3, backoff_seconds=0)
+
+
+def block_group_requests():
+    return [params for params in StubCensusAPI.requests_seen if params["for"] == ["block group:*"]]
+
+
+def test_chunk_variables_leaves_room_for_name():
+    chunks = chunk_variables(VARIABLES)
+    assert [len(chunk) for chunk in chunks] == [49, 49, 22]
+    assert sum(chunks, []) == VARIABLES
+
+
+def test_fetch_block_groups(stub_api, tmp_path):
+    fetcher = make_fetcher(stub_api, tmp_path / "cache")
+    headers, rows = fetcher.fetch_block_groups(STATE, VARIABLES)
+
+    # Every block group request asks for NAME plus at most 49 variables
+    requested = block_group_requests()
+    gets = [params["get"][0].split(",") for params in requested]
+    assert all(get[0] == "NAME" and len(get) <= 50 for get in gets)
+    # Three chunks per county, the flaky county's chunks requested twice
+    assert sorted(len(get) - 1 for get in gets) == sorted([49, 49, 22] * 4)
+    assert all(params["key"] == ["test-key"] for params in StubCensusAPI.requests_seen)
+
+    # One county list, 3 counties x 3 chunks, and one retry per chunk of the flaky county
+    assert fetcher.stats == {"requests": 1 + 9 + 3, "cache_hits": 0, "retries": 3}
+    assert len(StubCensusAPI.requests_seen) == 13
+
+    # Chunks are joined on the geography; the empty county contributes no rows
+    assert headers == ["NAME"] + VARIABLES + ["state", "county", "tract", "block group"]
+    assert len(rows) == 2 * len(TRACTS) * len(BLOCK_GROUPS)
+    for row in rows:
+        record = dict(zip(headers, row))
+        assert record["county"] != EMPTY_COUNTY
+        assert record["NAME"] == f"Block Group {record['block group']}"
+        geography = (record["county"], record["tract"], record["block group"])
+        assert all(record[v] == value(v, *geography) for v in VARIABLES)
+
+
+def test_rerun_is_served_from_cache(stub_api, tmp_path):
+    first = make_fetcher(stub_api, tmp_path / "cache")
+    expected = first.fetch_block_groups(STATE, VARIABLES)
+    requests_before = len(StubCensusAPI.requests_seen)
+
+    second = make_fetcher(stub_api, tmp_path / "cache")
+    assert second.fetch_block_groups(STATE, VARIABLES) == expected
+    assert second.stats == {"requests": 0, "cache_hits": 1 + 9, "retries": 0}
+    assert len(StubCensusAPI.requests_seen) == requests_before
+
+
+def test_empty_county_is_an_empty_result(stub_api, tmp_path):
+    fetcher = make_fetcher(stub_api, tmp_path / "cache")
+    assert fetcher._fetch_shard(STATE, EMPTY_COUNTY, VARIABLES[:49]) == []
+    assert fetcher.stats["retries"] == 0
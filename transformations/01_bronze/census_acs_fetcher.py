@@ -0,0 +1,170 @@
+"""
+Concurrent ACS 5-Year block group fetcher shared by the bronze census notebooks.
+
+The Census API accepts at most 50 variables per call, so the variable list is split into
+chunks and each state is sharded by county. Every (county, chunk) request runs on a thread
+pool with exponential backoff, and raw responses are cached on disk keyed by year,
+geography and variable set so reruns do not hit the API again.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+DEFAULT_BASE_URL = "https://api.census.gov/data"
+MAX_VARIABLES_PER_REQUEST = 50
+GEO_COLUMNS = ["state", "county", "tract", "block group"]
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def chunk_variables(variables, max_variables=MAX_VARIABLES_PER_REQUEST):
+    """Split variable codes into request-sized chunks; NAME is sent with each chunk and counts toward the limit"""
+    size = max_variables - 1
+    assert size > 0, "max_variables must leave room for NAME"
+    return [variables[i:i + size] for i in range(0, len(variables), size)]
+
+
+class ResponseCache:
+    """Raw JSON API responses on disk, one file per (year, geography, variable set)"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(year, geography, variables):
+        payload = json.dumps([str(year), geography, sorted(variables)])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        if not self.cache_dir:
+            return None
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def put(self, key, data):
+        if not self.cache_dir:
+            return
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        # Write then rename so a concurrent or interrupted writer never leaves a partial file
+        tmp_path = f"{path}.{os.getpid()}.{random.getrandbits(32):08x}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+
+class CensusACSFetcher:
+    """Fetches ACS 5-Year block group estimates for a state, sharded by county and variable chunk"""
+
+    def __init__(self, api_key, year, base_url=DEFAULT_BASE_URL, cache_dir=None,
+                 max_variables=MAX_VARIABLES_PER_REQUEST, max_workers=8, max_retries=5,
+                 backoff_seconds=1.0, timeout_seconds=120):
+        self.api_key = api_key
+        self.year = year
+        self.base_url = base_url.rstrip("/")
+        self.cache = ResponseCache(cache_dir)
+        self.max_variables = max_variables
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, stat):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def _get(self, params):
+        """GET with exponential backoff and jitter on throttling, server errors and connection failures"""
+        url = f"{self.base_url}/{self.year}/acs/acs5"
+        if self.api_key:
+            params = params + [("key", self.api_key)]
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._count("requests")
+                response = self.session.get(url, params=params, timeout=self.timeout_seconds)
+                if response.status_code == 204:
+                    # The API answers a geography with no matching rows with an empty body
+                    return []
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            self._count("retries")
+            time.sleep(self.backoff_seconds * (2 ** attempt) * (1 + random.random()))
+
+    def _cached_get(self, geography, variables, params):
+        key = ResponseCache.key(self.year, geography, variables)
+        data = self.cache.get(key)
+        if data is not None:
+            self._count("cache_hits")
+            return data
+        data = self._get(params)
+        assert isinstance(data, list), f"Invalid API response for {geography}"
+        self.cache.put(key, data)
+        return data
+
+    def list_counties(self, state_fips):
+        """County FIPS codes of a state"""
+        data = self._cached_get(
+            f"county:*/state:{state_fips}", ["NAME"],
+            [("get", "NAME"), ("for", "county:*"), ("in", f"state:{state_fips}")]
+        )
+        assert data, f"No counties returned for state {state_fips}"
+        return sorted(row[data[0].index("county")] for row in data[1:])
+
+    def _fetch_shard(self, state_fips, county, chunk):
+        get = ",".join(["NAME"] + chunk)
+        return self._cached_get(
+            f"block group:*/state:{state_fips}/county:{county}", chunk,
+            [("get", get), ("for", "block group:*"), ("in", f"state:{state_fips}"),
+             ("in", f"county:{county}"), ("in", "tract:*")]
+        )
+
+    def fetch_block_groups(self, state_fips, variables):
+        """
+        All block groups of a state with the requested variables.
+
+        Returns (headers, rows) shaped like a single API response: NAME, the variables in
+        the requested order, then state, county, tract and block group.
+        """
+        counties = self.list_counties(state_fips)
+        chunks = chunk_variables(list(variables), self.max_variables)
+        shards = [(county, chunk) for county in counties for chunk in chunks]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = list(executor.map(lambda shard: self._fetch_shard(state_fips, *shard), shards))
+
+        # Variable chunks of the same block group are joined on the geography columns
+        records = {}
+        for data in responses:
+            if not data:
+                continue
+            headers = data[0]
+            geo_idx = [headers.index(c) for c in GEO_COLUMNS]
+            for row in data[1:]:
+                geo_key = tuple(row[i] for i in geo_idx)
+                record = records.setdefault(geo_key, {})
+                record.update(zip(headers, row))
+
+        out_headers = ["NAME"] + list(variables) + GEO_COLUMNS
+        rows = [[record.get(h) for h in out_headers] for _, record in sorted(records.items())]
+        assert rows, f"No block groups returned for state {state_fips}"
+        return out_headers, rows
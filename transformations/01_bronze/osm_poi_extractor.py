@@ -0,0 +1,372 @@
+"""
+Streaming OSM POI extraction shared by the bronze POI notebooks.
+
+Elements carrying a POI key are selected by osmium's KeyFilter in C++ before
+reaching Python. Ways and areas are reduced to centroids. Rows are either
+buffered into fixed-size Arrow record batches and written to rolling Parquet
+files (full extraction) or collected per changed element (incremental updates).
+
+Incremental updates only apply replication diffs newer than the stored PBF,
+whose replication sequence number (or timestamp) is kept in its header.
+"""
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+
+import osmium
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Default POI tag categories (used when extract_all=True)
+DEFAULT_POI_TAGS = [
+    'amenity', 'shop', 'leisure', 'tourism', 'office',
+    'public_transport', 'railway', 'natural', 'building'
+]
+
+POI_ARROW_SCHEMA = pa.schema([
+    pa.field("osm_id", pa.string(), nullable=False),
+    pa.field("osm_type", pa.string(), nullable=False),
+    pa.field("latitude", pa.float64()),
+    pa.field("longitude", pa.float64()),
+    pa.field("tags", pa.map_(pa.string(), pa.string()))
+])
+
+
+def get_poi_tag_keys(extract_all=True, poi_tag_categories=None):
+    """Tag keys that make an element a POI"""
+    if extract_all or not poi_tag_categories:
+        return DEFAULT_POI_TAGS
+    return poi_tag_categories
+
+
+class ParquetBatchWriter:
+    """Buffers POI rows and flushes fixed-size Arrow record batches to rolling Parquet files"""
+
+    def __init__(self, local_dir, output_dir, batch_size, rows_per_file):
+        self.local_dir = local_dir
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.rows_per_file = rows_per_file
+        self.columns = {name: [] for name in POI_ARROW_SCHEMA.names}
+        self.writer = None
+        self.local_path = None
+        self.file_index = 0
+        self.file_rows = 0
+        self.total_rows = 0
+        self.files = []
+
+    def add(self, osm_id, osm_type, latitude, longitude, tags):
+        self.columns["osm_id"].append(osm_id)
+        self.columns["osm_type"].append(osm_type)
+        self.columns["latitude"].append(latitude)
+        self.columns["longitude"].append(longitude)
+        self.columns["tags"].append(tags)
+        if len(self.columns["osm_id"]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows as one record batch (one Parquet row group)"""
+        rows = len(self.columns["osm_id"])
+        if rows == 0:
+            return
+        if self.writer is None:
+            self.local_path = os.path.join(self.local_dir, f"part-{self.file_index:05d}.parquet")
+            self.writer = pq.ParquetWriter(self.local_path, POI_ARROW_SCHEMA, compression="snappy")
+        self.writer.write_batch(pa.RecordBatch.from_pydict(self.columns, schema=POI_ARROW_SCHEMA))
+        self.columns = {name: [] for name in POI_ARROW_SCHEMA.names}
+        self.file_rows += rows
+        self.total_rows += rows
+        if self.file_rows >= self.rows_per_file:
+            self._roll()
+
+    def _roll(self):
+        """Close the current file and move it from local disk into the volume"""
+        self.writer.close()
+        output_path = os.path.join(self.output_dir, os.path.basename(self.local_path))
+        shutil.move(self.local_path, output_path)
+        self.files.append(output_path)
+        self.writer = None
+        self.file_index += 1
+        self.file_rows = 0
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self._roll()
+
+
+def ring_centroid(lons, lats):
+    """Signed area and area-weighted centroid of a closed ring (shoelace formula)"""
+    cross = [lons[i] * lats[i + 1] - lons[i + 1] * lats[i] for i in range(len(lons) - 1)]
+    area = sum(cross) / 2
+    if area == 0:
+        return 0.0, sum(lons) / len(lons), sum(lats) / len(lats)
+    cx = sum((lons[i] + lons[i + 1]) * cross[i] for i in range(len(cross))) / (6 * area)
+    cy = sum((lats[i] + lats[i + 1]) * cross[i] for i in range(len(cross))) / (6 * area)
+    return area, cx, cy
+
+
+def area_centroid(area):
+    """Centroid of an osmium area; inner rings are wound opposite to outer rings and subtract"""
+    total_area, sum_x, sum_y = 0.0, 0.0, 0.0
+    vertices = []
+    for outer in area.outer_rings():
+        for ring in [outer, *area.inner_rings(outer)]:
+            lons = [n.lon for n in ring]
+            lats = [n.lat for n in ring]
+            if len(lons) < 4:
+                continue
+            ring_area, cx, cy = ring_centroid(lons, lats)
+            total_area += ring_area
+            sum_x += ring_area * cx
+            sum_y += ring_area * cy
+            if ring is outer:
+                vertices.extend(zip(lons, lats))
+    if not vertices:
+        return None
+    if total_area == 0:
+        return sum(v[0] for v in vertices) / len(vertices), sum(v[1] for v in vertices) / len(vertices)
+    return sum_x / total_area, sum_y / total_area
+
+
+def way_centroid(way):
+    """Vertex mean of an open way"""
+    coords = [(n.lon, n.lat) for n in way.nodes if n.location.valid()]
+    if not coords:
+        return None
+    return sum(c[0] for c in coords) / len(coords), sum(c[1] for c in coords) / len(coords)
+
+
+def iter_pois(osm_file_path, poi_tag_keys, element_types, geometry_tag_keys, node_location_index="flex_mem"):
+    """Yield (osm_id, osm_type, latitude, longitude, tags) for every POI in a PBF"""
+    entities = osmium.osm.NODE
+    if 'way' in element_types:
+        entities |= osmium.osm.WAY
+    if 'area' in element_types:
+        entities |= osmium.osm.AREA
+
+    processor = osmium.FileProcessor(osm_file_path, entities) \
+        .with_filter(osmium.filter.KeyFilter(*poi_tag_keys))
+    if 'way' in element_types or 'area' in element_types:
+        processor = processor.with_locations(node_location_index)
+    if 'area' in element_types:
+        processor = processor.with_areas()
+
+    for obj in processor:
+        if obj.is_node():
+            if not obj.location.valid():
+                continue
+            osm_type, osm_id = 'node', obj.id
+            lon, lat = obj.location.lon, obj.location.lat
+        else:
+            # Ways and areas only count as POIs when they carry a point-like POI key
+            if not any(key in obj.tags for key in geometry_tag_keys):
+                continue
+            if obj.is_area():
+                osm_type = 'way' if obj.from_way() else 'relation'
+                osm_id = obj.orig_id()
+                centroid = area_centroid(obj)
+            else:
+                # Closed ways are delivered again as areas when areas are enabled
+                if 'area' in element_types and obj.is_closed():
+                    continue
+                osm_type, osm_id = 'way', obj.id
+                centroid = way_centroid(obj)
+            if centroid is None:
+                continue
+            lon, lat = centroid
+
+        yield str(osm_id), osm_type, lat, lon, [(tag.k, tag.v) for tag in obj.tags]
+
+
+def extract_pois_streaming(osm_file_path, writer, poi_tag_keys, element_types, geometry_tag_keys,
+                           node_location_index="flex_mem"):
+    """Stream POIs from a PBF into the batch writer; returns element counts by type"""
+    counts = {'node': 0, 'way': 0, 'relation': 0}
+    for osm_id, osm_type, lat, lon, tags in iter_pois(
+            osm_file_path, poi_tag_keys, element_types, geometry_tag_keys, node_location_index):
+        writer.add(osm_id, osm_type, lat, lon, tags)
+        counts[osm_type] += 1
+    return counts
+
+
+def read_change_files(change_paths):
+    """
+    Latest state of every element touched by a sequence of .osc.gz change files.
+
+    Files are read in order so later versions win. Returns a dict keyed by
+    (osm_type, osm_id) with action ('create', 'modify' or 'delete'), version,
+    tags and, for nodes, the location.
+    """
+    changes = {}
+    for path in change_paths:
+        for obj in osmium.FileProcessor(path, osmium.osm.NODE | osmium.osm.WAY | osmium.osm.RELATION):
+            osm_type = 'node' if obj.is_node() else 'way' if obj.is_way() else 'relation'
+            key = (osm_type, str(obj.id))
+            previous = changes.get(key)
+            if previous is not None and previous['version'] > obj.version:
+                continue
+
+            if not obj.visible:
+                action = 'delete'
+            elif obj.version == 1 or (previous is not None and previous['action'] == 'create'):
+                action = 'create'
+            else:
+                action = 'modify'
+
+            location = None
+            if osm_type == 'node' and obj.visible and obj.location.valid():
+                location = (obj.location.lon, obj.location.lat)
+
+            changes[key] = {
+                'action': action,
+                'version': obj.version,
+                'tags': [(tag.k, tag.v) for tag in obj.tags],
+                'location': location,
+            }
+    return changes
+
+
+def referencing_elements(osm_file_path, node_ids, element_types, geometry_tag_keys):
+    """
+    (osm_type, osm_id) of the ways and relations that can be POIs (they carry a
+    geometry key) and whose geometry uses any of node_ids: ways referencing one
+    of the nodes, and relations with a member way that does. The tag filter runs
+    in C++; only member ways of tagged relations are read again, by id.
+    """
+    found = set()
+    if not geometry_tag_keys or not ('way' in element_types or 'area' in element_types):
+        return found
+
+    for way in osmium.FileProcessor(osm_file_path, osmium.osm.WAY) \
+            .with_filter(osmium.filter.KeyFilter(*geometry_tag_keys)):
+        if any(node.ref in node_ids for node in way.nodes):
+            found.add(('way', str(way.id)))
+
+    if 'area' in element_types:
+        relations_by_member = {}
+        for relation in osmium.FileProcessor(osm_file_path, osmium.osm.RELATION) \
+                .with_filter(osmium.filter.KeyFilter(*geometry_tag_keys)):
+            for member in relation.members:
+                if member.type == 'w':
+                    relations_by_member.setdefault(member.ref, set()).add(relation.id)
+        if relations_by_member:
+            for way in osmium.FileProcessor(osm_file_path, osmium.osm.WAY) \
+                    .with_filter(osmium.filter.IdFilter(set(relations_by_member))):
+                if any(node.ref in node_ids for node in way.nodes):
+                    found.update(('relation', str(i)) for i in relations_by_member[way.id])
+    return found
+
+
+def extract_changed_pois(osm_file_path, changed_ids, work_dir, poi_tag_keys, element_types, geometry_tag_keys,
+                         node_location_index="flex_mem"):
+    """
+    Yield POIs (as iter_pois) for the given ways and relations only.
+
+    changed_ids maps 'way' / 'relation' to sets of integer ids, and optionally
+    'node' to nodes that changed (and may have moved). Ways and relations whose
+    geometry uses such a node are re-extracted too, as their centroids moved
+    with it (see referencing_elements). The elements, the member ways of the
+    relations and the nodes they reference are copied from the PBF by id
+    (osmium's IdFilter, in C++, one pass per element type) into a small file,
+    and iter_pois runs on that file. Centroids match a full extraction without
+    indexing the node locations of the whole PBF.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    parts = {kind: os.path.join(work_dir, f"{kind}.osm.pbf") for kind in ("nodes", "ways", "relations")}
+    for path in parts.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+    requested = {('way', str(i)) for i in changed_ids.get('way', ())} \
+        | {('relation', str(i)) for i in changed_ids.get('relation', ())}
+    if changed_ids.get('node'):
+        requested |= referencing_elements(osm_file_path, set(changed_ids['node']), element_types, geometry_tag_keys)
+    relation_ids = {int(osm_id) for osm_type, osm_id in requested if osm_type == 'relation'}
+    way_ids = {int(osm_id) for osm_type, osm_id in requested if osm_type == 'way'}
+
+    writer = osmium.SimpleWriter(parts["relations"])
+    if relation_ids:
+        for relation in osmium.FileProcessor(osm_file_path, osmium.osm.RELATION) \
+                .with_filter(osmium.filter.IdFilter(relation_ids)):
+            writer.add_relation(relation)
+            way_ids.update(member.ref for member in relation.members if member.type == 'w')
+    writer.close()
+
+    node_ids = set()
+    writer = osmium.SimpleWriter(parts["ways"])
+    if way_ids:
+        for way in osmium.FileProcessor(osm_file_path, osmium.osm.WAY).with_filter(osmium.filter.IdFilter(way_ids)):
+            writer.add_way(way)
+            node_ids.update(node.ref for node in way.nodes)
+    writer.close()
+
+    writer = osmium.SimpleWriter(parts["nodes"])
+    if node_ids:
+        for node in osmium.FileProcessor(osm_file_path, osmium.osm.NODE).with_filter(osmium.filter.IdFilter(node_ids)):
+            writer.add_node(node)
+    writer.close()
+
+    # Nodes, then ways, then relations: the order area assembly expects
+    subset_path = os.path.join(work_dir, "changed.osm.pbf")
+    if os.path.exists(subset_path):
+        os.remove(subset_path)
+    writer = osmium.SimpleWriter(subset_path)
+    for kind, add in [("nodes", writer.add_node), ("ways", writer.add_way), ("relations", writer.add_relation)]:
+        for obj in osmium.FileProcessor(parts[kind]):
+            add(obj)
+    writer.close()
+
+    for osm_id, osm_type, lat, lon, tags in iter_pois(
+            subset_path, poi_tag_keys, element_types, geometry_tag_keys, node_location_index):
+        # Member ways of a changed relation are only there to assemble it
+        if (osm_type, osm_id) in requested:
+            yield osm_id, osm_type, lat, lon, tags
+
+
+REPLICATION_SEQUENCE_KEY = "osmosis_replication_sequence_number"
+REPLICATION_TIMESTAMP_KEY = "osmosis_replication_timestamp"
+
+
+def _parse_timestamp(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc) if value else None
+
+
+def pbf_replication_state(osm_file_path):
+    """(sequence number, timestamp) of the replication state a PBF is at, from its header; None where absent"""
+    reader = osmium.io.Reader(osm_file_path, osmium.osm.osm_entity_bits.NOTHING)
+    header = reader.header()
+    sequence = header.get(REPLICATION_SEQUENCE_KEY, "")
+    timestamp = header.get(REPLICATION_TIMESTAMP_KEY, "")
+    reader.close()
+    return (int(sequence) if sequence.strip() else None), _parse_timestamp(timestamp.strip())
+
+
+def change_file_sequence(relative_path):
+    """Sequence number of a Geofabrik change file from its path (000/004/123.osc.gz -> 4123)"""
+    parts = re.findall(r"(\d{3})[/\\](\d{3})[/\\](\d{3})\.osc\.gz$", relative_path)
+    return int("".join(parts[0])) if parts else None
+
+
+def change_file_timestamp(change_path):
+    """Timestamp of the state a change file brings the data to, from its .state.txt sidecar"""
+    state_path = change_path.replace(".osc.gz", ".state.txt")
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        for line in f:
+            if line.startswith("timestamp="):
+                return _parse_timestamp(line.split("=", 1)[1].strip().replace("\\", ""))
+    return None
+
+
+def write_replication_header(sequence, timestamp):
+    """PBF header recording the replication state after the last applied change file"""
+    header = osmium.io.Header()
+    header.set("generator", "apply_osm_changes")
+    if sequence is not None:
+        header.set(REPLICATION_SEQUENCE_KEY, str(sequence))
+    if timestamp is not None:
+        header.set(REPLICATION_TIMESTAMP_KEY, timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"))
+    return header
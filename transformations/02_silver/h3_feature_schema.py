@@ -0,0 +1,95 @@
+"""
+Column layout of the gold H3 feature table.
+
+Most columns are fixed by configuration; POI categories, competitor brands and
+the nearest-neighbour store groups (RMC plus one per brand) come from the data.
+create_h3_features names its output columns with these helpers, and
+prepare_state_tables creates or extends the table with the same columns before
+states are built in parallel, so per-state writes never change the schema.
+"""
+
+GEOMETRY_TYPE = "GEOMETRY(4326)"
+
+BASE_COLUMNS = [
+    ("h3_cell_id", "STRING"),
+    ("state_fips", "STRING"),
+    ("h3_parent_cell", "STRING"),
+    ("h3_geometry", GEOMETRY_TYPE),
+    ("h3_resolution", "INT"),
+]
+
+URBANICITY_COLUMNS = [
+    ("total_poi_count_norm", "DOUBLE"),
+    ("urbanicity_score", "DOUBLE"),
+    ("urbanicity_decile", "INT"),
+    ("urbanicity_category", "STRING"),
+]
+
+
+def _pivot_name(value):
+    # Spark names the pivot column of a null value "null" (cells without any POI or competitor)
+    return "null" if value is None else str(value)
+
+
+def poi_count_column(category):
+    return f"poi_count_{_pivot_name(category)}"
+
+
+def competitor_count_column(store_type):
+    return f"competitor_count_{_pivot_name(store_type)}".replace(" ", "_")
+
+
+def store_group(store_type):
+    """Nearest-neighbour group of a competitor brand"""
+    return store_type.lower().replace(" ", "_")
+
+
+def nearest_neighbor_columns(group, k, radii_miles):
+    """Output columns for one store group: nearest distance, 2nd..k-th distances, counts within radii"""
+    nearest = "distance_to_nearest_rmc_miles" if group == "rmc" else f"distance_to_{group}_miles"
+    return (
+        [nearest]
+        + [f"distance_to_{group}_k{n}_miles" for n in range(2, k + 1)]
+        + [f"{group}_count_within_{radius:g}_miles".replace(".", "_") for radius in radii_miles]
+    )
+
+
+def column_default(name, null_distance_value):
+    """Value of a feature column in cells of a state that has no such category, brand or store"""
+    return null_distance_value if name.startswith("distance_to_") else 0
+
+
+def demographic_columns(config, available_columns):
+    """Count variables (area-weighted sums) then rate variables (largest block group), as present in the census table"""
+    demo_vars = config['demographic_variables']
+    count_vars = [v for group in ["population", "income", "households", "education", "employment", "housing", "commute"]
+                  for v in demo_vars.get(group, [])]
+    rate_vars = list(demo_vars.get("median", []))
+    if "per_capita_income" not in rate_vars:
+        rate_vars.append("per_capita_income")
+    available = set(available_columns)
+    counts = [v for v in count_vars if v in available]
+    return counts + [v for v in rate_vars if v in available and v not in counts]
+
+
+def feature_columns(config, census_columns, poi_categories, competitor_store_types):
+    """(name, SQL type) of every column a state's build can write, in table order"""
+    nn_config = config['distance']['nearest_neighbors']
+    brands = sorted({t for t in competitor_store_types if t is not None})
+    categories = sorted({c for c in poi_categories if c is not None})
+
+    columns = list(BASE_COLUMNS)
+    columns += [(poi_count_column(c), "BIGINT") for c in categories + [None]]
+    columns += [("total_poi_count", "BIGINT")]
+    columns += [(v, "BIGINT") for v in demographic_columns(config, census_columns)]
+    columns += [("total_competitor_count", "BIGINT")]
+    columns += [(competitor_count_column(b), "BIGINT") for b in brands + [None]]
+    for group in ["rmc"] + sorted({store_group(b) for b in brands}):
+        names = nearest_neighbor_columns(group, nn_config['k'], nn_config['radii_miles'])
+        columns += [(name, "DOUBLE" if n < nn_config['k'] else "BIGINT") for n, name in enumerate(names)]
+    columns += URBANICITY_COLUMNS
+    columns += [("processing_timestamp", "TIMESTAMP")]
+
+    # Brand names differing only in case share a nearest-neighbour group
+    seen = set()
+    return [(name, data_type) for name, data_type in columns if not (name in seen or seen.add(name))]
@@ -0,0 +1,66 @@
+"""
+Nearest-neighbour distance features of H3 cell centers.
+
+For every store group (RMC plus one per competitor brand) a KD-tree is built
+over the group's locations and each cell center is queried for its k nearest
+locations and the number of locations within each radius. Points are projected
+onto the unit sphere, so chord order equals great-circle order and chords
+convert exactly to great-circle miles.
+
+create_h3_features runs this per partition of H3 centers (mapInPandas; the
+module reaches executors through addPyFile) and the offline pipeline benchmark
+calls it directly, so both measure the same code.
+"""
+import numpy as np
+
+EARTH_RADIUS_MILES = 6371008.8 / 1609.34  # Same sphere as ST_DistanceSphere
+
+
+def to_unit_vectors(lat, lon):
+    """Convert latitude/longitude degrees to 3D unit vectors"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_miles(chord):
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def miles_to_chord(miles):
+    return 2 * np.sin(miles / (2 * EARTH_RADIUS_MILES))
+
+
+def build_trees(group_points):
+    """KD-tree per group from {group: (latitudes, longitudes)}; groups without locations have none"""
+    from scipy.spatial import cKDTree
+
+    return {
+        group: cKDTree(to_unit_vectors(lats, lons))
+        for group, (lats, lons) in group_points.items()
+        if len(lats) > 0
+    }
+
+
+def nearest_neighbor_features(trees, groups, group_columns, lat, lon, k, radii_miles, null_distance):
+    """
+    {column: values} for cell centers at (lat, lon): per group the k nearest
+    distances in miles (null_distance where fewer exist), then the counts
+    within each radius, named by group_columns[group]
+    """
+    xyz = to_unit_vectors(lat, lon)
+    out = {}
+    for group in groups:
+        cols = group_columns[group]
+        distances = np.full((len(xyz), k), float(null_distance))
+        counts = np.zeros((len(xyz), len(radii_miles)), dtype="int64")
+        if group in trees and len(xyz) > 0:
+            n = min(k, trees[group].n)
+            chords, _ = trees[group].query(xyz, k=n)
+            distances[:, :n] = chord_to_miles(chords.reshape(len(xyz), n))
+            for r, radius in enumerate(radii_miles):
+                counts[:, r] = trees[group].query_ball_point(xyz, miles_to_chord(radius), return_length=True)
+        for i in range(k):
+            out[cols[i]] = distances[:, i]
+        for r in range(len(radii_miles)):
+            out[cols[k + r]] = counts[:, r]
+    return out